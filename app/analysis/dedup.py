@@ -0,0 +1,99 @@
+import hashlib
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import DEDUP_HITS, DEDUP_LOOKUPS
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lowercases the text and keeps only alphanumeric tokens, so punctuation and spacing changes don't matter."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash over unigram and bigram shingles of the normalized tokens.
+    Near-identical texts produce fingerprints that differ in only a few bits.
+    """
+    tokens = normalize_tokens(text)
+    shingles = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not shingles:
+        return 0
+
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # Per bit position: (#shingles with the bit set) - (#shingles without it)
+    set_bits = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).sum(axis=0, dtype=np.int64)
+    votes = 2 * set_bits - len(shingles)
+    return sum(1 << int(bit) for bit in np.flatnonzero(votes > 0))
+
+
+class NearDuplicateIndex:
+    """
+    Per-brand in-memory index of recently scored responses keyed by SimHash fingerprint.
+    Stores the history-independent sub-scores so near-duplicate answers can reuse them.
+    """
+
+    def __init__(self, max_distance: int, window_per_brand: int, ttl_seconds: float):
+        self.max_distance = max_distance
+        self.window_per_brand = window_per_brand
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Deque[Tuple[int, float, Dict[str, Any]]]] = {}
+        self.lookups = 0
+        self.hits = 0
+
+    def lookup(self, brand_name: str, fingerprint: int) -> Dict[str, Any] | None:
+        """Returns the features of the closest recent near-duplicate, or None."""
+        self.lookups += 1
+        DEDUP_LOOKUPS.inc()
+        entries = self._entries.get(brand_name.lower())
+        if not entries:
+            return None
+
+        cutoff = time.monotonic() - self.ttl_seconds
+        while entries and entries[0][1] < cutoff:
+            entries.popleft()
+
+        best: Tuple[int, Dict[str, Any]] | None = None
+        for stored_fingerprint, _, features in entries:
+            distance = (stored_fingerprint ^ fingerprint).bit_count()
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, features)
+        if best is None:
+            return None
+
+        self.hits += 1
+        DEDUP_HITS.inc()
+        return best[1]
+
+    def add(self, brand_name: str, fingerprint: int, features: Dict[str, Any]) -> None:
+        entries = self._entries.setdefault(brand_name.lower(), deque(maxlen=self.window_per_brand))
+        entries.append((fingerprint, time.monotonic(), features))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "reuse_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "tracked_brands": len(self._entries),
+            "tracked_responses": sum(len(entries) for entries in self._entries.values()),
+        }
+
+
+near_duplicates = NearDuplicateIndex(
+    max_distance=settings.DEDUP_MAX_HAMMING_DISTANCE,
+    window_per_brand=settings.DEDUP_WINDOW_PER_BRAND,
+    ttl_seconds=settings.DEDUP_TTL_SECONDS,
+)
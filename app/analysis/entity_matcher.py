@@ -0,0 +1,189 @@
+import functools
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.core.config import settings
+
+
+class AhoCorasickMatcher:
+    """
+    Multi-pattern matcher: all patterns are compiled into one automaton so a text
+    is scanned once, whatever the number of patterns. Matching is case-insensitive
+    and only whole-word occurrences are reported.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        # Trie stored as parallel lists: goto transitions, failure links, and outputs (pattern length, payload)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+
+        for pattern, payload in patterns:
+            pattern = pattern.lower()
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = next_node
+            self._out[node].append((len(pattern), payload))
+
+        self._build_failure_links()
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                # Inherit the matches of the longest proper suffix
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int, Any]]:
+        """Returns (start, end, payload) for every whole-word match, in order of the match end."""
+        lowered = text.lower()
+        # Positions are offsets into `text`. A few characters lowercase to several ('İ' -> 'i̇'):
+        # then map each lowered character back to the character it came from
+        origin: List[int] | None = None
+        if len(lowered) != len(text):
+            origin = [i for i, char in enumerate(text) for _ in range(len(char.lower()))]
+        matches: List[Tuple[int, int, Any]] = []
+        node = 0
+        for i, char in enumerate(lowered):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, payload in self._out[node]:
+                start = i - length + 1
+                end = i + 1
+                # Word boundaries: "uber" must not match inside "tuber" or "ubers"
+                if (start == 0 or not lowered[start - 1].isalnum()) and (end == len(lowered) or not lowered[end].isalnum()):
+                    if origin is not None:
+                        start, end = origin[start], origin[end - 1] + 1
+                    matches.append((start, end, payload))
+        return matches
+
+
+@functools.lru_cache(maxsize=256)
+def _unregistered_brand_matcher(name: str) -> AhoCorasickMatcher:
+    """Matcher for a focus brand missing from the registry (any user input), kept out of the registry."""
+    return AhoCorasickMatcher([(name, name)])
+
+
+class BrandRegistry:
+    """
+    Tracked brands with their aliases and competitor sets, compiled into one matcher.
+
+    The registry file is JSON of the form:
+        {"Pathao": {"aliases": ["Pathao Food", "Pathao Courier"], "competitors": ["Uber", "Foodpanda"]}}
+    Competitors may themselves be registry entries (with their own aliases).
+    """
+
+    def __init__(self, entries: Dict[str, Dict[str, List[str]]] | None = None):
+        self._entries: Dict[str, Dict[str, List[str]]] = {}
+        self._canonical_names: Dict[str, str] = {}
+        self._matcher: AhoCorasickMatcher | None = None
+        # scan runs on the event loop and in to_thread batch extraction; registering and compiling
+        # happen under the lock, and a compiled matcher is never modified afterwards
+        self._lock = threading.RLock()
+        for name, entry in (entries or {}).items():
+            self.register(name, entry.get("aliases", []), entry.get("competitors", []))
+
+    @classmethod
+    def from_file(cls, path: str) -> "BrandRegistry":
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _canonical(self, name: str) -> str:
+        return self._canonical_names.get(name.lower(), name)
+
+    def _ensure_entry(self, name: str) -> Dict[str, List[str]]:
+        self._canonical_names.setdefault(name.lower(), name)
+        return self._entries.setdefault(name, {"aliases": [], "competitors": []})
+
+    def register(self, name: str, aliases: Iterable[str] = (), competitors: Iterable[str] = ()) -> str:
+        """Adds (or extends) a tracked brand; untracked competitors become entries too. Returns the canonical name."""
+        with self._lock:
+            return self._register(name, aliases, competitors)
+
+    def _register(self, name: str, aliases: Iterable[str], competitors: Iterable[str]) -> str:
+        name = self._canonical(name)
+        entry = self._ensure_entry(name)
+        for alias in aliases:
+            if alias.lower() not in {a.lower() for a in entry["aliases"]}:
+                entry["aliases"].append(alias)
+        for competitor in competitors:
+            competitor = self._canonical(competitor)
+            self._ensure_entry(competitor)
+            if competitor not in entry["competitors"]:
+                entry["competitors"].append(competitor)
+        self._matcher = None  # recompiled lazily on the next scan
+        return name
+
+    def competitors(self, name: str) -> List[str]:
+        return list(self._entries.get(self._canonical(name), {}).get("competitors", []))
+
+    def _compiled(self) -> AhoCorasickMatcher:
+        matcher = self._matcher
+        if matcher is not None:
+            return matcher
+        with self._lock:
+            if self._matcher is None:
+                patterns: List[Tuple[str, str]] = []
+                for name, entry in self._entries.items():
+                    patterns.append((name, name))
+                    patterns.extend((alias, name) for alias in entry["aliases"])
+                self._matcher = AhoCorasickMatcher(patterns)
+            return self._matcher
+
+    def scan(self, text: str, brand_name: str) -> Dict[str, Any]:
+        """
+        Scans the text once and returns mention counts and character positions for every
+        tracked entity, plus the focus brand's share of voice against its competitors.
+        A brand missing from the registry is matched under its own name (without competitors),
+        and the registry is left unchanged.
+        """
+        brand = self._canonical(brand_name)
+        found_matches = self._compiled().find(text)
+        if brand not in self._entries:
+            found_matches += _unregistered_brand_matcher(brand).find(text)
+
+        # Overlapping matches ("Pathao" inside "Pathao Food") count once, preferring the longest
+        mentions: Dict[str, Dict[str, Any]] = {}
+        last_end = -1
+        for start, end, entity in sorted(found_matches, key=lambda m: (m[0], -(m[1] - m[0]))):
+            if start < last_end:
+                continue
+            last_end = end
+            found = mentions.setdefault(entity, {"count": 0, "positions": []})
+            found["count"] += 1
+            found["positions"].append([start, end])
+
+        brand_mentions = mentions.get(brand, {}).get("count", 0)
+        competitor_mentions = {c: mentions[c]["count"] for c in self.competitors(brand) if c in mentions}
+        total = brand_mentions + sum(competitor_mentions.values())
+        return {
+            "brand": brand,
+            "brand_mentions": brand_mentions,
+            "competitor_mentions": competitor_mentions,
+            "share_of_voice": round(brand_mentions / total, 3) if total else 0.0,
+            "mentions": mentions,
+        }
+
+
+brand_registry = BrandRegistry.from_file(settings.BRAND_REGISTRY_PATH)
@@ -1,34 +1,48 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
+import asyncio
+import numpy as np
 import nltk
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from sentence_transformers import SentenceTransformer, util
 import datetime
 
-from app.db.elasticsearch.indexing import index_analysis_document, get_visibility_scores
-from app.db.mongodb.storage import update_query_status_and_score
-from app.db.big_query.service import get_big_query
-from app.core.models import BigQueryHistoryRecord
+from app.db.storage_selector import get_storage
 from app.core.config import settings
-from app.db.postgres.storage import insert_brand_performance
+from app.analysis.dedup import near_duplicates, simhash
+from app.analysis.vector_store import vector_store
+from app.analysis.entity_matcher import brand_registry
+from app.analysis.sentiment import SentimentEngine
+from app.core.metrics import observe_stage, PIPELINES_IN_FLIGHT
+from app.core.profiling import pipeline_profiler
 
 
 # Global NLP resources
 model: SentenceTransformer | None = None
 sentiment_analyzer: SentimentIntensityAnalyzer | None = None
+sentiment_engine: SentimentEngine | None = None
+
+
+def load_nlp_models():
+    """
+    Loads the NLP resources into the module globals synchronously.
+    Also used as the initializer of backfill worker processes.
+    """
+    global sentiment_analyzer, sentiment_engine, model
+    nltk.download('vader_lexicon', quiet=True)
+    sentiment_analyzer = SentimentIntensityAnalyzer()
+    sentiment_engine = SentimentEngine(sentiment_analyzer) if settings.SENTIMENT_BATCHED else None
+    model = SentenceTransformer(settings.EMBEDDING_MODEL_NAME)
 
 
 async def initialize_nlp_models():
     """Initializes heavy NLP models like Sentence Transformers and NLTK data."""
+    if model is not None and sentiment_analyzer is not None:
+        # Preloaded by the master before forking (multi-worker mode): keep the shared copy
+        print("NLP models already loaded.")
+        return
     print("Initializing NLP models...")
     try:
-        nltk.download('vader_lexicon', quiet=True)
-
-        global sentiment_analyzer
-        sentiment_analyzer = SentimentIntensityAnalyzer()
-
-        global model
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-
+        load_nlp_models()
         print("NLP models initialized.")
     except Exception as e:
         print(f"Failed to initialize NLP models: {e}")
@@ -47,11 +61,79 @@ def get_sentiment_score(text: str) -> float:
     return scores["compound"]
 
 
-def generate_embedding(text: str) -> List[float]:
-    """Generate embedding using SentenceTransformer."""
+def get_sentiment_scores(texts: List[str]) -> List[float]:
+    """
+    Sentiment scores of a batch of texts: the same VADER compound scores as get_sentiment_score,
+    computed in one vectorized pass by the batched engine when it is enabled.
+    """
+    if sentiment_engine is not None:
+        return sentiment_engine.compound_scores(texts)
+    return [get_sentiment_score(text) for text in texts]
+
+
+def get_sentence_sentiments(texts: List[str]) -> List[Dict[str, Any]]:
+    """Per text: its compound score and the compound score of each of its sentences."""
+    if sentiment_engine is None:
+        raise ValueError("Batched sentiment engine not initialized")
+    return sentiment_engine.sentence_scores(texts)
+
+
+def chunk_texts(texts: List[str]) -> Tuple[List[str], np.ndarray, List[Tuple[int, int]]]:
+    """
+    Splits long texts into overlapping windows of EMBEDDING_CHUNK_TOKENS word pieces (by default
+    the model's max sequence length), so nothing past the first window is lost to truncation.
+    Returns the chunks, the index of the text each chunk belongs to, and each chunk's character
+    span in its text. Texts that fit in one window are a single chunk, unchanged.
+    """
+    size = settings.EMBEDDING_CHUNK_TOKENS or max(model.max_seq_length - 2, 1)  # room for [CLS]/[SEP]
+    stride = size - min(settings.EMBEDDING_CHUNK_OVERLAP, size // 2)
+
+    # A word piece covers at least one character, so shorter texts never need the tokenizer
+    long_texts = [i for i, text in enumerate(texts) if settings.EMBEDDING_CHUNKING and len(text) > size]
+    offsets: Dict[int, List[Tuple[int, int]]] = {}
+    if long_texts:
+        encoded = model.tokenizer(
+            [texts[i] for i in long_texts], add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )
+        offsets = dict(zip(long_texts, encoded["offset_mapping"]))
+
+    chunks: List[str] = []
+    owners: List[int] = []
+    spans: List[Tuple[int, int]] = []
+    for i, text in enumerate(texts):
+        pieces = offsets.get(i)
+        if pieces is None or len(pieces) <= size:
+            chunks.append(text)
+            owners.append(i)
+            spans.append((0, len(text)))
+            continue
+        # Full windows every `stride` pieces; the last one is aligned with the end of the text
+        for start in list(range(0, len(pieces) - size, stride)) + [len(pieces) - size]:
+            span = (pieces[start][0], pieces[start + size - 1][1])
+            chunks.append(text[span[0]:span[1]])
+            owners.append(i)
+            spans.append(span)
+    return chunks, np.asarray(owners, dtype=np.int64), spans
+
+
+def pool_chunk_embeddings(chunk_embs: np.ndarray, owners: np.ndarray, count: int) -> np.ndarray:
+    """Mean of the chunk embeddings of each text (a one-chunk text keeps its embedding as is)."""
+    pooled = np.zeros((count, chunk_embs.shape[1]), dtype=np.float32)
+    np.add.at(pooled, owners, chunk_embs)
+    return pooled / np.bincount(owners, minlength=count)[:, None].astype(np.float32)
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embeddings of whole texts: all chunks of all texts in one encode call, pooled per text."""
     if not model:
         raise ValueError("Embedding model not initialized")
-    return model.encode(text, convert_to_tensor=True).tolist()
+    chunks, owners, _ = chunk_texts(texts)
+    return pool_chunk_embeddings(model.encode(chunks, convert_to_numpy=True).astype(np.float32, copy=False), owners, len(texts))
+
+
+def generate_embedding(text: str) -> List[float]:
+    """Generate embedding using SentenceTransformer (chunked and pooled for long texts)."""
+    return embed_texts([text])[0].tolist()
 
 
 def calculate_keyword_match_score(keywords: List[str], brand_name: str, raw_text: str) -> float:
@@ -67,16 +149,19 @@ def calculate_keyword_match_score(keywords: List[str], brand_name: str, raw_text
     return round(matches / len(keywords), 3)
 
 
-def calculate_brand_frequency(brand_name: str, raw_text: str) -> float:
+def calculate_brand_frequency(brand_name: str, raw_text: str, brand_mentions: int | None = None) -> float:
     """
     Brand Appearance Frequency:
-    Count occurrences of brand in text relative to total tokens.
+    Count occurrences of brand (including registry aliases) in text relative to total tokens.
+    Pass brand_mentions from a registry scan to avoid scanning the text again.
     Range: 0 → 1
     """
-    tokens = raw_text.lower().split()
+    tokens = raw_text.split()
     if not tokens:
         return 0.0
-    freq = tokens.count(brand_name.lower()) / len(tokens)
+    if brand_mentions is None:
+        brand_mentions = brand_registry.scan(raw_text, brand_name)["brand_mentions"]
+    freq = brand_mentions / len(tokens)
     return round(min(freq * 10, 1.0), 3)  # scaled but capped to 1.0
 
 
@@ -88,19 +173,21 @@ def calculate_semantic_similarity(raw_text: str, brand_name: str) -> float:
     if not model:
         return 0.0
     brand_emb = model.encode(brand_name)
-    text_emb = model.encode(raw_text)
+    text_emb = embed_texts([raw_text])[0]
     sim = util.cos_sim(brand_emb, text_emb).item()
     return round((sim + 1) / 2, 3)  # map [-1,1] → [0,1]
 
 
-def calculate_correctness_score(raw_text: str, brand_name: str) -> float:
+def calculate_correctness_score(raw_text: str, brand_name: str, brand_mentions: int | None = None) -> float:
     """
     A placeholder correctness scoring function.
     You may later expand this using a fact-check prompt or RAG lookup.
     Range: 0 → 1
     """
-    # Rule-based placeholder: if brand exists in text → good
-    score = 1.0 if brand_name.lower() in raw_text.lower() else 0.3
+    if brand_mentions is None:
+        brand_mentions = brand_registry.scan(raw_text, brand_name)["brand_mentions"]
+    # Rule-based placeholder: if brand (or an alias) exists in text → good
+    score = 1.0 if brand_mentions > 0 else 0.3
     return round(score, 3)
 
 
@@ -117,6 +204,18 @@ def calculate_model_consistency(previous_scores: List[float], current_score: flo
     return round(max(min(stability, 1.0), 0.0), 3)
 
 
+def calculate_embedding_consistency(similarities: np.ndarray) -> float:
+    """
+    Embedding consistency score:
+    Mean cosine similarity between the new answer and previous answers for the same brand.
+    Range: 0 → 1
+    """
+    if similarities.size == 0:
+        return 1.0  # no history yet = fully consistent
+    mean_sim = float(np.mean(similarities))
+    return round(max(min((mean_sim + 1) / 2, 1.0), 0.0), 3)  # map [-1,1] → [0,1]
+
+
 def calculate_visibility_score(
     sentiment_score: float,
     semantic_similarity: float,
@@ -153,64 +252,245 @@ def calculate_visibility_score(
     return round(score * 100, 2)  # Range → 0–100
 
 
-async def start_analysis_pipeline(response_id: str, brand_name: str, raw_llm_response: str):
-    print(f"--- Starting enhanced analysis pipeline for ID: {response_id} ---")
+def extract_features_batch(raw_texts: List[str], brand_names: List[str]) -> List[Dict[str, Any]]:
+    """
+    Computes every history-independent sub-score for a batch of responses.
+    The chunks of all responses and the distinct brand names are embedded in a single encode call.
+    Returns one feature dict per response, in input order.
+    """
+    if not model:
+        raise ValueError("Embedding model not initialized")
 
-    # 1. Extract features
-    keywords = extract_keywords(raw_llm_response)
-    sentiment_score = get_sentiment_score(raw_llm_response)
-    embedding_vector = generate_embedding(raw_llm_response)
+    unique_brands = list(dict.fromkeys(brand_names))
+    with observe_stage("chunking"):
+        chunks, owners, spans = chunk_texts(raw_texts)
+    with observe_stage("embedding"):
+        embeddings = model.encode(chunks + unique_brands, convert_to_numpy=True)
+    chunk_embs = embeddings[:len(chunks)].astype(np.float32, copy=False)
+    text_embs = pool_chunk_embeddings(chunk_embs, owners, len(raw_texts))
+    brand_embs = embeddings[len(chunks):]
+    brand_row = {brand: i for i, brand in enumerate(unique_brands)}
+
+    def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+        return np.einsum("ij,ij->i", a, b) / np.maximum(norms, 1e-12)
+
+    with observe_stage("similarity"):
+        # Cosine similarity of each response, and of each of its chunks, against its own brand in one pass
+        paired_brand_embs = brand_embs[[brand_row[b] for b in brand_names]]
+        cos = cosine(text_embs, paired_brand_embs)
+        chunk_cos = cosine(chunk_embs, paired_brand_embs[owners])
+    chunk_similarities: List[List[Dict[str, Any]]] = [[] for _ in raw_texts]
+    for owner, (start, end), similarity in zip(owners.tolist(), spans, chunk_cos.tolist()):
+        chunk_similarities[owner].append({"start": start, "end": end, "similarity": round((similarity + 1) / 2, 3)})
+
+    with observe_stage("keywords"):
+        keywords = [extract_keywords(raw_text) for raw_text in raw_texts]
+    with observe_stage("sentiment"):
+        if sentiment_engine is not None:
+            # One pass scores each response and each of its sentences
+            sentiments = get_sentence_sentiments(raw_texts)
+            sentiment_scores = [sentiment["compound"] for sentiment in sentiments]
+            sentence_sentiments = [sentiment["sentences"] for sentiment in sentiments]
+        else:
+            sentiment_scores = get_sentiment_scores(raw_texts)
+            sentence_sentiments = [[] for _ in raw_texts]
+    with observe_stage("entity_scan"):
+        # One Aho-Corasick pass per response finds the brand, its aliases and its competitors
+        entities = [brand_registry.scan(raw_text, brand_name) for raw_text, brand_name in zip(raw_texts, brand_names)]
+
+    features = []
+    for i, (raw_text, brand_name) in enumerate(zip(raw_texts, brand_names)):
+        brand_mentions = entities[i]["brand_mentions"]
+        features.append({
+            "keywords": keywords[i],
+            "sentiment_score": sentiment_scores[i],
+            "sentence_sentiments": sentence_sentiments[i],  # which sentences carry the sentiment
+            "embedding_vector": text_embs[i],
+            "keyword_match": calculate_keyword_match_score(keywords[i], brand_name, raw_text),
+            "semantic_similarity": round((float(cos[i]) + 1) / 2, 3),  # map [-1,1] → [0,1]
+            "chunk_similarities": chunk_similarities[i],  # where in the response the brand is discussed
+            "brand_freq": calculate_brand_frequency(brand_name, raw_text, brand_mentions),
+            "correctness": calculate_correctness_score(raw_text, brand_name, brand_mentions),
+            "share_of_voice": entities[i]["share_of_voice"],
+            "competitor_mentions": entities[i]["competitor_mentions"],
+        })
+    return features
+
+
+def build_analysis_document(
+    response_id: str,
+    brand_name: str,
+    features: Dict[str, Any],
+    consistency: float,
+    visibility_score: float,
+    timestamp: datetime.datetime,
+) -> Dict[str, Any]:
+    """
+    Builds the Elasticsearch analysis document from the extracted features and final scores.
+    The embedding stays a float32 ndarray; the orjson serializer writes it into the request body directly.
+    """
+    return {
+        "response_id": response_id,
+        "brand_keyword": brand_name,
+        "keywords": " ".join(features["keywords"]),
+        "sentiment_score": features["sentiment_score"],
+        "sentence_sentiments": features["sentence_sentiments"],
+        "semantic_similarity": features["semantic_similarity"],
+        "chunk_similarities": features["chunk_similarities"],
+        "keyword_match": features["keyword_match"],
+        "brand_freq": features["brand_freq"],
+        "correctness": features["correctness"],
+        "share_of_voice": features["share_of_voice"],
+        "mentioned_competitors": sorted(features["competitor_mentions"]),
+        "consistency": consistency,
+        "visibility_score": visibility_score,
+        "timestamp": timestamp,
+        "embedding_vector": features["embedding_vector"],
+    }
 
-    # 2. NEW: calculate advanced metrics
-    keyword_match = calculate_keyword_match_score(keywords, brand_name, raw_llm_response)
-    semantic_similarity = calculate_semantic_similarity(raw_llm_response, brand_name)
-    brand_freq = calculate_brand_frequency(brand_name, raw_llm_response)
-    correctness = calculate_correctness_score(raw_llm_response, brand_name)
 
+async def _consistency(storage, brand_name: str, features: Dict[str, Any]) -> float:
+    """Consistency of a new answer with the previous answers for the same brand."""
+    if settings.VECTOR_STORE_ENABLED:
+        # One dot product against the brand's memory-mapped embedding history, no network call
+        with observe_stage("consistency"):
+            similarities = vector_store.similarities(
+                brand_name, features["embedding_vector"], last_n=settings.CONSISTENCY_WINDOW or None
+            )
+            consistency = calculate_embedding_consistency(similarities)
+            vector_store.append(brand_name, features["embedding_vector"])
+        return consistency
     # Placeholder: get last N scores from DB to measure consistency
-    previous_sentiment_scores = await get_visibility_scores(brand_name=brand_name) # You can later fetch from elasticsearch using full text.
-    consistency = calculate_model_consistency(previous_sentiment_scores, sentiment_score)
+    with observe_stage("score_fetch"):
+        previous_sentiment_scores = await storage.get_visibility_scores(brand_name=brand_name) # You can later fetch from elasticsearch using full text.
+    return calculate_model_consistency(previous_sentiment_scores, features["sentiment_score"])
+
+
+async def start_analysis_pipeline(response_id: str, brand_name: str, raw_llm_response: str, timestamp: datetime.datetime):
+    """
+    Analyses one stored response. `timestamp` is the query record's timestamp: the analysis
+    document carries it (as backfills do), so both place the document in the same ES partition.
+    """
+    # Profiling is opt-in per session; when it is off this is a single attribute check
+    if pipeline_profiler.active:
+        with pipeline_profiler.run(), PIPELINES_IN_FLIGHT.track_inprogress(), observe_stage("total"):
+            await _run_analysis_pipeline(response_id, brand_name, raw_llm_response, timestamp)
+        return
+    with PIPELINES_IN_FLIGHT.track_inprogress(), observe_stage("total"):
+        await _run_analysis_pipeline(response_id, brand_name, raw_llm_response, timestamp)
+
+
+async def _run_analysis_pipeline(response_id: str, brand_name: str, raw_llm_response: str, timestamp: datetime.datetime):
+    print(f"--- Starting enhanced analysis pipeline for ID: {response_id} ---")
+    storage = get_storage()
+
+    # 1. Extract features (keywords, sentiment, embedding and the brand sub-scores).
+    #    A near-duplicate of a recently scored answer for the same brand reuses its features.
+    features = None
+    if settings.DEDUP_ENABLED:
+        with observe_stage("dedup_lookup"):
+            fingerprint = simhash(raw_llm_response)
+            features = near_duplicates.lookup(brand_name, fingerprint)
+    if features is None:
+        features = extract_features_batch([raw_llm_response], [brand_name])[0]
+        if settings.DEDUP_ENABLED:
+            near_duplicates.add(brand_name, fingerprint, features)
+    else:
+        print(f"Near-duplicate response for '{brand_name}': reusing sub-scores for {response_id}")
+    sentiment_score = features["sentiment_score"]
+
+    # 2. Consistency against previous answers for the same brand
+    consistency = await _consistency(storage, brand_name, features)
 
     # 3. Final enhanced visibility score
     visibility_score = calculate_visibility_score(
         sentiment_score,
-        semantic_similarity,
-        keyword_match,
-        brand_freq,
-        correctness,
+        features["semantic_similarity"],
+        features["keyword_match"],
+        features["brand_freq"],
+        features["correctness"],
         consistency
     )
 
     # 4. Build Elasticsearch Document
-    analysis_document = {
-        "response_id": response_id,
-        "brand_keyword": brand_name,
-        "keywords": " ".join(keywords),
-        "sentiment_score": sentiment_score,
-        "semantic_similarity": semantic_similarity,
-        "keyword_match": keyword_match,
-        "brand_freq": brand_freq,
-        "correctness": correctness,
-        "consistency": consistency,
-        "visibility_score": visibility_score,
-        "timestamp": datetime.datetime.now(datetime.timezone.utc),
-        "embedding_vector": embedding_vector,
-    }
+    analysis_document = build_analysis_document(
+        response_id,
+        brand_name,
+        features,
+        consistency,
+        visibility_score,
+        timestamp,
+    )
 
-    # 5. Insert into Elasticsearch
-    await index_analysis_document(analysis_document)
+    # 5. Index the analysis document (Elasticsearch, or SQLite + vector file when embedded)
+    with observe_stage("analysis_index"):
+        await storage.index_analysis_document(analysis_document)
 
-    # 6. Update MongoDB record
-    await update_query_status_and_score(response_id, visibility_score)
+    # 6. Update the query record (MongoDB / SQLite)
+    with observe_stage("record_update"):
+        await storage.update_query_status_and_score(response_id, visibility_score)
 
-    if settings.ENVIRONMENT == "CLOUD":
-        # 7. Insert Historical Record into BigQuery (embedding removed)
-        historical_doc = analysis_document.copy()
-        historical_doc.pop("embedding_vector", None)
-        historical_doc["llm_response"] = raw_llm_response
-        bigquery_client = get_big_query()
-        await bigquery_client.insert_record(record=BigQueryHistoryRecord(**historical_doc))
-    else:
-        await insert_brand_performance(response_id, brand_name, visibility_score)
+    # 7. Historical performance row (BigQuery in CLOUD, PostgreSQL locally, SQLite when embedded)
+    with observe_stage("performance_write"):
+        await storage.record_performance(analysis_document, raw_llm_response)
 
     print(f"--- Enhanced analysis pipeline completed for {response_id} ---")
+
+
+async def start_batch_analysis_pipeline(items: List[Tuple[str, str, str, datetime.datetime]]):
+    """
+    Analyses several stored responses, given as (response_id, brand_name, raw_llm_response, timestamp)
+    with the query record's timestamp, in one pass: a single embedding call for all of them and bulk
+    writes for the results. Used by multi-model comparisons.
+    """
+    if pipeline_profiler.active:
+        with pipeline_profiler.run(), PIPELINES_IN_FLIGHT.track_inprogress(), observe_stage("total"):
+            await _run_batch_analysis_pipeline(items)
+        return
+    with PIPELINES_IN_FLIGHT.track_inprogress(), observe_stage("total"):
+        await _run_batch_analysis_pipeline(items)
+
+
+async def _run_batch_analysis_pipeline(items: List[Tuple[str, str, str, datetime.datetime]]):
+    if not items:
+        return
+    print(f"--- Starting batch analysis pipeline for {len(items)} responses ---")
+    storage = get_storage()
+    response_ids = [response_id for response_id, _, _, _ in items]
+    brand_names = [brand_name for _, brand_name, _, _ in items]
+    raw_texts = [raw_llm_response for _, _, raw_llm_response, _ in items]
+    timestamps = [timestamp for _, _, _, timestamp in items]
+
+    # 1. Features of every response in one batch, off the event loop
+    features_list = await pipeline_profiler.to_thread(extract_features_batch, raw_texts, brand_names)
+    if settings.DEDUP_ENABLED:
+        for brand_name, raw_text, features in zip(brand_names, raw_texts, features_list):
+            near_duplicates.add(brand_name, simhash(raw_text), features)
+
+    # 2-4. Consistency (in input order, so each answer is compared with the ones before it),
+    #      final scores and analysis documents
+    documents = []
+    for response_id, brand_name, features, timestamp in zip(response_ids, brand_names, features_list, timestamps):
+        consistency = await _consistency(storage, brand_name, features)
+        visibility_score = calculate_visibility_score(
+            features["sentiment_score"],
+            features["semantic_similarity"],
+            features["keyword_match"],
+            features["brand_freq"],
+            features["correctness"],
+            consistency
+        )
+        documents.append(build_analysis_document(response_id, brand_name, features, consistency, visibility_score, timestamp))
+
+    # 5-7. Bulk writes
+    with observe_stage("analysis_index"):
+        await storage.bulk_index_analysis_documents(documents)
+    with observe_stage("record_update"):
+        await storage.bulk_update_query_scores({doc["response_id"]: doc["visibility_score"] for doc in documents})
+    with observe_stage("performance_write"):
+        await asyncio.gather(*(
+            storage.record_performance(document, raw_text) for document, raw_text in zip(documents, raw_texts)
+        ))
+
+    print(f"--- Batch analysis pipeline completed for {len(items)} responses ---")
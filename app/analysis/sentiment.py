@@ -0,0 +1,292 @@
+"""
+Batched, sentence-level sentiment with the same scores as NLTK's VADER.
+
+VADER scores one text at a time in pure Python (and re-scans the word list for every word).
+SentimentEngine tokenizes a whole batch once, looks the tokens up in precomputed per-token
+arrays (valence, booster, negation, caps, ...) and applies VADER's rules (caps emphasis,
+boosters and dampeners, negation, "never so", "least", "kind of", "but", punctuation
+emphasis) as NumPy operations over the flat token array of the batch. The same token array
+is scored twice, segmented by text and by sentence, so the aggregate of a text is exactly
+VADER's compound for the whole text, and every sentence gets the compound VADER gives it alone.
+"""
+import string
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+
+_PUNCTUATION = string.punctuation
+_PUNC_SET = frozenset(VaderConstants.PUNC_LIST)
+_SENTENCE_END = (".", "!", "?")
+
+# Columns of the per-token table
+(LEX, IN_LEX, UPPER, BOOST, IS_BOOST, NEG, LEAST, AT, VERY, KIND, OF, BUT, NEVER, SO_THIS) = range(14)
+_COLUMNS = 14
+
+
+def _shift(values: np.ndarray, k: int, fill) -> np.ndarray:
+    """values[p - k] at position p (k > 0 looks back, k < 0 looks ahead)."""
+    if k == 0:
+        return values.copy()
+    out = np.full_like(values, fill)
+    if k > 0:
+        out[k:] = values[:-k]
+    else:
+        out[:k] = values[-k:]
+    return out
+
+
+def _segment_sums(values: np.ndarray, segment: np.ndarray, segments: int) -> np.ndarray:
+    """Per-segment sums added left to right like VADER's sum() (NumPy sums pairwise); zeros are skipped."""
+    sums = [0.0] * segments
+    nonzero = np.flatnonzero(values)
+    for s, value in zip(segment[nonzero].tolist(), values[nonzero].tolist()):
+        sums[s] += value
+    return np.asarray(sums, dtype=np.float64)
+
+
+class SentimentEngine:
+    """Vectorized VADER over batches of texts; built from a loaded SentimentIntensityAnalyzer."""
+
+    # Distinct tokens kept in the lookup tables before they are rebuilt from scratch
+    MAX_TOKEN_TYPES = 200_000
+
+    # Batches are scored on the event loop and in to_thread workers at the same time: the token
+    # tables only change under the lock, and scoring works on a snapshot taken with it. A reset
+    # replaces the tables instead of clearing them, so an older snapshot stays consistent.
+
+    def __init__(self, analyzer: SentimentIntensityAnalyzer):
+        self.analyzer = analyzer
+        self.lexicon = analyzer.lexicon
+        self.constants = analyzer.constants
+        # First two words of the multi-word idioms and boosters; only words next to one need VADER itself
+        self._idiom_heads = {
+            tuple(phrase.split()[:2])
+            for phrase in list(self.constants.SPECIAL_CASE_IDIOMS) + [k for k in self.constants.BOOSTER_DICT if " " in k]
+        }
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._raw_tokens: Dict[str, Tuple[int, int, int, bool]] = {}  # raw token -> (type id or -1, '!', '?', ends sentence)
+        self._type_ids: Dict[str, int] = {}
+        self._types: List[str] = []
+        self._rows: List[Tuple[float, ...]] = []
+        self._table = np.zeros((0, _COLUMNS), dtype=np.float64)
+
+    def _type_row(self, word: str) -> Tuple[float, ...]:
+        lower = word.lower()
+        valence = self.lexicon.get(lower)
+        booster = self.constants.BOOSTER_DICT.get(lower)
+        return (
+            valence or 0.0,
+            valence is not None,
+            word.isupper(),
+            booster or 0.0,
+            booster is not None,
+            lower in self.constants.NEGATE or "n't" in lower,
+            lower == "least",
+            lower == "at",
+            lower == "very",
+            lower == "kind",
+            lower == "of",
+            lower == "but",
+            word == "never",
+            word in ("so", "this"),
+        )
+
+    def _raw_token(self, raw: str) -> Tuple[int, int, int, bool]:
+        """VADER's token for a whitespace-separated chunk: one leading or trailing punctuation run is dropped."""
+        word = raw
+        if len(raw) > 1:
+            lead = len(raw) - len(raw.lstrip(_PUNCTUATION))
+            trail = len(raw) - len(raw.rstrip(_PUNCTUATION))
+            core = raw[lead:len(raw) - trail]
+            if bool(lead) != bool(trail) and len(core) > 1 and not any(c in _PUNCTUATION for c in core):
+                if (raw[:lead] if lead else raw[-trail:]) in _PUNC_SET:
+                    word = core
+            type_id = self._type_ids.get(word)
+            if type_id is None:
+                type_id = self._type_ids[word] = len(self._types)
+                self._types.append(word)
+                self._rows.append(self._type_row(word))
+        else:
+            type_id = -1  # single characters are not tokens in VADER
+        info = (type_id, raw.count("!"), raw.count("?"), raw.rstrip("\"')]*").endswith(_SENTENCE_END))
+        self._raw_tokens[raw] = info
+        return info
+
+    def _tokenize(self, texts: Sequence[str], keep_raw: bool):
+        with self._lock:
+            return self._tokenize_locked(texts, keep_raw)
+
+    def _tokenize_locked(self, texts: Sequence[str], keep_raw: bool):
+        if len(self._types) > self.MAX_TOKEN_TYPES:
+            self._reset()
+        cache = self._raw_tokens
+        type_ids: List[int] = []
+        bangs: List[int] = []
+        questions: List[int] = []
+        raws: List[str] = []
+        text_bounds: List[int] = [0]
+        sentence_bounds: List[int] = [0]
+        for text in texts:
+            for line in text.splitlines():
+                for raw in line.split():
+                    info = cache.get(raw) or self._raw_token(raw)
+                    type_ids.append(info[0])
+                    bangs.append(info[1])
+                    questions.append(info[2])
+                    if keep_raw:
+                        raws.append(raw)
+                    if info[3]:
+                        sentence_bounds.append(len(type_ids))
+                if sentence_bounds[-1] != len(type_ids):
+                    sentence_bounds.append(len(type_ids))  # a line break ends a sentence too
+            text_bounds.append(len(type_ids))
+        if len(self._rows) > len(self._table):
+            self._table = np.vstack([self._table, np.asarray(self._rows[len(self._table):], dtype=np.float64)])
+        idiom_heads = [
+            (self._type_ids[first], self._type_ids[second])
+            for first, second in self._idiom_heads
+            if first in self._type_ids and second in self._type_ids
+        ]
+        vocabulary = (self._table, self._types, idiom_heads)  # _types is append-only until a reset replaces it
+        return (
+            vocabulary,
+            np.asarray(type_ids, dtype=np.int64),
+            np.asarray(bangs, dtype=np.int64),
+            np.asarray(questions, dtype=np.int64),
+            raws,
+            np.asarray(text_bounds, dtype=np.int64),
+            np.asarray(sentence_bounds, dtype=np.int64),
+        )
+
+    def _fallback_valence(self, words: List[str], i: int, is_cap_diff: bool) -> float:
+        sentitext = SimpleNamespace(words_and_emoticons=words, is_cap_diff=is_cap_diff)
+        return self.analyzer.sentiment_valence(0, sentitext, words[i], i, [])[-1]
+
+    def _compounds(self, vocabulary, types: np.ndarray, raw_starts: np.ndarray, raw_ends: np.ndarray, bangs: np.ndarray, questions: np.ndarray, kept_before: np.ndarray) -> np.ndarray:
+        """VADER compound of every segment [raw_starts, raw_ends) of the raw token array."""
+        C, N = self.constants.C_INCR, self.constants.N_SCALAR
+        type_table, type_words, idiom_heads = vocabulary
+        starts, ends = kept_before[raw_starts], kept_before[raw_ends]
+        lengths = ends - starts
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        offset = np.arange(len(types)) - starts[segment]
+        remaining = ends[segment] - 1 - np.arange(len(types))
+
+        table = type_table[types]
+
+        def flag(column: int) -> np.ndarray:
+            return table[:, column] > 0
+
+        in_lex, upper, is_boost, neg = flag(IN_LEX), flag(UPPER), flag(IS_BOOST), flag(NEG)
+        boost, so_this, never = table[:, BOOST], flag(SO_THIS), flag(NEVER)
+
+        # is_cap_diff: some but not all tokens of the segment are ALL CAPS
+        upper_count = np.bincount(segment, weights=upper, minlength=len(starts))
+        cap_diff = ((lengths - upper_count) > 0) & ((lengths - upper_count) < lengths)
+        cap_emphasis = cap_diff[segment]
+
+        valence = table[:, LEX].copy()
+        valence = np.where(upper & cap_emphasis, np.where(valence > 0, valence + C, valence - C), valence)
+        for k, damp in ((0, 1.0), (1, 0.95), (2, 0.9)):
+            # Modifier k+1 words back (only when that word is not itself sentiment-laden)
+            applies = (offset > k) & ~_shift(in_lex, k + 1, True)
+            scalar = np.where(_shift(is_boost, k + 1, False), np.where(valence < 0, -1.0, 1.0) * _shift(boost, k + 1, 0.0), 0.0)
+            capped = _shift(is_boost, k + 1, False) & _shift(upper, k + 1, False) & cap_emphasis
+            scalar = np.where(capped, np.where(valence > 0, scalar + C, scalar - C), scalar) * damp
+            valence = np.where(applies, valence + scalar, valence)
+            if k == 0:
+                valence = np.where(applies & _shift(neg, 1, False), valence * N, valence)
+            elif k == 1:
+                never_so = _shift(never, 2, False) & _shift(so_this, 1, False)
+                valence = np.where(applies & never_so, valence * 1.5, np.where(applies & _shift(neg, 2, False), valence * N, valence))
+            else:
+                never_so = (_shift(never, 3, False) & _shift(so_this, 2, False)) | _shift(so_this, 1, False)
+                valence = np.where(applies & never_so, valence * 1.25, np.where(applies & _shift(neg, 3, False), valence * N, valence))
+
+        least = _shift(flag(LEAST), 1, False) & ~_shift(in_lex, 1, True)
+        at_very = _shift(flag(AT) | flag(VERY), 2, False)
+        valence = np.where(((offset > 1) & least & ~at_very) | ((offset == 1) & least), valence * N, valence)
+
+        # "kind of" and booster words carry no valence of their own
+        skip = is_boost | (flag(KIND) & (remaining > 0) & _shift(flag(OF), -1, False))
+        scored = in_lex & ~skip
+        valence = np.where(scored, valence, 0.0)
+
+        # Idioms ("the bomb", "kiss of death", ...) and "kind of"/"sort of" dampening: rare, let VADER decide
+        idiom_start = np.zeros(len(types), dtype=bool)
+        following = _shift(types, -1, -1)
+        for first, second in idiom_heads:
+            idiom_start |= (types == first) & (following == second)
+        near_idiom = np.zeros(len(types), dtype=bool)
+        for k in range(-1, 4):
+            near_idiom |= _shift(idiom_start, k, False)
+        for p in np.flatnonzero(scored & near_idiom & (offset > 2) & ~_shift(in_lex, 3, True)):
+            s = segment[p]
+            words = [type_words[t] for t in types[starts[s]:ends[s]]]
+            valence[p] = self._fallback_valence(words, int(offset[p]), bool(cap_diff[s]))
+
+        # VADER scores every repeat of a word as if it stood where the word first occurs
+        if len(types):
+            keys = segment * (len(type_table) + 1) + types
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            valence = valence[first][inverse.reshape(-1)]
+
+        # "but": sentiment before the first one is halved, after it weighted 1.5x
+        but_at = np.full(len(starts), np.iinfo(np.int64).max)
+        but_positions = np.flatnonzero(flag(BUT))
+        np.minimum.at(but_at, segment[but_positions], offset[but_positions])
+        first_but = but_at[segment]
+        has_but = first_but != np.iinfo(np.int64).max
+        valence = np.where(has_but & (offset < first_but), valence * 0.5, np.where(has_but & (offset > first_but), valence * 1.5, valence))
+
+        sums = _segment_sums(valence, segment, len(starts))
+        bang_count = np.minimum(_raw_sums(bangs, raw_starts, raw_ends), 4)
+        question_count = _raw_sums(questions, raw_starts, raw_ends)
+        amplifier = bang_count * 0.292 + np.where(question_count > 1, np.where(question_count <= 3, question_count * 0.18, 0.96), 0.0)
+        sums = np.where(sums > 0, sums + amplifier, np.where(sums < 0, sums - amplifier, sums))
+        compounds = sums / np.sqrt(sums * sums + 15)
+        return np.where(lengths > 0, np.round(compounds, 4), 0.0)
+
+    def _score(self, texts: Sequence[str], sentences: bool):
+        vocabulary, types, bangs, questions, raws, text_bounds, sentence_bounds = self._tokenize(texts, keep_raw=sentences)
+        kept = types >= 0
+        kept_before = np.concatenate([[0], np.cumsum(kept)])
+        kept_types = types[kept]
+        aggregate = self._compounds(vocabulary, kept_types, text_bounds[:-1], text_bounds[1:], bangs, questions, kept_before)
+        if not sentences:
+            return aggregate, None
+        per_sentence = self._compounds(vocabulary, kept_types, sentence_bounds[:-1], sentence_bounds[1:], bangs, questions, kept_before)
+        return aggregate, (raws, text_bounds, sentence_bounds, per_sentence)
+
+    def compound_scores(self, texts: Sequence[str]) -> List[float]:
+        """VADER compound score of every text, in input order."""
+        aggregate, _ = self._score(texts, sentences=False)
+        return [float(score) for score in aggregate]
+
+    def sentence_scores(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        Per text: its compound score and its sentences (split after '.', '!', '?' and at line
+        breaks), each with its own compound score.
+        """
+        aggregate, (raws, text_bounds, sentence_bounds, per_sentence) = self._score(texts, sentences=True)
+        results = []
+        sentence = 0
+        for i, score in enumerate(aggregate):
+            items = []
+            while sentence < len(per_sentence) and sentence_bounds[sentence] < text_bounds[i + 1]:
+                start, end = sentence_bounds[sentence], sentence_bounds[sentence + 1]
+                items.append({"text": " ".join(raws[start:end]), "compound": float(per_sentence[sentence])})
+                sentence += 1
+            results.append({"compound": float(score), "sentences": items})
+        return results
+
+
+def _raw_sums(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    totals = np.concatenate([[0], np.cumsum(values)])
+    return totals[ends] - totals[starts]
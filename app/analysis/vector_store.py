@@ -0,0 +1,256 @@
+import contextlib
+import hashlib
+import os
+import re
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator
+
+import numpy as np
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within the process
+    fcntl = None
+
+
+# File layout: 16-byte header (magic, dtype code, dimension) followed by fixed-size rows
+_HEADER = struct.Struct("<8sB3xI")
+_MAGIC = b"GSVTVEC1"
+_DTYPE_CODES = {np.dtype(np.float32): 1, np.dtype(np.float16): 2}
+_CODE_DTYPES = {code: dtype for dtype, code in _DTYPE_CODES.items()}
+
+
+@dataclass
+class _VectorFile:
+    """In-RAM header entry for one append-only vector file."""
+    path: str
+    dtype: np.dtype
+    dim: int
+    count: int
+    inode: int = 0
+    mmap: np.memmap | None = None
+    mapped_count: int = 0
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * self.dtype.itemsize
+
+
+class LocalVectorStore:
+    """
+    Per-key (brand) on-disk store of unit-normalised embeddings.
+
+    Each key has an append-only file of float32/float16 rows that is memory-mapped
+    with NumPy for reads, so comparing a new vector with the whole history is a single
+    vectorised dot product without any network call. With max_rows set, a file that
+    grows a quarter past it is compacted (rewritten and swapped in) under the append lock.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float16", max_rows: int = 0):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in _DTYPE_CODES:
+            raise ValueError(f"Unsupported vector store dtype '{dtype}'. Use float32 or float16.")
+        self.max_rows = max_rows
+        self._files: Dict[str, _VectorFile] = {}
+        # Appends come from the event loop and from to_thread batch pipelines (and from other
+        # worker processes): writers hold this lock plus an flock on the file's .lock sidecar
+        self._lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def _exclusive(self, path: str) -> Iterator[None]:
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _path(self, key: str, dim: int) -> str:
+        # Readable slug plus a hash so different brands never collide; the dimension keeps
+        # vectors of a replaced embedding model in separate files.
+        slug = re.sub(r"[^a-z0-9]+", "-", key.lower()).strip("-")[:40] or "key"
+        digest = hashlib.sha1(key.lower().encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.directory, f"{slug}-{digest}.{dim}d.vec")
+
+    def _open(self, key: str, dim: int, create: bool) -> _VectorFile | None:
+        entry = self._files.get(key.lower())
+        if entry is not None and entry.dim == dim:
+            # Other processes may have appended, or compacted the file into a new one, since we last looked
+            stat = os.stat(entry.path)
+            if stat.st_ino != entry.inode:
+                entry.inode = stat.st_ino
+                entry.mmap = None
+                entry.mapped_count = 0
+            entry.count = (stat.st_size - _HEADER.size) // entry.row_bytes
+            return entry
+
+        path = self._path(key, dim)
+        if not os.path.exists(path):
+            if not create:
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                with open(path, "xb") as f:
+                    f.write(_HEADER.pack(_MAGIC, _DTYPE_CODES[self.dtype], dim))
+            except FileExistsError:
+                pass  # created concurrently by another process
+
+        with open(path, "rb") as f:
+            magic, dtype_code, file_dim = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or file_dim != dim:
+            raise ValueError(f"'{path}' is not a {dim}-dimensional vector store file.")
+
+        stat = os.stat(path)
+        entry = _VectorFile(path=path, dtype=_CODE_DTYPES[dtype_code], dim=dim, count=0, inode=stat.st_ino)
+        entry.count = (stat.st_size - _HEADER.size) // entry.row_bytes
+        self._files[key.lower()] = entry
+        return entry
+
+    def _rows(self, entry: _VectorFile) -> np.ndarray:
+        """Returns a read-only memory map over all complete rows, remapping only when the file grew."""
+        if entry.count == 0:
+            return np.empty((0, entry.dim), dtype=entry.dtype)
+        if entry.mmap is None or entry.mapped_count != entry.count:
+            with open(entry.path, "rb") as f:
+                # A compaction may have swapped the file since _open: map what this handle holds
+                stat = os.fstat(f.fileno())
+                entry.inode = stat.st_ino
+                entry.count = (stat.st_size - _HEADER.size) // entry.row_bytes
+                if entry.count == 0:
+                    return np.empty((0, entry.dim), dtype=entry.dtype)
+                entry.mmap = np.memmap(f, dtype=entry.dtype, mode="r", offset=_HEADER.size, shape=(entry.count, entry.dim))
+            entry.mapped_count = entry.count
+        return entry.mmap
+
+    def append(self, key: str, vector: np.ndarray) -> int:
+        """
+        Appends one embedding (normalised to unit length) to the key's history and returns its
+        row number. Row numbers are stable unless max_rows compaction drops older rows.
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+
+        entry = self._open(key, vector.shape[0], create=True)
+        data = vector.astype(entry.dtype).tobytes()
+        with self._exclusive(entry.path):
+            fd = os.open(entry.path, os.O_WRONLY | os.O_APPEND)
+            try:
+                written = 0
+                while written < len(data):
+                    written += os.write(fd, data[written:])
+                # No other writer can append while we hold the lock, so the size ends at our row
+                row = (os.fstat(fd).st_size - _HEADER.size) // entry.row_bytes - 1
+            finally:
+                os.close(fd)
+        entry.count = max(entry.count, row + 1)
+
+        if self.max_rows and entry.count > self.max_rows + self.max_rows // 4:
+            self.compact(key, vector.shape[0])
+        return row
+
+    def write(self, key: str, row: int, vector: np.ndarray) -> None:
+        """Overwrites an existing row in place (re-indexed documents keep their row)."""
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        entry = self._open(key, vector.shape[0], create=False)
+        if entry is None or not 0 <= row < entry.count:
+            raise IndexError(f"Row {row} does not exist for '{key}'.")
+        with self._exclusive(entry.path):
+            fd = os.open(entry.path, os.O_WRONLY)
+            try:
+                os.pwrite(fd, vector.astype(entry.dtype).tobytes(), _HEADER.size + row * entry.row_bytes)
+            finally:
+                os.close(fd)
+
+    def similarities(self, key: str, vector: np.ndarray, last_n: int | None = None) -> np.ndarray:
+        """
+        Cosine similarity of the vector against the last_n (or all) stored vectors for the key,
+        oldest first. Returns an empty array when there is no history.
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        entry = self._open(key, vector.shape[0], create=False)
+        if entry is None or entry.count == 0:
+            return np.empty(0, dtype=np.float32)
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        rows = self._rows(entry)
+        if last_n:
+            rows = rows[-last_n:]
+        # float16 rows are upcast to float32 inside the product, so precision and BLAS speed are kept
+        return rows @ vector
+
+    def vectors(self, key: str, dim: int) -> np.ndarray:
+        """All stored unit vectors of the key (read-only memory map, oldest first)."""
+        entry = self._open(key, dim, create=False)
+        if entry is None:
+            return np.empty((0, dim), dtype=self.dtype)
+        return self._rows(entry)
+
+    def compact(self, key: str, dim: int) -> None:
+        """
+        Rewrites the key's file keeping only the newest max_rows vectors. Runs under the append
+        lock, so no row is lost; other processes see the new inode and remap on their next call.
+        """
+        entry = self._open(key, dim, create=False)
+        if entry is None or not self.max_rows or entry.count <= self.max_rows:
+            return
+
+        with self._exclusive(entry.path):
+            # Re-read under the lock: another process may have appended or compacted meanwhile
+            entry = self._open(key, dim, create=False)
+            if entry.count <= self.max_rows:
+                return
+            self._rewrite(entry, np.array(self._rows(entry)[-self.max_rows:]))
+
+    def replace(self, key: str, vectors: np.ndarray) -> None:
+        """
+        Swaps the key's whole history for `vectors` (oldest first), e.g. after a re-scoring run
+        recomputed them. Takes the append lock, so concurrent appends land before or after the swap.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if self.max_rows:
+            vectors = vectors[-self.max_rows:]
+        entry = self._open(key, vectors.shape[1], create=True)
+        with self._exclusive(entry.path):
+            self._rewrite(entry, vectors.astype(entry.dtype))
+
+    def _rewrite(self, entry: _VectorFile, rows: np.ndarray) -> None:
+        """Writes `rows` to a new file and swaps it in; callers hold the append lock."""
+        tmp_path = f"{entry.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _DTYPE_CODES[entry.dtype], entry.dim))
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        entry.mmap = None
+        os.replace(tmp_path, entry.path)
+        entry.inode = os.stat(entry.path).st_ino
+        entry.count = rows.shape[0]
+        entry.mapped_count = 0
+
+    def count(self, key: str, dim: int) -> int:
+        entry = self._open(key, dim, create=False)
+        return entry.count if entry else 0
+
+
+vector_store = LocalVectorStore(
+    directory=settings.VECTOR_STORE_DIR,
+    dtype=settings.VECTOR_STORE_DTYPE,
+    max_rows=settings.VECTOR_STORE_MAX_ROWS,
+)
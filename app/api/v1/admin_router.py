@@ -0,0 +1,57 @@
+from typing import Any, Dict
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.core.models import ProfilingRequest
+from app.core.profiling import pipeline_profiler
+from app.services.llm_selector import get_llm_service
+from app.services.ollama_scheduler import ollama_scheduler
+from app.middlewares.auth_middleware import get_admin_user
+
+
+router = APIRouter()
+
+@router.post("/profiling/start")
+async def start_profiling(request: ProfilingRequest, admin_email: str = Depends(get_admin_user)) -> Dict[str, Any]:
+    """
+    Starts profiling the analysis pipeline for a bounded window and/or number of runs.
+    Profiles are written under PROFILE_OUTPUT_DIR when the session ends.
+    """
+    try:
+        return pipeline_profiler.start(
+            duration_seconds=request.duration_seconds,
+            max_runs=request.max_runs,
+            cpu=request.cpu,
+            memory=request.memory,
+            sample_interval_ms=request.sample_interval_ms,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+
+@router.post("/profiling/stop")
+async def stop_profiling(admin_email: str = Depends(get_admin_user)) -> Dict[str, Any]:
+    """
+    Ends the running session early and returns the files written.
+    """
+    return pipeline_profiler.stop()
+
+
+@router.get("/profiling/status")
+async def get_profiling_status(admin_email: str = Depends(get_admin_user)) -> Dict[str, Any]:
+    """
+    Progress of the running session, or the result of the last one.
+    """
+    return pipeline_profiler.status()
+
+
+@router.get("/llm/health")
+async def get_llm_health(admin_email: str = Depends(get_admin_user)) -> Dict[str, Any]:
+    """
+    Circuit breaker state, timeouts and recent latency percentiles of each LLM provider,
+    plus the queue of the client-side Ollama scheduler.
+    """
+    try:
+        return {**get_llm_service().health(), "ollama_scheduler": ollama_scheduler.stats()}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
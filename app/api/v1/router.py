@@ -1,98 +1,294 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Path
-from app.core.models import BrandQuery, QueryResponse, QueryRecord, AggregateMetrics, QueryDetails
-from app.services.llm_selector import get_llm_service
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from app.core.models import BrandQuery, QueryResponse, QueryRecord, AggregateMetrics, QueryDetails, SimilarResponsesResult, DedupStats, CompareQuery, ModelComparisonResponse, ModelComparison, TrackedBrandCreate, TrackedBrand, ExportDataset, ExportFormat
+from app.services.llm_selector import get_llm_service, get_comparison_services
+from app.services.model_comparison import query_models
+from app.services.brand_query import brand_prompt, initial_status, submit_brand_query
+from app.services.brand_tracking import new_tracked_brand
+from app.services.export import encode_export, export_filename, parquet_supported, MEDIA_TYPES
+from app.services.idempotency import IdempotencyInProgress, IdempotencyKeyMismatch, request_hash, run_once
 from app.services.llm_base import LLMBase
-from app.db.mongodb.storage import insert_query_record
 import datetime
 import asyncio
-from app.analysis.nlp_pipeline import start_analysis_pipeline
-from app.db.mongodb.storage import insert_query_record, get_query_details_by_id
-from app.db.big_query.service import get_big_query
-from app.db.postgres.storage import get_brand_metrics
-from app.middlewares.auth_middleware import get_current_user
-from app.core.config import settings
+import time
+import uuid
+from typing import Any, Dict, List, Tuple
+from app.analysis.nlp_pipeline import start_batch_analysis_pipeline, generate_embedding
+from app.analysis.dedup import near_duplicates
+from app.db.storage_selector import get_storage
+from app.middlewares.rate_limit_middleware import rate_limit
+from app.core.config import settings, AnalysisMode
+from app.core.http_cache import TTLCache, make_etag, is_not_modified, cache_headers, not_modified
 
 
 router = APIRouter()
 
+# Per-user token buckets (also authenticate the user): LLM generations, multi-model fan-outs, reads
+llm_rate_limit = rate_limit("llm")
+compare_rate_limit = rate_limit("compare")
+read_rate_limit = rate_limit("read")
+
+# Conditional GET state (per process): validators of finished records, and computed brand aggregates
+FINISHED_STATUSES = {"Complete", "Failed"}
+query_validators: TTLCache[Tuple[str, datetime.datetime | None]] = TTLCache(settings.QUERY_CACHE_SECONDS)
+brand_metrics_cache: TTLCache[Dict[str, Any]] = TTLCache(settings.METRICS_CACHE_SECONDS)
+
+
 @router.post("/query-brand", response_model=QueryResponse, status_code=status.HTTP_202_ACCEPTED)
 async def query_brand(
     query: BrandQuery,
+    response: Response,
+    idempotency_key: str | None = Header(None, min_length=1, max_length=255, description="Retries with the same key return the first response."),
     # Dependency Injection
     llm_service: LLMBase = Depends(get_llm_service),
-    current_user_email: str = Depends(get_current_user)
+    current_user_email: str = Depends(llm_rate_limit)
 ):
     """
     1. Queries the selected GenAI model about a brand.
     2. Stores the raw response in MongoDB.
     3. Triggers the asynchronous processing pipeline (ES indexing, score calculation).
+    With an Idempotency-Key, a retry (or a concurrent duplicate) gets the first response back
+    without asking the LLM again.
     """
-    brand_name = query.brand_name
-    query_prompt = f"Provide a brief, general overview of the brand: {brand_name}."
-    
+    async def submit() -> dict:
+        # Ask the LLM, store the record, start the analysis
+        submitted = await submit_brand_query(query.brand_name, current_user_email, llm_service)
+        return submitted.model_dump(mode="json")
+
     try:
-        # 1. Hit GenAI (LLM) API (Feature 1)
-        raw_llm_response = await llm_service.generate_response(query_prompt)
-        # Unique ID for tracking this specific request/response
-        response_id: str | None = None
+        if idempotency_key is None:
+            # Return the immediate, accepted (202) response to the client
+            # This tells the client "I got your request, here is the ID, processing is starting."
+            return await submit()
 
-        # Prepare initial response object
-        initial_response = QueryResponse(
-            brand_name=brand_name,
-            raw_llm_response=raw_llm_response,
-            status="Processing", # Indicate analysis is starting
-            response_id=None # Will be set after MongoDB insert
+        initial_response, replayed = await run_once(current_user_email, idempotency_key, request_hash(query.brand_name), submit)
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return initial_response
+
+    except IdempotencyKeyMismatch:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request."
         )
-        
-        # --- Step 2: Store Document in MongoDB ---
-        # The document stored in MongoDB combines the query details and the LLM response
-        full_document = QueryRecord(
-            user_query=query_prompt, # Store the full prompt used
-            response_data=initial_response,
-            timestamp=datetime.datetime.now(datetime.timezone.utc),
-            user_id=current_user_email 
+    except IdempotencyInProgress:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed.",
+            headers={"Retry-After": str(max(int(settings.IDEMPOTENCY_POLL_SECONDS), 1))},
         )
-        
+    except HTTPException:
+        # Re-raise explicit HTTP exceptions
+        raise
+    except ConnectionError as ce:
+        # Every LLM provider timed out, failed or has an open circuit breaker, or the record store is down
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Service unavailable: {ce}")
+    except Exception as e:
+        print(f"An error occurred during LLM query or process start: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"LLM Query Failed: {str(e)}")
+
+
+@router.post("/query-brand/compare", response_model=ModelComparisonResponse, status_code=status.HTTP_202_ACCEPTED)
+async def query_brand_compare(
+    query: CompareQuery,
+    current_user_email: str = Depends(compare_rate_limit)
+):
+    """
+    1. Sends the brand prompt to every configured model (COMPARE_MODELS) concurrently.
+    2. Stores each answer as its own record, tagged with the model and a shared comparison_id.
+    3. Scores all answers in one batched analysis pass in the background.
+    """
+    brand_name = query.brand_name
+    query_prompt = brand_prompt(brand_name)
+
+    try:
+        services = get_comparison_services()
+        if query.models:
+            unknown = [name for name in query.models if name not in services]
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Models not configured in COMPARE_MODELS: {unknown}. Available: {list(services)}"
+                )
+            services = {name: services[name] for name in query.models}
+
+        # 1. Fan out; the slowest model bounds the latency
+        start = time.perf_counter()
+        answers = await query_models(query_prompt, services, settings.COMPARE_MAX_CONCURRENCY)
+        total_latency_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        errors = {answer["model"]: answer["error"] for answer in answers if answer["error"] is not None}
+        answered = [answer for answer in answers if answer["error"] is None]
+        if not answered:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"No model could answer: {errors}"
+            )
+
+        # 2. One record per answer
+        comparison_id = uuid.uuid4().hex
+        timestamp = datetime.datetime.now(datetime.timezone.utc)
+        results = [
+            QueryResponse(
+                brand_name=brand_name,
+                raw_llm_response=answer["response"],
+                status=initial_status(),
+                model=answer["model"],
+                latency_ms=answer["latency_ms"],
+            )
+            for answer in answered
+        ]
+        storage = get_storage()
         try:
-            # Insert the record and get the MongoDB ID
-            response_id = await insert_query_record(full_document.model_dump(by_alias=True))
-            initial_response.response_id = response_id # Set the ID on the object
-        
+            response_ids = await asyncio.gather(*(
+                storage.insert_query_record(QueryRecord(
+                    user_query=query_prompt,
+                    response_data=result,
+                    timestamp=timestamp,
+                    user_id=current_user_email,
+                    comparison_id=comparison_id,
+                ).model_dump(by_alias=True))
+                for result in results
+            ))
         except ConnectionError as ce:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Database initialization failed (MongoDB): {ce}"
+                detail=f"Database initialization failed (query records): {ce}"
             )
+        for result, response_id in zip(results, response_ids):
+            result.response_id = response_id
+
+        # 3. One batched analysis pass for all answers (by the analysis workers in WORKER mode)
+        if settings.ANALYSIS_MODE == AnalysisMode.INLINE:
+            asyncio.create_task(start_batch_analysis_pipeline(
+                [(result.response_id, brand_name, result.raw_llm_response, timestamp) for result in results]
+            ))
 
-        # --- Step 3: Trigger ES Indexing/Analysis (Feature 2 & 3 pipeline starts) ---
-        # Run the analysis pipeline in the background using asyncio.create_task
-        # This prevents the HTTP response from being blocked by the analysis process.
-        asyncio.create_task(
-            start_analysis_pipeline(response_id, brand_name, raw_llm_response)
+        return ModelComparisonResponse(
+            comparison_id=comparison_id,
+            brand_name=brand_name,
+            status=initial_status(),
+            total_latency_ms=total_latency_ms,
+            results=results,
+            errors=errors,
         )
-        
-        # Return the immediate, accepted (202) response to the client
-        # This tells the client "I got your request, here is the ID, processing is starting."
-        return initial_response
 
     except HTTPException:
-        # Re-raise explicit HTTP exceptions
         raise
     except Exception as e:
-        print(f"An error occurred during LLM query or process start: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"LLM Query Failed: {str(e)}")
+        print(f"An error occurred during the multi-model query: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Model comparison failed: {str(e)}")
+
+
+@router.get("/compare/{comparison_id}", response_model=ModelComparison)
+async def get_model_comparison(
+    comparison_id: str = Path(..., description="The comparison_id returned by POST /query-brand/compare."),
+    current_user_email: str = Depends(read_rate_limit)
+):
+    """
+    Per-model status, latency and visibility score of a multi-model comparison.
+    """
+    try:
+        records = await get_storage().get_query_details_by_comparison(comparison_id)
+    except ConnectionError as ce:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Database connection not initialized: {ce}"
+        )
+    if not records:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Comparison '{comparison_id}' not found."
+        )
+    return ModelComparison(
+        comparison_id=comparison_id,
+        brand_name=records[0]["brand_name"],
+        results=[QueryDetails(**record) for record in records],
+    )
+
+
+@router.post("/tracked-brands", response_model=TrackedBrand, status_code=status.HTTP_201_CREATED)
+async def create_tracked_brand(
+    request: TrackedBrandCreate,
+    current_user_email: str = Depends(read_rate_limit)
+):
+    """
+    Registers a brand to be queried automatically every hour or day. Runs are spread over the
+    interval; each one stores a regular query record (with tracking_id) and is analysed as usual.
+    """
+    storage = get_storage()
+    try:
+        if await storage.count_tracked_brands(current_user_email) >= settings.TRACKING_MAX_PER_USER:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"At most {settings.TRACKING_MAX_PER_USER} tracked brands per user."
+            )
+        document = new_tracked_brand(current_user_email, request.brand_name, request.cadence)
+        tracking_id = await storage.insert_tracked_brand(document)
+    except HTTPException:
+        raise
+    except ConnectionError as ce:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Database connection not initialized: {ce}"
+        )
+    return TrackedBrand(tracking_id=tracking_id, **document)
+
+
+@router.get("/tracked-brands", response_model=List[TrackedBrand])
+async def list_tracked_brands(
+    current_user_email: str = Depends(read_rate_limit)
+):
+    """The current user's tracked brands with their next and last scheduled runs."""
+    try:
+        return [TrackedBrand(**tracked) for tracked in await get_storage().list_tracked_brands(current_user_email)]
+    except ConnectionError as ce:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Database connection not initialized: {ce}"
+        )
+
+
+@router.delete("/tracked-brands/{tracking_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_tracked_brand(
+    tracking_id: str = Path(..., description="The tracking_id returned by POST /tracked-brands."),
+    current_user_email: str = Depends(read_rate_limit)
+):
+    """Stops tracking a brand; the records of past runs are kept."""
+    try:
+        deleted = await get_storage().delete_tracked_brand(tracking_id, current_user_email)
+    except ConnectionError as ce:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Database connection not initialized: {ce}"
+        )
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tracked brand '{tracking_id}' not found."
+        )
 
 
 @router.get("/query/{response_id}", response_model=QueryDetails)
 async def get_query_status(
+    response: Response,
     response_id: str = Path(..., description="The unique ID of the query generated by POST /query-brand."),
-    current_user_email: str = Depends(get_current_user)
+    if_none_match: str | None = Header(None),
+    if_modified_since: str | None = Header(None),
+    current_user_email: str = Depends(read_rate_limit)
 ):
     """
     Feature 5 (Individual Query): Retrieves the status and final score for a specific single query.
     Uses response_id for precise lookup in MongoDB.
+    The ETag changes with the status, score and processed_at; send it back in If-None-Match to get a 304.
     """
-    query_details = await get_query_details_by_id(response_id)
+    finished_cache_control = f"private, max-age={settings.QUERY_CACHE_SECONDS}"
+    validators = query_validators.get(response_id)
+    if validators is not None and is_not_modified(if_none_match, if_modified_since, *validators):
+        # A finished record revalidated recently: no database read
+        return not_modified(cache_headers(validators[0], finished_cache_control, validators[1]))
+
+    query_details = await get_storage().get_query_details_by_id(response_id)
     
     if query_details is None:
         raise HTTPException(
@@ -101,26 +297,178 @@ async def get_query_status(
         )
 
     # MongoDB returns the 'response_data' field, which matches the QueryDetails Pydantic model
-    return QueryDetails(**query_details)
+    details = QueryDetails(**query_details)
+    etag = make_etag(response_id, details.status, details.visibility_score, details.processed_at)
+    if details.status in FINISHED_STATUSES:
+        headers = cache_headers(etag, finished_cache_control, details.processed_at)
+        query_validators.set(response_id, (etag, details.processed_at))
+    else:
+        # Still changing: clients may store it but must revalidate on every poll
+        headers = cache_headers(etag, "private, no-cache", details.processed_at)
+
+    if is_not_modified(if_none_match, if_modified_since, etag, details.processed_at):
+        return not_modified(headers)
+    response.headers.update(headers)
+    return details
 
 
 @router.get("/metrics/aggregate/brand/{brand_name}", response_model=AggregateMetrics)
 async def get_brand_metrics_aggregate(
+    response: Response,
     brand_name: str = Path(..., description="The brand name to retrieve aggregate metrics for."),
-    current_user_email: str = Depends(get_current_user)
+    if_none_match: str | None = Header(None),
+    current_user_email: str = Depends(read_rate_limit)
 ):
     """
-    Feature 5 (Aggregate): Retrieves historical average metrics (PostgreSQL).
+    Feature 5 (Aggregate): Retrieves historical average metrics (PostgreSQL, BigQuery or embedded SQLite).
+    Aggregates are cached for METRICS_CACHE_SECONDS; the ETag changes with the count and average.
     """
-    bigquery_client = get_big_query()
     try:
-        metrics = await bigquery_client.get_brand_metrics(brand_name=brand_name) if settings.ENVIRONMENT == "CLOUD" else await get_brand_metrics(brand_name=brand_name)
+        metrics = brand_metrics_cache.get(brand_name)
+        if metrics is None:
+            metrics = await get_storage().get_brand_metrics(brand_name=brand_name)
+            brand_metrics_cache.set(brand_name, metrics)
+
+        etag = make_etag(brand_name, metrics.get("total_queries"), metrics.get("average_visibility_score"))
+        headers = cache_headers(etag, f"private, max-age={settings.METRICS_CACHE_SECONDS}")
+        if is_not_modified(if_none_match, None, etag):
+            return not_modified(headers)
+        response.headers.update(headers)
         return metrics
         
     except ConnectionError as ce:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"PostgreSQL connection pool not initialized: {ce}"
+            detail=f"Metrics store connection not initialized: {ce}"
         )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Metrics retrieval failed: {e}")
+
+
+@router.get("/export")
+async def export_history(
+    dataset: ExportDataset = Query(ExportDataset.RECORDS, description="records: your query records with the raw answers; performance: brand score rows of every user (administrators only)."),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format", description="ndjson, csv or parquet."),
+    brand_name: str | None = Query(None, description="Only rows for this brand (case-insensitive)."),
+    start: datetime.datetime | None = Query(None, description="Only rows at or after this time."),
+    end: datetime.datetime | None = Query(None, description="Only rows at or before this time."),
+    current_user_email: str = Depends(read_rate_limit)
+):
+    """
+    Streams the matching history as a file download. Rows are read from database cursors
+    and encoded chunk by chunk, so any export size runs in constant memory.
+    """
+    if export_format == ExportFormat.PARQUET and not parquet_supported():
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Parquet export needs the 'pyarrow' package.")
+    # Score rows carry no owner, so they cannot be limited to the caller's queries
+    if dataset == ExportDataset.PERFORMANCE and current_user_email not in settings.ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Exporting performance rows requires administrator privileges.")
+
+    storage = get_storage()
+    if dataset == ExportDataset.RECORDS:
+        batches = storage.iter_export_records(
+            settings.EXPORT_BATCH_SIZE, brand_name=brand_name, user_id=current_user_email, start=start, end=end
+        )
+    else:
+        batches = storage.iter_performance_rows(settings.EXPORT_BATCH_SIZE, brand_name=brand_name, start=start, end=end)
+
+    try:
+        # Fetch the first batch before answering, so an unavailable store is still a 503
+        first_batch = await anext(batches, None)
+    except ConnectionError as ce:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Database connection not initialized: {ce}"
+        )
+
+    async def all_batches():
+        if first_batch is not None:
+            yield first_batch
+            async for batch in batches:
+                yield batch
+
+    return StreamingResponse(
+        encode_export(all_batches(), dataset, export_format, settings.EXPORT_PARQUET_ROW_GROUP_ROWS),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(dataset, export_format)}"'},
+    )
+
+
+@router.get("/similar-responses", response_model=SimilarResponsesResult)
+async def get_similar_responses(
+    response_id: str | None = Query(None, description="Find responses similar to this stored response."),
+    text: str | None = Query(None, description="Find responses similar to this free text."),
+    k: int = Query(10, ge=1, le=100, description="Number of similar responses to return."),
+    num_candidates: int = Query(settings.ES_KNN_NUM_CANDIDATES, ge=1, le=10000, description="kNN candidate pool per shard; higher = better recall, slower."),
+    brand_name: str | None = Query(None, description="Only consider responses for this brand."),
+    start: datetime.datetime | None = Query(None, description="Only consider responses analysed at or after this time."),
+    end: datetime.datetime | None = Query(None, description="Only consider responses analysed at or before this time."),
+    evaluate_recall: bool = Query(False, description="Also run an exact search and report recall@k (linear cost)."),
+    current_user_email: str = Depends(read_rate_limit)
+):
+    """
+    Returns the top-k most similar historical LLM responses using Elasticsearch approximate kNN
+    over the stored embeddings, optionally filtered by brand and time range.
+    """
+    if (response_id is None) == (text is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Provide exactly one of 'response_id' or 'text'."
+        )
+    if num_candidates < k:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="'num_candidates' must be greater than or equal to 'k'."
+        )
+
+    storage = get_storage()
+    try:
+        if response_id is not None:
+            query_vector = await storage.get_analysis_embedding(response_id)
+            if query_vector is None:
+                # Not indexed (yet), or vectors are kept out of _source (the default): embed the raw response again
+                query_details = await storage.get_query_details_by_id(response_id)
+                if query_details is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=f"Query ID '{response_id}' not found."
+                    )
+                query_vector = await asyncio.to_thread(generate_embedding, query_details["raw_llm_response"])
+        else:
+            query_vector = await asyncio.to_thread(generate_embedding, text)
+
+        filters = dict(brand_name=brand_name, start=start, end=end, exclude_id=response_id)
+        approximate = await storage.search_similar_responses(query_vector, k, num_candidates, **filters)
+
+        result = SimilarResponsesResult(
+            query_response_id=response_id,
+            k=k,
+            num_candidates=num_candidates,
+            took_ms=approximate["took_ms"],
+            results=approximate["hits"],
+        )
+        if evaluate_recall:
+            exact = await storage.search_similar_responses_exact(query_vector, k, **filters)
+            exact_ids = {hit["response_id"] for hit in exact["hits"]}
+            found = exact_ids & {hit["response_id"] for hit in approximate["hits"]}
+            result.exact_took_ms = exact["took_ms"]
+            result.recall_at_k = round(len(found) / len(exact_ids), 3) if exact_ids else 1.0
+        return result
+
+    except HTTPException:
+        raise
+    except ConnectionError as ce:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Vector store connection not initialized: {ce}"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Similarity search failed: {e}")
+
+
+@router.get("/analysis/dedup-stats", response_model=DedupStats)
+async def get_dedup_stats(current_user_email: str = Depends(read_rate_limit)):
+    """
+    Reports how often the analysis pipeline reused the sub-scores of a near-duplicate response.
+    """
+    return DedupStats(**near_duplicates.stats())
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Response
 from fastapi.responses import JSONResponse
 from app.auth.models.auth_models import LoginPayload, UserInDB
-from app.db.mongodb.user_storage import get_user_by_email, create_user
+from app.db.storage_selector import get_storage
 from app.auth.core.utils import verify_password, create_access_token
 from app.core.config import settings
 from datetime import timedelta
@@ -17,7 +17,7 @@ async def signup(user_data: LoginPayload):
     hashing and storing the new user's credentials in MongoDB.
     """
     # Attempt to create the user
-    new_user = await create_user(user_data.email, user_data.password)
+    new_user = await get_storage().create_user(user_data.email, user_data.password)
     
     if new_user is None:
         # User already exists (handled by the create_user function)
@@ -39,7 +39,7 @@ async def login_for_access_token(
     containing the JWT access token.
     """
     # 1. Look up user by email
-    user = await get_user_by_email(form_data.email)
+    user = await get_storage().get_user_by_email(form_data.email)
     
     # 2. Authentication check
     if not user or not verify_password(form_data.password, user.hashed_password):
@@ -0,0 +1,71 @@
+"""
+Moves old, finished QueryRecords out of the hot MongoDB collection.
+
+Records (Complete or Failed) older than --older-than-days go either to the
+`<MONGO_COLLECTION_NAME>_archive` collection, with raw_llm_response zstd-compressed, or to
+monthly zstd-compressed NDJSON files under ARCHIVE_DIR. GET /api/v1/query/{id} falls back
+to the archive, so archived records stay readable. --compress-existing also compresses the
+large responses still in the hot collection (what RAW_RESPONSE_COMPRESSION does for new writes).
+--index-ndjson builds the id index of NDJSON files written before archives were indexed; lookups
+skip files without one.
+
+Usage:
+    python -m app.cli.archive                                  # ARCHIVE_AFTER_DAYS, ARCHIVE_TARGET
+    python -m app.cli.archive --older-than-days 30 --target NDJSON
+    python -m app.cli.archive --compress-existing
+    python -m app.cli.archive --index-ndjson
+"""
+import argparse
+import asyncio
+import datetime
+from typing import Any, Dict
+
+from app.core.config import settings, ArchiveTarget
+from app.db.mongodb import archive
+from app.db.mongodb.client import connect_to_mongodb, close_mongodb
+
+
+def _print_stats(label: str, stats: Dict[str, Any]) -> None:
+    print(
+        f"{label}: {stats['count']} records, data {stats['size'] / 2**20:.1f} MiB, "
+        f"on disk {stats['storage_size'] / 2**20:.1f} MiB, indexes {stats['total_index_size'] / 2**20:.1f} MiB"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.index_ndjson:
+        indexed = await asyncio.to_thread(archive.index_ndjson_archives)
+        print(f"Indexed {indexed} NDJSON archive files.")
+
+    await connect_to_mongodb()
+    try:
+        before = await archive.collection_stats(archive.COLLECTION_NAME)
+        _print_stats("Hot collection before", before)
+
+        older_than = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=args.older_than_days)
+        moved = await archive.archive_records(older_than, args.target, args.batch_size)
+        print(f"Moved {moved} records older than {older_than:%Y-%m-%d} to {args.target.value}.")
+
+        if args.compress_existing:
+            rewritten = await archive.compress_hot_records(args.batch_size)
+            print(f"Compressed {rewritten} responses left in the hot collection.")
+
+        # The data size drops at once; WiredTiger reuses the freed space (run `compact` to return it to the OS)
+        _print_stats("Hot collection after", await archive.collection_stats(archive.COLLECTION_NAME))
+    finally:
+        await close_mongodb()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Archive old QueryRecords and compress large LLM responses.")
+    parser.add_argument("--older-than-days", type=float, default=settings.ARCHIVE_AFTER_DAYS, help="Archive finished records older than this.")
+    parser.add_argument("--target", type=ArchiveTarget, choices=list(ArchiveTarget), metavar="{COLLECTION,NDJSON}", default=settings.ARCHIVE_TARGET,
+                        help="Archive collection or compressed NDJSON files.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Records moved per batch.")
+    parser.add_argument("--compress-existing", action="store_true", help="Also compress large responses kept in the hot collection.")
+    parser.add_argument("--index-ndjson", action="store_true", help="First build the missing indexes of NDJSON archive files.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,255 @@
+"""
+Resumable bulk re-scoring of stored QueryRecords.
+
+Streams records from the storage backend (MongoDB, or SQLite when STORAGE_BACKEND=EMBEDDED)
+in batches, recomputes every sub-score with batched embeddings across worker processes,
+and writes the refreshed scores back to every store with bulk operations.
+
+Usage:
+    python -m app.cli.backfill --batch-size 256 --workers 4 --max-rate 200
+    python -m app.cli.backfill --reset   # ignore the checkpoint and start from the oldest record
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.analysis import nlp_pipeline
+from app.analysis.vector_store import vector_store
+from app.core.config import settings
+from app.db.storage_selector import get_storage
+
+
+class BackfillCheckpoint:
+    """Persists the last fully written record ID so an interrupted run can resume."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {"last_id": None, "processed": 0}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, last_id: str, processed: int) -> None:
+        # Write-then-rename so a crash never leaves a truncated checkpoint behind
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_id": last_id, "processed": processed}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def _extract_features(
+    records: List[Dict[str, Any]],
+    pool: ProcessPoolExecutor | None,
+    workers: int,
+) -> List[Dict[str, Any]]:
+    """Splits the batch across the worker processes and extracts features for every record."""
+    texts = [r["response_data"]["raw_llm_response"] for r in records]
+    brands = [r["response_data"]["brand_name"] for r in records]
+
+    if pool is None:
+        return await asyncio.to_thread(nlp_pipeline.extract_features_batch, texts, brands)
+
+    loop = asyncio.get_running_loop()
+    chunk_size = max(1, -(-len(records) // workers))
+    futures = [
+        loop.run_in_executor(
+            pool,
+            nlp_pipeline.extract_features_batch,
+            texts[i:i + chunk_size],
+            brands[i:i + chunk_size],
+        )
+        for i in range(0, len(records), chunk_size)
+    ]
+    features: List[Dict[str, Any]] = []
+    for chunk in await asyncio.gather(*futures):
+        features.extend(chunk)
+    return features
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+async def _seed_history(records: List[Dict[str, Any]], history: Dict[str, Any], pool: ProcessPoolExecutor | None) -> None:
+    """
+    Starts the history of every brand seen for the first time in this run. With the vector store enabled,
+    the window is filled with the brand's records stored before its first record here (re-embedded, so
+    a resumed run scores exactly like an uninterrupted one) and is bounded like the live comparison.
+    """
+    first_ids: Dict[str, str] = {}
+    for record in records:
+        brand_name = record["response_data"]["brand_name"]
+        if brand_name not in history:
+            first_ids.setdefault(brand_name, str(record["_id"]))
+    if not first_ids:
+        return
+
+    storage = get_storage()
+    if not settings.VECTOR_STORE_ENABLED:
+        for brand_name in first_ids:
+            history[brand_name] = await storage.get_visibility_scores(brand_name=brand_name)
+        return
+
+    window = settings.CONSISTENCY_WINDOW or settings.VECTOR_STORE_MAX_ROWS or None
+    texts: Dict[str, List[str]] = {}
+    for brand_name, first_id in first_ids.items():
+        previous = await storage.get_query_records_before(brand_name, first_id, window or sys.maxsize)
+        texts[brand_name] = [r["response_data"]["raw_llm_response"] for r in previous]
+        history[brand_name] = deque(maxlen=window)
+
+    all_texts = [text for brand_texts in texts.values() for text in brand_texts]
+    if not all_texts:
+        return
+    if pool is None:
+        vectors = await asyncio.to_thread(nlp_pipeline.embed_texts, all_texts)
+    else:
+        vectors = await asyncio.get_running_loop().run_in_executor(pool, nlp_pipeline.embed_texts, all_texts)
+    vectors = _normalize(vectors)
+    offset = 0
+    for brand_name, brand_texts in texts.items():
+        history[brand_name].extend(vectors[offset:offset + len(brand_texts)])
+        offset += len(brand_texts)
+
+
+def _consistency(brand_name: str, feature: Dict[str, Any], history: Dict[str, Any]) -> float:
+    """
+    Mirrors the consistency stage of the live pipeline. With the vector store enabled, each record is
+    compared with the window of records of the same brand that precede it (records arrive oldest first).
+    """
+    if settings.VECTOR_STORE_ENABLED:
+        previous = history[brand_name]
+        vector = _normalize(feature["embedding_vector"])
+        similarities = np.stack(previous) @ vector if previous else np.empty(0, dtype=np.float32)
+        previous.append(vector)
+        return nlp_pipeline.calculate_embedding_consistency(similarities)
+
+    return nlp_pipeline.calculate_model_consistency(history[brand_name], feature["sentiment_score"])
+
+
+async def _write_batch(
+    records: List[Dict[str, Any]],
+    features: List[Dict[str, Any]],
+    history: Dict[str, Any],
+    pool: ProcessPoolExecutor | None,
+) -> None:
+    """Scores the batch and writes the results to every store with one bulk call each."""
+    await _seed_history(records, history, pool)
+    documents = []
+    for record, feature in zip(records, features):
+        brand_name = record["response_data"]["brand_name"]
+        consistency = _consistency(brand_name, feature, history)
+        visibility_score = nlp_pipeline.calculate_visibility_score(
+            feature["sentiment_score"],
+            feature["semantic_similarity"],
+            feature["keyword_match"],
+            feature["brand_freq"],
+            feature["correctness"],
+            consistency
+        )
+        documents.append(nlp_pipeline.build_analysis_document(
+            str(record["_id"]),
+            brand_name,
+            feature,
+            consistency,
+            visibility_score,
+            record["timestamp"],
+        ))
+
+    storage = get_storage()
+    await storage.bulk_index_analysis_documents(documents)
+    await storage.bulk_update_query_scores({doc["response_id"]: doc["visibility_score"] for doc in documents})
+    await storage.update_performance_scores(documents)
+
+    if settings.VECTOR_STORE_ENABLED:
+        # The live pipeline compares new answers with the vector store: give it the rescored history
+        for brand_name in {doc["brand_keyword"] for doc in documents}:
+            vector_store.replace(brand_name, np.stack(history[brand_name]))
+
+
+async def run_backfill(batch_size: int, workers: int, max_rate: float | None, checkpoint: BackfillCheckpoint) -> None:
+    state = checkpoint.load()
+    processed = state["processed"]
+    if state["last_id"]:
+        print(f"Resuming backfill after record {state['last_id']} ({processed} records already processed).")
+
+    pool = None
+    if workers > 0:
+        # 'spawn' keeps the Motor/Elasticsearch client threads of this process out of the workers
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=nlp_pipeline.load_nlp_models,
+        )
+    else:
+        nlp_pipeline.load_nlp_models()
+
+    history: Dict[str, Any] = {}
+    run_processed = 0
+    started = time.perf_counter()
+    try:
+        async for records in get_storage().iter_query_records(batch_size=batch_size, after_id=state["last_id"]):
+            features = await _extract_features(records, pool, workers)
+            await _write_batch(records, features, history, pool)
+
+            processed += len(records)
+            run_processed += len(records)
+            checkpoint.save(str(records[-1]["_id"]), processed)
+
+            elapsed = time.perf_counter() - started
+            if max_rate:
+                # Sleep off any lead over the allowed rate so production traffic keeps its share
+                lead = run_processed / max_rate - elapsed
+                if lead > 0:
+                    await asyncio.sleep(lead)
+                    elapsed += lead
+            print(f"Backfill: {processed} records processed ({run_processed / elapsed:.1f} records/s).")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    rate = run_processed / elapsed if elapsed > 0 else 0.0
+    print(f"Backfill complete: {run_processed} records in {elapsed:.1f}s ({rate:.1f} records/s).")
+
+
+async def main(args: argparse.Namespace) -> None:
+    checkpoint = BackfillCheckpoint(args.checkpoint_file)
+    if args.reset:
+        checkpoint.clear()
+
+    storage = get_storage()
+    await storage.connect()
+    try:
+        await run_backfill(args.batch_size, args.workers, args.max_rate, checkpoint)
+    finally:
+        await storage.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Re-score stored QueryRecords and write the results to every store.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Records fetched, embedded and written per batch.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scoring processes (0 scores in-process).")
+    parser.add_argument("--max-rate", type=float, default=None, help="Upper bound on records per second.")
+    parser.add_argument("--checkpoint-file", default=".backfill_checkpoint.json", help="Where progress is recorded.")
+    parser.add_argument("--reset", action="store_true", help="Discard the checkpoint and start from the oldest record.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,51 @@
+"""
+Maintenance of the monthly Elasticsearch partitions (ES_ROLLING_INDICES=true).
+
+Points the write alias at the current month's partition, then applies the retention policy:
+partitions older than ES_RETENTION_MONTHS are deleted, and partitions older than
+ES_COMPACT_AFTER_MONTHS are made read-only and force-merged to one segment. Run it daily
+(e.g. from cron); the API also rolls the write alias itself when the month changes.
+
+Usage:
+    python -m app.cli.es_retention
+    python -m app.cli.es_retention --retention-months 12 --compact-after-months 2
+    python -m app.cli.es_retention --dry-run
+"""
+import argparse
+import asyncio
+
+from app.core.config import settings
+from app.db.elasticsearch import partitions
+from app.db.elasticsearch.client import connect_to_elasticsearch, close_elasticsearch
+from app.db.elasticsearch.indexing import INDEX_MAPPING
+
+
+async def main(args: argparse.Namespace) -> None:
+    if not settings.ES_ROLLING_INDICES:
+        raise SystemExit("ES_ROLLING_INDICES is off: analysis documents live in the single ES_INDEX_NAME index.")
+
+    await connect_to_elasticsearch()
+    try:
+        if not args.dry_run:
+            await partitions.install_index_template(INDEX_MAPPING)
+            await partitions.roll_write_alias()
+        result = await partitions.apply_retention(args.retention_months, args.compact_after_months, dry_run=args.dry_run)
+        prefix = "Would have " if args.dry_run else ""
+        print(f"{prefix}deleted: {result['deleted'] or 'none'}")
+        print(f"{prefix}compacted: {result['compacted'] or 'none'}")
+        print(f"Partitions kept: {await partitions.list_partitions()}")
+    finally:
+        await close_elasticsearch()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Roll the write alias and apply retention to the monthly analysis indices.")
+    parser.add_argument("--retention-months", type=int, default=settings.ES_RETENTION_MONTHS, help="Delete older partitions (0 = keep all).")
+    parser.add_argument("--compact-after-months", type=int, default=settings.ES_COMPACT_AFTER_MONTHS,
+                        help="Make older partitions read-only and force-merge them (0 = never).")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be deleted or compacted.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
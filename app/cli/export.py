@@ -0,0 +1,78 @@
+"""
+Streams historical data to a file (or stdout) in constant memory.
+
+`records` are the stored query records with the raw LLM answers (MongoDB, or SQLite when
+STORAGE_BACKEND=EMBEDDED); `performance` are the brand score rows (PostgreSQL or SQLite
+in keyset pages, BigQuery page by page in the CLOUD environment).
+
+Usage:
+    python -m app.cli.export records --format parquet --output records.parquet
+    python -m app.cli.export performance --format csv --brand Daraz --start 2025-01-01 --end 2025-06-30 > daraz.csv
+    python -m app.cli.export records --user-id team@example.com --format ndjson --output team.ndjson
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import sys
+import time
+
+# The settings print debug lines on import; keep them (and the connection logs below)
+# on stderr so `> file` only receives the export
+with contextlib.redirect_stdout(sys.stderr):
+    from app.core.config import settings
+    from app.core.models import ExportDataset, ExportFormat
+    from app.db.storage_selector import get_storage
+    from app.services.export import encode_export
+
+
+def _utc(value: str) -> datetime.datetime:
+    moment = datetime.datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=datetime.timezone.utc)
+
+
+async def export(args: argparse.Namespace, output) -> None:
+    storage = get_storage()
+    await storage.connect()
+    try:
+        if args.dataset == ExportDataset.RECORDS:
+            batches = storage.iter_export_records(args.batch_size, brand_name=args.brand, user_id=args.user_id, start=args.start, end=args.end)
+        else:
+            batches = storage.iter_performance_rows(args.batch_size, brand_name=args.brand, start=args.start, end=args.end)
+
+        started = time.perf_counter()
+        written = 0
+        async for chunk in encode_export(batches, args.dataset, args.format, args.row_group_rows):
+            output.write(chunk)
+            written += len(chunk)
+        print(f"Exported {args.dataset.value} as {args.format.value}: {written / 2**20:.1f} MiB in {time.perf_counter() - started:.1f}s.")
+    finally:
+        await storage.close()
+
+
+async def main(args: argparse.Namespace) -> None:
+    stdout = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.output == "-":
+            await export(args, stdout)
+        else:
+            with open(args.output, "wb") as output:
+                await export(args, output)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stream query records or brand performance rows to NDJSON, CSV or Parquet.")
+    parser.add_argument("dataset", type=ExportDataset, choices=list(ExportDataset), metavar="{records,performance}")
+    parser.add_argument("--format", type=ExportFormat, choices=list(ExportFormat), default=ExportFormat.NDJSON, metavar="{ndjson,csv,parquet}")
+    parser.add_argument("--output", default="-", help="Output file ('-' = stdout).")
+    parser.add_argument("--brand", help="Only this brand (case-insensitive).")
+    parser.add_argument("--user-id", help="Only records of this user (records dataset).")
+    parser.add_argument("--start", type=_utc, help="ISO date/time, UTC unless an offset is given.")
+    parser.add_argument("--end", type=_utc, help="ISO date/time, UTC unless an offset is given.")
+    parser.add_argument("--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE, help="Rows per cursor fetch.")
+    parser.add_argument("--row-group-rows", type=int, default=settings.EXPORT_PARQUET_ROW_GROUP_ROWS, help="Rows per Parquet row group.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,191 @@
+"""
+Migrates the Elasticsearch analysis index to the current compact mapping
+(quantized vector index_options, embedding excluded from _source).
+
+A new concrete index is created with build_index_mapping(), the documents are
+copied with the _reindex API, and ES_INDEX_NAME is atomically switched to an
+alias pointing at the new index.
+
+Documents indexed while the copy runs are picked up by catch-up passes over the
+documents timestamped after the copy started (minus --catch-up-lookback-minutes, as a
+document carries its query record's timestamp, which trails its indexing by the
+analysis lag). When ES_INDEX_NAME is already an alias, a last pass after the swap
+copies what reached the old index meanwhile, and the old index is only dropped if
+the new one holds at least as many documents. Backfills writing old timestamps are
+not covered: don't run them during the migration.
+
+Usage:
+    python -m app.cli.reindex_vectors                # migrate and drop the old index
+    python -m app.cli.reindex_vectors --keep-old     # keep the old index for rollback
+"""
+import argparse
+import asyncio
+import datetime
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.db.elasticsearch.client import ES_INDEX_NAME, connect_to_elasticsearch, close_elasticsearch, get_es_client
+from app.db.elasticsearch.indexing import build_index_mapping
+
+
+async def _source_indices() -> tuple[List[str], bool]:
+    """Returns the concrete indices currently behind ES_INDEX_NAME and whether it is an alias."""
+    es_client = get_es_client()
+    if await es_client.indices.exists_alias(name=ES_INDEX_NAME):
+        aliases = await es_client.indices.get_alias(name=ES_INDEX_NAME)
+        return list(aliases.keys()), True
+    if await es_client.indices.exists(index=ES_INDEX_NAME):
+        return [ES_INDEX_NAME], False
+    raise RuntimeError(f"Elasticsearch index '{ES_INDEX_NAME}' does not exist; nothing to migrate.")
+
+
+async def _store_stats(indices: List[str]) -> Dict[str, Any]:
+    es_client = get_es_client()
+    stats = await es_client.indices.stats(index=",".join(indices), metric="docs,store")
+    primaries = stats["_all"]["primaries"]
+    docs = primaries["docs"]["count"]
+    size = primaries["store"]["size_in_bytes"]
+    return {"docs": docs, "bytes": size, "bytes_per_doc": size / docs if docs else 0.0}
+
+
+async def _sources_exclude_vectors(indices: List[str]) -> bool:
+    es_client = get_es_client()
+    mappings = await es_client.indices.get_mapping(index=",".join(indices))
+    for mapping in mappings.values():
+        excludes = mapping["mappings"].get("_source", {}).get("excludes", [])
+        if "embedding_vector" in excludes:
+            return True
+    return False
+
+
+async def _count(indices: List[str]) -> int:
+    es_client = get_es_client()
+    await es_client.indices.refresh(index=",".join(indices))
+    return (await es_client.count(index=",".join(indices)))["count"]
+
+
+async def _reindex(
+    sources: List[str],
+    target: str,
+    requests_per_second: float,
+    since: datetime.datetime | None = None,
+    overwrite: bool = True,
+) -> int:
+    """
+    Copies the documents of sources (timestamped from `since`, if given) into target with a
+    _reindex task and waits for it; returns the number written. Without overwrite, documents
+    already in target are left alone.
+    """
+    es_client = get_es_client()
+    source: Dict[str, Any] = {"index": sources}
+    if since is not None:
+        source["query"] = {"range": {"timestamp": {"gte": since.isoformat()}}}
+    dest: Dict[str, Any] = {"index": target}
+    if not overwrite:
+        dest["op_type"] = "create"
+
+    task = await es_client.reindex(
+        source=source,
+        dest=dest,
+        conflicts="abort" if overwrite else "proceed",
+        wait_for_completion=False,
+        slices="auto",
+        requests_per_second=requests_per_second,
+    )
+    while True:
+        status = await es_client.tasks.get(task_id=task["task"])
+        progress = status["task"]["status"]
+        print(f"Reindex: {progress.get('created', 0) + progress.get('updated', 0)}/{progress.get('total', 0)} documents")
+        if status.get("completed"):
+            break
+        await asyncio.sleep(5)
+    if status.get("error") or status.get("response", {}).get("failures"):
+        raise RuntimeError(f"Reindex failed: {status.get('error') or status['response']['failures'][:3]}")
+    response = status.get("response", {})
+    return response.get("created", 0) + response.get("updated", 0)
+
+
+async def migrate(keep_old: bool, requests_per_second: float, allow_missing_vectors: bool, catch_up_lookback_minutes: float) -> None:
+    es_client = get_es_client()
+    sources, is_alias = await _source_indices()
+    if keep_old and not is_alias:
+        raise RuntimeError(
+            f"'{ES_INDEX_NAME}' is a concrete index; it must be removed to reuse its name as an alias. "
+            "Take a snapshot first if you need a rollback point, then run without --keep-old."
+        )
+
+    if await _sources_exclude_vectors(sources) and not allow_missing_vectors:
+        raise RuntimeError(
+            "The current index does not keep embeddings in _source, so _reindex cannot copy them. "
+            "Re-run with --allow-missing-vectors and then `python -m app.cli.backfill` to re-embed."
+        )
+
+    before = await _store_stats(sources)
+    target = f"{ES_INDEX_NAME}-{datetime.datetime.now(datetime.timezone.utc):%Y%m%d%H%M%S}"
+    copy_started = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=catch_up_lookback_minutes)
+    await es_client.indices.create(index=target, body=build_index_mapping())
+    print(f"Created '{target}'; copying {before['docs']} documents from {sources}...")
+    await _reindex(sources, target, requests_per_second)
+
+    caught_up = await _reindex(sources, target, requests_per_second, since=copy_started)
+    print(f"Catch-up: {caught_up} documents timestamped since {copy_started:%Y-%m-%d %H:%M:%S} copied again.")
+
+    # Swap atomically: readers and writers see either the old or the new index, never neither
+    actions: List[Dict[str, Any]] = [{"add": {"index": target, "alias": ES_INDEX_NAME}}]
+    if is_alias:
+        actions += [{"remove": {"index": source, "alias": ES_INDEX_NAME}} for source in sources]
+        await es_client.indices.update_aliases(actions=actions)
+        # Writes that reached the old index after the catch-up; create-only, so newer writes to the new index win
+        late = await _reindex(sources, target, requests_per_second, since=copy_started, overwrite=False)
+        print(f"Copied {late} documents indexed during the swap.")
+        if not keep_old:
+            source_docs, target_docs = await _count(sources), await _count([target])
+            if target_docs >= source_docs:
+                await es_client.indices.delete(index=",".join(sources))
+            else:
+                print(f"'{target}' has {target_docs} documents but {sources} have {source_docs}: keeping the old indices.")
+    else:
+        # The concrete index goes in the swap itself (its name becomes the alias), so check first
+        source_docs, target_docs = await _count(sources), await _count([target])
+        if target_docs < source_docs:
+            raise RuntimeError(
+                f"'{target}' has {target_docs} documents but '{ES_INDEX_NAME}' has {source_docs}; not switching. "
+                "Delete the new index and re-run in a quieter period."
+            )
+        actions += [{"remove_index": {"index": source}} for source in sources]
+        await es_client.indices.update_aliases(actions=actions)
+
+    await es_client.indices.refresh(index=target)
+    await es_client.indices.forcemerge(index=target, max_num_segments=1)
+    after = await _store_stats([target])
+
+    ratio = before["bytes_per_doc"] / after["bytes_per_doc"] if after["bytes_per_doc"] else 0.0
+    print(
+        f"'{ES_INDEX_NAME}' now points at '{target}'. "
+        f"Store per document: {before['bytes_per_doc']:.0f} B -> {after['bytes_per_doc']:.0f} B ({ratio:.1f}x smaller)."
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    if settings.ES_ROLLING_INDICES:
+        raise SystemExit("With ES_ROLLING_INDICES, new partitions already use the current mapping; "
+                         "re-index older months with `python -m app.cli.backfill` instead.")
+    await connect_to_elasticsearch()
+    try:
+        await migrate(args.keep_old, args.requests_per_second, args.allow_missing_vectors, args.catch_up_lookback_minutes)
+    finally:
+        await close_elasticsearch()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Reindex analysis documents into the compact vector mapping.")
+    parser.add_argument("--keep-old", action="store_true", help="Keep the previous index when it sits behind an alias.")
+    parser.add_argument("--requests-per-second", type=float, default=-1, help="Throttle for the _reindex task (-1 = unthrottled).")
+    parser.add_argument("--allow-missing-vectors", action="store_true", help="Migrate even if the old index has no vectors in _source.")
+    parser.add_argument("--catch-up-lookback-minutes", type=float, default=60,
+                        help="How far before the copy start the catch-up passes look (covers the analysis lag).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,71 @@
+"""
+Per-process memory of a multi-worker deployment (Linux only).
+
+RSS counts shared pages in every process that maps them, so summing worker RSS overstates
+the footprint. PSS divides each shared page between the processes sharing it: the PSS
+column sums to the real memory used. "Private" is what each worker adds on its own.
+
+Usage:
+    python -m app.cli.worker_memory <gunicorn master pid>
+    python -m app.cli.worker_memory <gunicorn master pid> --json
+"""
+import argparse
+import json
+import os
+from typing import Dict, List
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    task_dir = f"/proc/{pid}/task"
+    for tid in os.listdir(task_dir):
+        with open(os.path.join(task_dir, tid, "children"), "r") as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def process_memory(pid: int) -> Dict[str, int]:
+    """RSS, PSS, shared and private memory of a process in KiB, from /proc/<pid>/smaps_rollup."""
+    fields: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "pid": pid,
+        "rss_kib": fields.get("Rss", 0),
+        "pss_kib": fields.get("Pss", 0),
+        "shared_kib": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kib": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memory accounting of the gunicorn master and its workers.")
+    parser.add_argument("pid", type=int, help="PID of the gunicorn master.")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table.")
+    args = parser.parse_args()
+
+    rows = [{"role": "master", **process_memory(args.pid)}]
+    rows += [{"role": "worker", **process_memory(child)} for child in _children(args.pid)]
+    totals = {key: sum(row[key] for row in rows) for key in ("rss_kib", "pss_kib", "private_kib")}
+
+    if args.json:
+        print(json.dumps({"processes": rows, "totals": totals}, indent=2))
+        return
+    print(f"{'role':<8}{'pid':>8}{'RSS MiB':>10}{'PSS MiB':>10}{'shared MiB':>12}{'private MiB':>13}")
+    for row in rows:
+        print(
+            f"{row['role']:<8}{row['pid']:>8}{row['rss_kib'] / 1024:>10.1f}{row['pss_kib'] / 1024:>10.1f}"
+            f"{row['shared_kib'] / 1024:>12.1f}{row['private_kib'] / 1024:>13.1f}"
+        )
+    print(
+        f"{'total':<16}{totals['rss_kib'] / 1024:>10.1f}{totals['pss_kib'] / 1024:>10.1f}"
+        f"{'':>12}{totals['private_kib'] / 1024:>13.1f}"
+    )
+    print("Real footprint = total PSS; summed RSS double-counts the shared model pages.")
+
+
+if __name__ == "__main__":
+    main()
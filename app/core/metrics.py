@@ -0,0 +1,111 @@
+import functools
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# Buckets (seconds) sized for this app: sub-millisecond NLP steps up to multi-second LLM calls
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+LLM_GENERATION_SECONDS = Histogram(
+    "gsvt_llm_generation_seconds", "LLM response generation latency.", ["provider", "model"], buckets=LLM_BUCKETS
+)
+LLM_ERRORS = Counter("gsvt_llm_errors_total", "Failed LLM generations.", ["provider", "model"])
+LLM_TIMEOUTS = Counter("gsvt_llm_timeouts_total", "LLM calls abandoned at the provider timeout.", ["provider"])
+LLM_CIRCUIT_STATE = Gauge(
+    "gsvt_llm_circuit_state", "Circuit breaker state per LLM provider (0 closed, 1 half-open, 2 open).", ["provider"],
+    multiprocess_mode="livemax",
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "gsvt_llm_queue_wait_seconds", "Time LLM requests waited for a client-side slot.", ["provider"], buckets=LLM_BUCKETS
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "gsvt_llm_queue_depth", "LLM requests waiting for a client-side slot.", ["provider"], multiprocess_mode="livesum"
+)
+OLLAMA_SERVER_SECONDS = Histogram(
+    "gsvt_ollama_server_seconds", "Time reported by Ollama per phase (load, prompt_eval, eval).", ["model", "phase"],
+    buckets=LLM_BUCKETS,
+)
+LLM_HEDGED_REQUESTS = Counter(
+    "gsvt_llm_hedged_requests_total", "Requests that fired a backup LLM call, by winning provider.", ["primary", "winner"]
+)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "gsvt_pipeline_stage_seconds", "Analysis pipeline latency per stage.", ["stage"], buckets=FAST_BUCKETS
+)
+PIPELINE_ERRORS = Counter("gsvt_pipeline_errors_total", "Analysis pipeline failures per stage.", ["stage"])
+PIPELINES_IN_FLIGHT = Gauge(
+    "gsvt_pipelines_in_flight", "Analysis pipelines currently running.", multiprocess_mode="livesum"
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "gsvt_http_request_seconds", "HTTP request latency per route.", ["method", "route", "status"], buckets=FAST_BUCKETS
+)
+RATE_LIMITED_REQUESTS = Counter(
+    "gsvt_rate_limited_requests_total", "Requests rejected with 429 per endpoint class and plan.", ["endpoint_class", "plan"]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "gsvt_http_requests_in_flight", "HTTP requests currently being served.", multiprocess_mode="livesum"
+)
+
+DB_CALL_SECONDS = Histogram(
+    "gsvt_db_call_seconds", "Database call latency.", ["store", "operation"], buckets=FAST_BUCKETS
+)
+DB_ERRORS = Counter("gsvt_db_errors_total", "Failed database calls.", ["store", "operation"])
+
+# Counters rather than a rate gauge so they add up across worker processes (multiprocess mode);
+# reuse rate = rate(gsvt_dedup_hits_total) / rate(gsvt_dedup_lookups_total)
+DEDUP_LOOKUPS = Counter("gsvt_dedup_lookups_total", "Analysed responses looked up in the near-duplicate index.")
+DEDUP_HITS = Counter("gsvt_dedup_hits_total", "Analysed responses that reused near-duplicate sub-scores.")
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    """Times one pipeline stage; a failing stage is counted in gsvt_pipeline_errors_total."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        PIPELINE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        PIPELINE_STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+T = TypeVar("T")
+
+
+def track_db(store: str, operation: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator for async storage functions: records latency and failures per store/operation."""
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                DB_ERRORS.labels(store, operation).inc()
+                raise
+            finally:
+                DB_CALL_SECONDS.labels(store, operation).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def track_llm(func: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+    """Decorator for LLMBase.generate_response implementations, labelled by client class and model."""
+    @functools.wraps(func)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> str:
+        labels = (type(self).__name__, self.model_name)
+        start = time.perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        except Exception:
+            LLM_ERRORS.labels(*labels).inc()
+            raise
+        finally:
+            LLM_GENERATION_SECONDS.labels(*labels).observe(time.perf_counter() - start)
+    return wrapper
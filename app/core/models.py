@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List, Optional
 from datetime import datetime, timezone
+from enum import Enum
 
 
 # Request Model
@@ -14,6 +15,8 @@ class QueryResponse(BaseModel):
     raw_llm_response: str = Field(..., description="The unedited text response from the GenAI model.")
     response_id: str | None = None
     status: str = Field(..., description="Status of the operation (e.g., 'Processing', 'Complete').", example="Processing")
+    model: str | None = Field(None, description="PROVIDER:model that answered (multi-model comparisons).", example="OLLAMA:gemma:2b")
+    latency_ms: float | None = Field(None, description="LLM response time (multi-model comparisons).")
 
 
 class QueryRecord(BaseModel):
@@ -22,6 +25,8 @@ class QueryRecord(BaseModel):
     response_data: QueryResponse
     timestamp: datetime
     user_id: str | None = None 
+    comparison_id: str | None = None    # groups the records of one multi-model comparison
+    tracking_id: str | None = None      # set on records produced by the brand tracking scheduler
 
 
 class AggregateMetrics(BaseModel):
@@ -38,6 +43,99 @@ class QueryDetails(BaseModel):
     visibility_score: float | None = Field(None, description="The final calculated score (0-100).")
     raw_llm_response: str | None = None
     processed_at: datetime | None = Field(None, description="UTC timestamp when processing completed.")
+    model: str | None = None
+    latency_ms: float | None = None
+
+
+class CompareQuery(BaseModel):
+    brand_name: str = Field(..., description="The brand name to query every model about.", example="Daraz")
+    models: Optional[List[str]] = Field(None, description="Subset of COMPARE_MODELS to ask (default: all).")
+
+
+class ModelComparisonResponse(BaseModel):
+    """Answers of a multi-model query; total_latency_ms is that of the slowest model."""
+    comparison_id: str
+    brand_name: str
+    status: str = Field(..., example="Processing")
+    total_latency_ms: float
+    results: List[QueryResponse]
+    errors: Dict[str, str] = Field(default_factory=dict, description="Models that failed, with the reason.")
+
+
+class ModelComparison(BaseModel):
+    """Per-model status and visibility score of one comparison."""
+    comparison_id: str
+    brand_name: str
+    results: List[QueryDetails]
+
+
+class TrackingCadence(str, Enum):
+    HOURLY = "hourly"
+    DAILY = "daily"
+
+
+class TrackedBrandCreate(BaseModel):
+    brand_name: str = Field(..., description="The brand to query on a schedule.", example="Daraz")
+    cadence: TrackingCadence = Field(TrackingCadence.DAILY, description="How often to query it.")
+
+
+class TrackedBrand(BaseModel):
+    """A brand queried automatically; each run stores a regular query record tagged with tracking_id."""
+    tracking_id: str
+    brand_name: str
+    cadence: TrackingCadence
+    created_at: datetime
+    next_run_at: datetime = Field(..., description="Next scheduled run (UTC), spread within the cadence interval.")
+    last_run_at: datetime | None = None
+    last_response_id: str | None = Field(None, description="response_id of the latest scheduled query.")
+
+
+class ExportDataset(str, Enum):
+    RECORDS = "records"             # query records with the raw LLM answers
+    PERFORMANCE = "performance"     # brand_performance rows (PostgreSQL, BigQuery or SQLite)
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
+class SimilarResponse(BaseModel):
+    response_id: str
+    brand_name: str | None = None
+    score: float = Field(..., description="Cosine similarity to the query, mapped to [0, 1].")
+    visibility_score: float | None = None
+    timestamp: datetime | None = None
+
+
+class SimilarResponsesResult(BaseModel):
+    """Top-k similar historical responses plus the recall/latency figures of the search."""
+    query_response_id: str | None = None
+    k: int
+    num_candidates: int
+    took_ms: int = Field(..., description="Elasticsearch time spent on the approximate kNN search.")
+    results: List[SimilarResponse]
+    exact_took_ms: int | None = Field(None, description="Time spent on the brute-force search (only with evaluate_recall).")
+    recall_at_k: float | None = Field(None, description="Share of the exact top-k found by the approximate search (only with evaluate_recall).")
+
+
+class DedupStats(BaseModel):
+    """Near-duplicate detection counters of this API process."""
+    lookups: int
+    hits: int
+    reuse_rate: float = Field(..., description="Share of analysed responses that reused a near-duplicate's sub-scores.")
+    tracked_brands: int
+    tracked_responses: int
+
+
+class ProfilingRequest(BaseModel):
+    """Bounds of an on-demand profiling session (at least one of duration_seconds / max_runs)."""
+    duration_seconds: Optional[float] = Field(None, gt=0, le=3600, description="Stop after this many seconds.")
+    max_runs: Optional[int] = Field(None, gt=0, le=10000, description="Stop after this many analysis pipeline runs.")
+    cpu: bool = Field(True, description="cProfile plus stack sampling (pstats and collapsed stacks).")
+    memory: bool = Field(True, description="tracemalloc snapshot of the session.")
+    sample_interval_ms: float = Field(5.0, ge=1, le=1000, description="Stack sampling interval.")
 
 
 # BigQuery
@@ -0,0 +1,220 @@
+import asyncio
+import cProfile
+import datetime
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Set, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class PipelineProfiler:
+    """
+    On-demand CPU and memory profiling of start_analysis_pipeline runs.
+
+    A session covers a bounded window (seconds) and/or a number of pipeline runs.
+    While a run is in flight, cProfile is enabled on the event-loop thread and a
+    background sampler records that thread's stack; work a run offloads through
+    `to_thread` is profiled and sampled in its thread too. tracemalloc traces allocations
+    for the whole session. Results are written as a .pstats file, collapsed stacks
+    (flame graph input), a tracemalloc snapshot and a text summary of the top allocations.
+
+    When no session is active the pipeline only checks the `active` flag.
+    Sessions are per process: with several workers, only the runs of the worker that
+    received the start request are profiled (the pid is in the status and file names).
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.active = False
+        self.last_result: Dict[str, Any] | None = None
+        self._lock = threading.Lock()
+        # Profiled runs still executing, whatever session they started in: a run can outlive
+        # its session (stop, then start again), so this is never reset
+        self._in_flight = 0
+        self._session = 0
+
+    def start(
+        self,
+        duration_seconds: float | None = None,
+        max_runs: int | None = None,
+        cpu: bool = True,
+        memory: bool = True,
+        sample_interval_ms: float = 5.0,
+    ) -> Dict[str, Any]:
+        """Starts a session; must be called from the event-loop thread."""
+        if self.active:
+            raise RuntimeError("A profiling session is already running.")
+        if not duration_seconds and not max_runs:
+            raise ValueError("Provide duration_seconds and/or max_runs to bound the session.")
+
+        self._duration_seconds = duration_seconds
+        self._max_runs = max_runs
+        self._profile = cProfile.Profile() if cpu else None
+        self._memory = memory
+        self._stacks: Counter[str] = Counter()
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._offload_threads: Set[int] = set()
+        self._runs_started = 0
+        self._runs_completed = 0
+        self._session += 1
+        self._started_at = datetime.datetime.now(datetime.timezone.utc)
+        self._loop_thread_id = threading.get_ident()
+
+        if memory:
+            tracemalloc.start(25)
+        if self._profile is not None and self._in_flight:
+            # Runs of the previous session are still executing on this thread
+            self._profile.enable()
+
+        self._sampler_stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        if cpu:
+            self._sampler = threading.Thread(
+                target=self._sample_stacks, args=(sample_interval_ms / 1000,), name="pipeline-stack-sampler", daemon=True
+            )
+            self._sampler.start()
+
+        self._timer = None
+        if duration_seconds:
+            self._timer = asyncio.get_running_loop().call_later(duration_seconds, self.stop)
+
+        self.active = True
+        print(f"Profiling session started (duration={duration_seconds}s, max_runs={max_runs}, cpu={cpu}, memory={memory}).")
+        return self.status()
+
+    @contextmanager
+    def run(self) -> Iterator[None]:
+        """Wraps one pipeline run; runs beyond max_runs are executed unprofiled."""
+        if not self.active or (self._max_runs and self._runs_started >= self._max_runs):
+            yield
+            return
+
+        session = self._session
+        self._runs_started += 1
+        self._in_flight += 1
+        if self._in_flight == 1 and self._profile is not None:
+            self._profile.enable()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0 and self._profile is not None:
+                self._profile.disable()
+            # A run left over from an earlier session does not count towards this one
+            if session == self._session:
+                self._runs_completed += 1
+                if self.active and self._max_runs and self._runs_completed >= self._max_runs:
+                    self.stop()
+
+    async def to_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """asyncio.to_thread that also profiles `func` during a session (cProfile only sees its own thread)."""
+        if not self.active or self._profile is None:
+            return await asyncio.to_thread(func, *args)
+        return await asyncio.to_thread(self._profiled_call, func, *args)
+
+    def _profiled_call(self, func: Callable[..., T], *args: Any) -> T:
+        profile = cProfile.Profile()
+        thread_id = threading.get_ident()
+        self._offload_threads.add(thread_id)
+        profile.enable()
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            self._offload_threads.discard(thread_id)
+            with self._lock:
+                if self.active:
+                    self._thread_profiles.append(profile)
+
+    def _sample_stacks(self, interval: float) -> None:
+        while not self._sampler_stop.wait(interval):
+            if self._in_flight == 0:
+                continue
+            frames = sys._current_frames()
+            for thread_id in (self._loop_thread_id, *self._offload_threads):
+                frame = frames.get(thread_id)
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self._stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Dict[str, Any]:
+        """Ends the session and writes the profiles; returns the paths written."""
+        with self._lock:
+            if not self.active:
+                return self.last_result or {}
+            self.active = False
+
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._sampler is not None:
+            self._sampler_stop.set()
+            self._sampler.join()
+        if self._profile is not None and self._in_flight:
+            self._profile.disable()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"pipeline-{self._started_at:%Y%m%dT%H%M%S}-{os.getpid()}")
+        files: Dict[str, str] = {}
+
+        if self._profile is not None:
+            files["pstats"] = f"{prefix}.pstats"
+            with self._lock:
+                # pstats cannot load a profile that recorded nothing
+                profiles = [p for p in (self._profile, *self._thread_profiles) if p.getstats()]
+            if profiles:
+                pstats.Stats(*profiles).dump_stats(files["pstats"])
+            else:
+                self._profile.dump_stats(files["pstats"])
+            files["collapsed_stacks"] = f"{prefix}.collapsed"
+            with open(files["collapsed_stacks"], "w", encoding="utf-8") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        if self._memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            files["tracemalloc"] = f"{prefix}.tracemalloc"
+            snapshot.dump(files["tracemalloc"])
+            files["memory_top"] = f"{prefix}-memory-top.txt"
+            with open(files["memory_top"], "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+
+        self.last_result = {
+            "started_at": self._started_at.isoformat(),
+            "runs_profiled": self._runs_completed,
+            "stack_samples": sum(self._stacks.values()),
+            "files": files,
+        }
+        print(f"Profiling session finished: {self.last_result}")
+        return self.last_result
+
+    def status(self) -> Dict[str, Any]:
+        if not self.active:
+            return {"active": False, "pid": os.getpid(), "last_result": self.last_result}
+        elapsed = (datetime.datetime.now(datetime.timezone.utc) - self._started_at).total_seconds()
+        return {
+            "active": True,
+            "pid": os.getpid(),
+            "elapsed_seconds": round(elapsed, 1),
+            "duration_seconds": self._duration_seconds,
+            "max_runs": self._max_runs,
+            "runs_started": self._runs_started,
+            "runs_completed": self._runs_completed,
+            "last_result": self.last_result,
+        }
+
+
+pipeline_profiler = PipelineProfiler(output_dir=settings.PROFILE_OUTPUT_DIR)
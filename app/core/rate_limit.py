@@ -0,0 +1,85 @@
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+
+@dataclass
+class BucketResult:
+    allowed: bool
+    remaining: float
+    retry_after: float     # seconds until `cost` tokens are available (0 when allowed)
+
+
+# --- Abstract Base Class (RateLimitStore) ---
+
+class RateLimitStore(ABC):
+    """
+    Where token-bucket state lives. The in-memory store is enough for one API instance;
+    several instances need a shared implementation (e.g. Redis with an atomic script)
+    so a user's limit is not multiplied by the number of replicas.
+    """
+
+    @abstractmethod
+    async def consume(self, key: str, capacity: int, refill_per_second: float, cost: float = 1.0) -> BucketResult:
+        """Takes `cost` tokens from the key's bucket (created full) if it holds enough."""
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """
+    Buckets in a dict of (tokens, last refill time); buckets idle long enough to be full again are dropped.
+
+    `shares` is the number of processes each holding their own copy (gunicorn workers): every bucket
+    gets that fraction of the capacity and refill rate, so the sum over the workers stays at the
+    configured limit. A bucket never holds less than one request's cost.
+    """
+
+    def __init__(self, sweep_every: int = 10000, shares: int = 1):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._idle_seconds: Dict[str, float] = {}
+        self._sweep_every = sweep_every
+        self._calls = 0
+        self.shares = max(1, shares)
+
+    async def consume(self, key: str, capacity: int, refill_per_second: float, cost: float = 1.0) -> BucketResult:
+        if self.shares > 1:
+            capacity = max(cost, capacity / self.shares)
+            refill_per_second /= self.shares
+        # No await between read and write, so this is atomic on the event loop
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (float(capacity), now))
+        tokens = min(float(capacity), tokens + (now - last) * refill_per_second)
+
+        if tokens >= cost:
+            tokens -= cost
+            result = BucketResult(allowed=True, remaining=tokens, retry_after=0.0)
+        elif refill_per_second > 0:
+            result = BucketResult(allowed=False, remaining=tokens, retry_after=(cost - tokens) / refill_per_second)
+        else:
+            result = BucketResult(allowed=False, remaining=tokens, retry_after=float("inf"))
+        self._buckets[key] = (tokens, now)
+        self._idle_seconds[key] = capacity / refill_per_second if refill_per_second > 0 else float("inf")
+
+        self._calls += 1
+        if self._calls % self._sweep_every == 0:
+            self._sweep(now)
+        return result
+
+    def _sweep(self, now: float) -> None:
+        for key, (_, last) in list(self._buckets.items()):
+            if now - last >= self._idle_seconds[key]:
+                del self._buckets[key]
+                del self._idle_seconds[key]
+
+
+# Process-wide store; replace it with set_rate_limit_store() for a shared implementation
+rate_limit_store: RateLimitStore = InMemoryRateLimitStore()
+
+
+def get_rate_limit_store() -> RateLimitStore:
+    return rate_limit_store
+
+
+def set_rate_limit_store(store: RateLimitStore) -> None:
+    global rate_limit_store
+    rate_limit_store = store
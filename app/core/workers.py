@@ -0,0 +1,65 @@
+"""
+Hooks for the pre-fork multi-worker mode (gunicorn with preload_app, see gunicorn.conf.py).
+
+The master loads the NLP models once, before forking, so every worker shares the model
+weights copy-on-write. Everything that holds sockets, threads or event-loop objects is
+created after the fork, per worker (the FastAPI lifespan opens the database clients).
+"""
+import gc
+import os
+
+from app.core.config import settings
+
+
+def preload_before_fork() -> None:
+    """Runs in the master: loads the read-only NLP resources and freezes the heap."""
+    from app.analysis import nlp_pipeline
+
+    try:
+        nlp_pipeline.load_nlp_models()
+    except Exception as e:
+        # Workers will try again in their lifespan (one copy each)
+        print(f"Failed to preload NLP models: {e}")
+        return
+    # Move every object allocated so far into the permanent generation: the cyclic GC of
+    # the workers then never touches (and so never copies) the pages holding the weights
+    gc.collect()
+    gc.freeze()
+    print(f"Preloaded NLP models in master process {os.getpid()}.")
+
+
+def reinitialize_after_fork(workers: int) -> None:
+    """Runs in each worker right after the fork, before the app starts serving."""
+    import torch
+    from app.core import rate_limit
+    from app.db import storage_selector
+    from app.services import llm_selector
+    from app.services.ollama_scheduler import ollama_scheduler
+
+    # One set of connections per worker, opened by the lifespan of this process
+    storage_selector.set_storage(None)
+    llm_selector.llm_front = None
+    llm_selector.comparison_services = None
+
+    # Per-process limits would otherwise be multiplied by the number of workers
+    if workers > 1:
+        ollama_scheduler.resize(max(1, settings.OLLAMA_NUM_PARALLEL // workers))
+        if settings.OLLAMA_NUM_PARALLEL < workers:
+            print(
+                f"Warning: OLLAMA_NUM_PARALLEL={settings.OLLAMA_NUM_PARALLEL} is lower than the {workers} workers; "
+                f"up to {workers} chat requests can reach Ollama at once."
+            )
+        if isinstance(rate_limit.get_rate_limit_store(), rate_limit.InMemoryRateLimitStore):
+            rate_limit.set_rate_limit_store(rate_limit.InMemoryRateLimitStore(shares=workers))
+            print(
+                f"Warning: in-memory rate limits are split between {workers} workers; a client whose requests "
+                "land unevenly is limited early. Use a shared RateLimitStore for exact limits."
+            )
+
+    # Share the cores between the workers instead of each torch pool using all of them
+    threads = settings.TORCH_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // max(1, workers))
+    torch.set_num_threads(threads)
+    print(
+        f"Worker {os.getpid()} ready (torch threads: {threads}, Ollama slots: {ollama_scheduler.parallel}). "
+        "Dedup fingerprints and profiling sessions are per worker."
+    )
@@ -1,13 +1,14 @@
 from google.cloud.bigquery import Client, SchemaField
 from google.cloud.bigquery.job import QueryJob
 from google.api_core import exceptions
-from typing import Any, List, Dict, Optional
+from typing import Any, AsyncIterator, List, Dict, Optional
 from google.cloud import bigquery
 from asyncio import to_thread
 from app.db.big_query.client import BigQueryClient
 from app.db.big_query.schemas import QueryParameters
 from app.core.models import BigQueryHistoryRecord
 from app.core.config import settings
+from app.core.metrics import track_db
 from datetime import datetime, timezone
 
 
@@ -48,6 +49,7 @@ class BigQueryService:
             print(f"An unexpected error occurred during query execution: {e}")
             raise
     
+    @track_db("bigquery", "insert_record")
     async def insert_record(self, record: BigQueryHistoryRecord) -> bool:
         """
         Inserts a single BigQueryHistoryRecord into the configured BigQuery table asynchronously.
@@ -96,6 +98,41 @@ class BigQueryService:
             print(f"An error occurred during asynchronous insertion: {e}")
             return False
     
+    @track_db("bigquery", "update_scores")
+    async def update_scores(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Rewrites sentiment and visibility scores for many historical rows with one DML statement.
+        Rows still in the streaming buffer cannot be modified by DML and are reported by BigQuery as errors.
+
+        Args:
+            rows: Dicts with 'response_id', 'sentiment_score' and 'visibility_score'.
+        """
+        if not rows:
+            return
+
+        query = f"""
+            UPDATE `{self.full_table_id}` AS t
+            SET sentiment_score = s.sentiment_score,
+                visibility_score = s.visibility_score
+            FROM UNNEST(@rows) AS s
+            WHERE t.response_id = s.response_id;
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter("rows", "STRUCT", [
+                    bigquery.StructQueryParameter(
+                        None,
+                        bigquery.ScalarQueryParameter("response_id", "STRING", row["response_id"]),
+                        bigquery.ScalarQueryParameter("sentiment_score", "FLOAT64", row["sentiment_score"]),
+                        bigquery.ScalarQueryParameter("visibility_score", "FLOAT64", row["visibility_score"]),
+                    )
+                    for row in rows
+                ])
+            ]
+        )
+        await to_thread(self.run_query, sql_query=query, job_config=job_config)
+
+    @track_db("bigquery", "get_brand_metrics")
     async def get_brand_metrics(self, brand_name: str) -> Dict[str, float]:
         # Add wildcards for partial matching
         # search_value = f"%{brand_name}%"
@@ -134,6 +171,49 @@ class BigQueryService:
             "average_visibility_score": 0.0
         }
 
+    async def iter_history(
+        self,
+        batch_size: int,
+        brand_name: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Streams the history table as brand performance rows, oldest first. Results are read
+        page by page (batch_size rows per API call) instead of being materialised at once.
+        """
+        conditions: List[str] = []
+        query_parameters: List[bigquery.ScalarQueryParameter] = []
+        if brand_name:
+            conditions.append("LOWER(brand_keyword) = LOWER(@brand_name)")
+            query_parameters.append(bigquery.ScalarQueryParameter("brand_name", "STRING", brand_name))
+        # The timestamp column is a naive DATETIME in UTC (see insert_record)
+        if start:
+            conditions.append("timestamp >= @start")
+            query_parameters.append(bigquery.ScalarQueryParameter("start", "DATETIME", start.astimezone(timezone.utc).replace(tzinfo=None)))
+        if end:
+            conditions.append("timestamp <= @end")
+            query_parameters.append(bigquery.ScalarQueryParameter("end", "DATETIME", end.astimezone(timezone.utc).replace(tzinfo=None)))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        query = f"""
+            SELECT response_id, brand_keyword AS brand_name, visibility_score, sentiment_score, timestamp AS query_timestamp
+            FROM `{self.full_table_id}`
+            {where}
+            ORDER BY timestamp;
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+
+        def start_query():
+            return iter(self.client.query(query, job_config=job_config).result(page_size=batch_size).pages)
+
+        pages = await to_thread(start_query)
+        while True:
+            page = await to_thread(next, pages, None)
+            if page is None:
+                return
+            yield [dict(row) for row in page]
+
 
 BQ_SERVICE = None
 async def connect_to_big_query():
@@ -1,5 +1,7 @@
 from typing import Any, Optional
+import orjson
 from elasticsearch import AsyncElasticsearch
+from elasticsearch.serializer import OrjsonSerializer, NdjsonSerializer
 from app.core.config import settings
 
 # Configuration
@@ -9,6 +11,23 @@ es_client: Optional[AsyncElasticsearch] = None
 ES_INDEX_NAME = settings.ES_INDEX_NAME
 API_KEY = settings.ELASTICSEARCH_API_KEY
 
+
+class OrjsonNdjsonSerializer(NdjsonSerializer):
+    """NDJSON serializer backed by orjson, so NumPy arrays are encoded natively without Python float lists."""
+
+    def json_dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    def json_loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+# float32 embeddings go straight from the ndarray into the request/bulk body
+SERIALIZERS = {
+    OrjsonSerializer.mimetype: OrjsonSerializer(),
+    OrjsonNdjsonSerializer.mimetype: OrjsonNdjsonSerializer(),
+}
+
 async def connect_to_elasticsearch():
     """Initializes and connects to Elasticsearch."""
     global es_client
@@ -17,9 +36,9 @@ async def connect_to_elasticsearch():
         # Placeholder for AsyncElasticsearch initialization
         print("Debug: ", ELASTICSEARCH_DETAILS)
         if settings.ENVIRONMENT == "CLOUD":
-            es_client = AsyncElasticsearch(hosts=[ELASTICSEARCH_DETAILS], api_key=API_KEY)
+            es_client = AsyncElasticsearch(hosts=[ELASTICSEARCH_DETAILS], api_key=API_KEY, serializers=SERIALIZERS)
         else:
-            es_client = AsyncElasticsearch(hosts=[ELASTICSEARCH_DETAILS], api_key=API_KEY)
+            es_client = AsyncElasticsearch(hosts=[ELASTICSEARCH_DETAILS], api_key=API_KEY, serializers=SERIALIZERS)
         if not await es_client.ping():
             raise ConnectionError("Elasticsearch client failed to ping.")
         print("Connected successfully to Elasticsearch!")
@@ -1,33 +1,66 @@
+import datetime
 from typing import Dict, Any, Optional, List
 from app.db.elasticsearch.client import ES_INDEX_NAME, get_es_client
+from app.db.elasticsearch import partitions
+from app.core.config import settings
+from app.core.metrics import track_db
 from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk
 
-# Index mapping defines the schema for documents in Elasticsearch
-INDEX_MAPPING: Dict[str, Any] = {
-    "mappings": {
+def build_index_mapping() -> Dict[str, Any]:
+    """
+    Index mapping defines the schema for documents in Elasticsearch.
+    The embedding is indexed with the configured (quantized) HNSW variant and, by default,
+    left out of _source so each document doesn't also carry 384 floats as JSON.
+    """
+    embedding_field: Dict[str, Any] = {
+        "type": "dense_vector",
+        "dims": 384,
+        "index": True,        # allowed in serverless if vector search is enabled
+        "similarity": "cosine"
+    }
+    if settings.ES_VECTOR_INDEX_TYPE:
+        # e.g. int8_hnsw (4x smaller vectors in RAM), int4_hnsw, bbq_hnsw (32x) or plain hnsw
+        embedding_field["index_options"] = {"type": settings.ES_VECTOR_INDEX_TYPE}
+
+    mappings: Dict[str, Any] = {
         "properties": {
             "response_id": {"type": "keyword"},
             "brand_keyword": {"type": "keyword"},
             "keywords": {"type": "text"},
             "sentiment_score": {"type": "float"},
             "visibility_score": {"type": "float"},
+            "share_of_voice": {"type": "float"},
+            "chunk_similarities": {"type": "object", "enabled": False},  # stored only
+            "sentence_sentiments": {"type": "object", "enabled": False},  # stored only
+            "mentioned_competitors": {"type": "keyword"},
             "timestamp": {"type": "date"},
-            "embedding_vector": {
-                "type": "dense_vector",
-                "dims": 384,
-                "index": True,        # allowed in serverless if vector search is enabled
-                "similarity": "cosine"
-            }
+            "embedding_vector": embedding_field,
         }
     }
-}
+    if settings.ES_EXCLUDE_VECTORS_FROM_SOURCE:
+        mappings["_source"] = {"excludes": ["embedding_vector"]}
+    return {"mappings": mappings}
+
+
+INDEX_MAPPING: Dict[str, Any] = build_index_mapping()
 
 async def initialize_es_index():
-    """Checks if the index exists and creates it if it doesn't."""
+    """
+    Checks if the index exists and creates it if it doesn't.
+    With ES_ROLLING_INDICES, installs the monthly index template and points the write alias
+    at the current month's partition instead.
+    """
     es_client = get_es_client()
     if not await es_client.ping():
         raise ConnectionError("Elasticsearch client is not initialized.")
 
+    if settings.ES_ROLLING_INDICES:
+        await partitions.install_index_template(INDEX_MAPPING)
+        partition = await partitions.roll_write_alias()
+        print(f"Elasticsearch monthly indices ready (write: '{partitions.WRITE_ALIAS}' -> '{partition}', read: '{partitions.READ_ALIAS}').")
+        return
+
     if not await es_client.indices.exists(index=ES_INDEX_NAME):
         await es_client.indices.create(index=ES_INDEX_NAME, body=INDEX_MAPPING)
         print(f"Elasticsearch index '{ES_INDEX_NAME}' created successfully.")
@@ -36,6 +69,7 @@ async def initialize_es_index():
     print(f"Elasticsearch index setup simulated for '{ES_INDEX_NAME}'.")
 
 
+@track_db("elasticsearch", "get_visibility_scores")
 async def get_visibility_scores(brand_name: str) -> List[Dict[str, Any]]:
     es_client: AsyncElasticsearch = get_es_client()
 
@@ -49,7 +83,7 @@ async def get_visibility_scores(brand_name: str) -> List[Dict[str, Any]]:
         "size": 1000
     }
 
-    response = await es_client.search(index=ES_INDEX_NAME, body=query)
+    response = await es_client.search(index=partitions.read_target(), body=query)
 
     hits = response.get("hits", {}).get("hits", [])
     visibility_scores = [hit["_source"]["visibility_score"] for hit in hits if "visibility_score" in hit["_source"]]
@@ -57,6 +91,7 @@ async def get_visibility_scores(brand_name: str) -> List[Dict[str, Any]]:
     return visibility_scores
 
 
+@track_db("elasticsearch", "index_analysis_document")
 async def index_analysis_document(document: Dict[str, Any]) -> None:
     """Inserts the final analysis document into Elasticsearch."""
     es_client = get_es_client()
@@ -69,8 +104,172 @@ async def index_analysis_document(document: Dict[str, Any]) -> None:
         raise ValueError("Document must contain a 'response_id' for indexing.")
 
     await es_client.index(
-        index=ES_INDEX_NAME,
+        index=await partitions.write_target(document["timestamp"]),
         id=doc_id,
         document=document
     )
-    print(f"Document with ID {doc_id} successfully indexed in ES.")
\ No newline at end of file
+    print(f"Document with ID {doc_id} successfully indexed in ES.")
+
+
+@track_db("elasticsearch", "bulk_index_analysis_documents")
+async def bulk_index_analysis_documents(documents: List[Dict[str, Any]]) -> int:
+    """
+    Indexes many analysis documents with a single bulk request (response_id is the document ID).
+    Returns the number of successfully indexed documents.
+    """
+    es_client = get_es_client()
+
+    actions = [
+        {
+            "_op_type": "index",
+            "_index": await partitions.write_target(document["timestamp"]),
+            "_id": document["response_id"],
+            "_source": document,
+        }
+        for document in documents
+    ]
+    success, errors = await async_bulk(es_client, actions, raise_on_error=False)
+    if errors:
+        print(f"Elasticsearch bulk indexing reported {len(errors)} errors, first: {errors[0]}")
+    return success
+
+
+@track_db("elasticsearch", "get_analysis_embedding")
+async def get_analysis_embedding(response_id: str) -> Optional[List[float]]:
+    """
+    Returns the stored embedding of an analysed response, or None if it is not available.
+    With ES_EXCLUDE_VECTORS_FROM_SOURCE the vector is only in the kNN index, which search
+    responses cannot return, so this is None without a round trip: callers embed the raw
+    response again.
+    """
+    if settings.ES_EXCLUDE_VECTORS_FROM_SOURCE:
+        return None
+    es_client = get_es_client()
+    if settings.ES_ROLLING_INDICES:
+        # GET by ID needs a single concrete index; search the partition the ID is most likely in,
+        # then every partition (records imported with older timestamps)
+        likely = partitions.read_target_for_id(response_id)
+        for index in dict.fromkeys([likely, partitions.READ_ALIAS]):
+            response = await es_client.search(
+                index=index,
+                query={"ids": {"values": [response_id]}},
+                source_includes=["embedding_vector"],
+                size=1,
+                ignore_unavailable=True,
+                allow_no_indices=True,
+            )
+            hits = response.get("hits", {}).get("hits", [])
+            if hits:
+                return hits[0].get("_source", {}).get("embedding_vector")
+        return None
+
+    response = await es_client.options(ignore_status=404).get(
+        index=ES_INDEX_NAME,
+        id=response_id,
+        source_includes=["embedding_vector"],
+    )
+    if not response.get("found"):
+        return None
+    return response.get("_source", {}).get("embedding_vector")
+
+
+def _similarity_filters(
+    brand_name: Optional[str],
+    start: Optional[datetime.datetime],
+    end: Optional[datetime.datetime],
+    exclude_id: Optional[str],
+) -> Dict[str, Any]:
+    """Builds the bool filter shared by the approximate and the exact similarity queries."""
+    filters: List[Dict[str, Any]] = []
+    if brand_name:
+        filters.append({"term": {"brand_keyword": brand_name}})
+    if start or end:
+        time_range: Dict[str, Any] = {}
+        if start:
+            time_range["gte"] = start.isoformat()
+        if end:
+            time_range["lte"] = end.isoformat()
+        filters.append({"range": {"timestamp": time_range}})
+
+    bool_query: Dict[str, Any] = {"filter": filters}
+    if exclude_id:
+        bool_query["must_not"] = [{"ids": {"values": [exclude_id]}}]
+    return {"bool": bool_query}
+
+
+def _similarity_hits(response: Dict[str, Any], score_scale: float = 1.0) -> List[Dict[str, Any]]:
+    return [
+        {
+            "response_id": hit["_id"],
+            "brand_name": hit["_source"].get("brand_keyword"),
+            "score": round(hit["_score"] * score_scale, 4),
+            "visibility_score": hit["_source"].get("visibility_score"),
+            "timestamp": hit["_source"].get("timestamp"),
+        }
+        for hit in response.get("hits", {}).get("hits", [])
+    ]
+
+
+@track_db("elasticsearch", "search_similar_responses")
+async def search_similar_responses(
+    query_vector: List[float],
+    k: int,
+    num_candidates: int,
+    brand_name: Optional[str] = None,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    exclude_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Approximate kNN (HNSW) search over the stored response embeddings.
+    num_candidates is the per-shard candidate pool: larger values raise recall at the cost of latency.
+    Scores are the cosine similarity mapped to [0, 1].
+    """
+    es_client = get_es_client()
+    query = {
+        "knn": {
+            "field": "embedding_vector",
+            "query_vector": query_vector,
+            "k": k,
+            "num_candidates": num_candidates,
+            "filter": _similarity_filters(brand_name, start, end, exclude_id),
+        },
+        "_source": ["brand_keyword", "visibility_score", "timestamp"],
+        "size": k,
+    }
+    # Only the monthly partitions overlapping the time filter are searched
+    response = await es_client.search(index=partitions.read_target(start, end), body=query, ignore_unavailable=True, allow_no_indices=True)
+    return {"took_ms": response.get("took", 0), "hits": _similarity_hits(response)}
+
+
+@track_db("elasticsearch", "search_similar_responses_exact")
+async def search_similar_responses_exact(
+    query_vector: List[float],
+    k: int,
+    brand_name: Optional[str] = None,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    exclude_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Brute-force cosine search (script_score) with the same filters, used as ground truth
+    when measuring the recall of the approximate search. Cost is linear in the matching documents.
+    """
+    es_client = get_es_client()
+    query = {
+        "query": {
+            "script_score": {
+                "query": _similarity_filters(brand_name, start, end, exclude_id),
+                "script": {
+                    "source": "cosineSimilarity(params.query_vector, 'embedding_vector') + 1.0",
+                    "params": {"query_vector": query_vector},
+                },
+            }
+        },
+        "_source": ["brand_keyword", "visibility_score", "timestamp"],
+        "size": k,
+    }
+    # Only the monthly partitions overlapping the time filter are searched
+    response = await es_client.search(index=partitions.read_target(start, end), body=query, ignore_unavailable=True, allow_no_indices=True)
+    # cosine + 1 ∈ [0, 2] → [0, 1], the same scale as the kNN score
+    return {"took_ms": response.get("took", 0), "hits": _similarity_hits(response, score_scale=0.5)}
@@ -0,0 +1,186 @@
+"""
+Monthly analysis indices (ES_ROLLING_INDICES=true).
+
+Documents live in `<ES_INDEX_NAME>-YYYY.MM` partitions, chosen by the document timestamp and
+created from an index template that carries the mapping and attaches every partition to the
+read alias. The timestamp is always the query record's (inline analysis, workers and backfills
+alike), so a document ID never exists in two partitions. New documents are written through the
+write alias, which points at the current month's partition; re-indexed (backfilled) documents go
+straight to the partition of their month, lifting the write block of a compacted partition.
+Reads with a time range only search the partitions overlapping it.
+
+With ES_ROLLING_INDICES=false every name below resolves to the single ES_INDEX_NAME index.
+"""
+import datetime
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from bson.objectid import ObjectId
+
+from app.core.config import settings
+from app.db.elasticsearch.client import ES_INDEX_NAME, get_es_client
+
+TEMPLATE_NAME = f"{ES_INDEX_NAME}-monthly"
+# The dot keeps other '<ES_INDEX_NAME>-...' indices (e.g. reindex_vectors targets) out of the template
+INDEX_PATTERN = f"{ES_INDEX_NAME}-*.*"
+READ_ALIAS = f"{ES_INDEX_NAME}-read"
+WRITE_ALIAS = f"{ES_INDEX_NAME}-write"
+_PARTITION_RE = re.compile(rf"^{re.escape(ES_INDEX_NAME)}-(\d{{4}})\.(\d{{2}})$")
+
+# Partition the write alias currently points at (per process, refreshed when the month changes)
+_write_partition: Optional[str] = None
+# Older partitions this process has checked for (and lifted) the compaction write block
+_writable_partitions: Set[str] = set()
+
+
+def _month_start(moment: datetime.datetime) -> datetime.datetime:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    moment = moment.astimezone(datetime.timezone.utc)
+    return datetime.datetime(moment.year, moment.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def _add_months(month: datetime.datetime, months: int) -> datetime.datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def partition_name(moment: datetime.datetime) -> str:
+    return f"{ES_INDEX_NAME}-{_month_start(moment):%Y.%m}"
+
+
+def partition_month(index_name: str) -> Optional[datetime.datetime]:
+    """First day of the month a partition holds, or None if the name is not a partition."""
+    match = _PARTITION_RE.match(index_name)
+    if not match:
+        return None
+    return datetime.datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=datetime.timezone.utc)
+
+
+def read_target(start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None) -> str:
+    """Index expression for a search: the partitions overlapping [start, end], or the read alias."""
+    if not settings.ES_ROLLING_INDICES:
+        return ES_INDEX_NAME
+    if start is None:
+        return READ_ALIAS
+    month = _month_start(start)
+    last = _month_start(end or datetime.datetime.now(datetime.timezone.utc))
+    names = []
+    while month <= last:
+        names.append(f"{ES_INDEX_NAME}-{month:%Y.%m}")
+        month = _add_months(month, 1)
+    return ",".join(names) if names else READ_ALIAS
+
+
+def read_target_for_id(response_id: str) -> str:
+    """
+    Partition that most likely holds a document: a MongoDB ObjectId carries its creation time, and
+    the record's timestamp is taken just before the insert, so (across midnight) it can be in the
+    previous month. Records imported with older timestamps are elsewhere: callers fall back to
+    the read alias when this misses.
+    """
+    if not settings.ES_ROLLING_INDICES:
+        return ES_INDEX_NAME
+    try:
+        created = ObjectId(response_id).generation_time
+    except Exception:
+        return READ_ALIAS
+    return read_target(created - datetime.timedelta(minutes=5), created)
+
+
+async def write_target(timestamp: datetime.datetime) -> str:
+    """Index to write a document with this timestamp to."""
+    if not settings.ES_ROLLING_INDICES:
+        return ES_INDEX_NAME
+    partition = partition_name(timestamp)
+    if partition == partition_name(datetime.datetime.now(datetime.timezone.utc)):
+        if partition != _write_partition:
+            await roll_write_alias()
+        return WRITE_ALIAS
+    # Older months: the partition exists already, or the template creates it on the first write
+    if partition not in _writable_partitions:
+        await _lift_write_block(partition)
+    return partition
+
+
+async def _lift_write_block(partition: str) -> None:
+    """Re-opens a compacted partition for writes; the next apply_retention run compacts it again."""
+    es_client = get_es_client()
+    index_settings = await es_client.options(ignore_status=404).indices.get_settings(index=partition, name="index.blocks.write")
+    if index_settings.get(partition, {}).get("settings", {}).get("index", {}).get("blocks", {}).get("write") == "true":
+        await es_client.indices.put_settings(index=partition, settings={"index.blocks.write": False})
+        print(f"Elasticsearch partition '{partition}' re-opened for writes (it is compacted again on the next retention run).")
+    _writable_partitions.add(partition)
+
+
+async def install_index_template(mapping: Dict[str, Any]) -> None:
+    """Creates or updates the template every new partition is created from."""
+    template: Dict[str, Any] = {**mapping, "aliases": {READ_ALIAS: {}}}
+    if settings.ES_SHARDS_PER_INDEX:
+        template["settings"] = {"number_of_shards": settings.ES_SHARDS_PER_INDEX}
+    await get_es_client().indices.put_index_template(
+        name=TEMPLATE_NAME,
+        index_patterns=[INDEX_PATTERN],
+        template=template,
+        priority=100,
+    )
+
+
+async def roll_write_alias() -> str:
+    """Creates the current month's partition if needed and points the write alias at it."""
+    global _write_partition
+    es_client = get_es_client()
+    partition = partition_name(datetime.datetime.now(datetime.timezone.utc))
+    if not await es_client.indices.exists(index=partition):
+        # Another process may create it first
+        await es_client.options(ignore_status=400).indices.create(index=partition)
+
+    actions: List[Dict[str, Any]] = [{"add": {"index": partition, "alias": WRITE_ALIAS, "is_write_index": True}}]
+    if await es_client.indices.exists_alias(name=WRITE_ALIAS):
+        current = await es_client.indices.get_alias(name=WRITE_ALIAS)
+        actions += [{"remove": {"index": index, "alias": WRITE_ALIAS}} for index in current if index != partition]
+    # One atomic switch: writers never see the alias pointing at zero or two indices
+    await es_client.indices.update_aliases(actions=actions)
+    if partition != _write_partition:
+        print(f"Elasticsearch write alias '{WRITE_ALIAS}' -> '{partition}'.")
+    _write_partition = partition
+    return partition
+
+
+async def list_partitions() -> List[str]:
+    indices = await get_es_client().indices.get(index=INDEX_PATTERN, allow_no_indices=True, expand_wildcards="open")
+    return sorted(name for name in indices if partition_month(name) is not None)
+
+
+async def apply_retention(
+    retention_months: int,
+    compact_after_months: int,
+    now: Optional[datetime.datetime] = None,
+    dry_run: bool = False,
+) -> Dict[str, List[str]]:
+    """
+    Deletes partitions older than retention_months (0 = keep all) and compacts the ones older
+    than compact_after_months (0 = never): writes are blocked and the index is force-merged
+    to a single segment, which shrinks it and speeds up searches. The current partition is
+    never touched. A partition re-opened by a backfill (write_target) is compacted again.
+    Returns the partitions deleted and compacted.
+    """
+    es_client = get_es_client()
+    current = _month_start(now or datetime.datetime.now(datetime.timezone.utc))
+    result: Dict[str, List[str]] = {"deleted": [], "compacted": []}
+
+    for name in await list_partitions():
+        month = partition_month(name)
+        if retention_months and month < _add_months(current, -retention_months):
+            if not dry_run:
+                await es_client.indices.delete(index=name)
+            result["deleted"].append(name)
+        elif compact_after_months and month < _add_months(current, -compact_after_months):
+            index_settings = await es_client.indices.get_settings(index=name, name="index.blocks.write")
+            if index_settings[name]["settings"].get("index", {}).get("blocks", {}).get("write") == "true":
+                continue
+            if not dry_run:
+                await es_client.indices.put_settings(index=name, settings={"index.blocks.write": True})
+                await es_client.indices.forcemerge(index=name, max_num_segments=1)
+            result["compacted"].append(name)
+    return result
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+from app.core.config import settings
+
+# Configuration
+SQLITE_PATH = os.path.join(settings.EMBEDDED_DATA_DIR, "gsvt.sqlite3")
+
+# Global client objects: one connection, used only from a dedicated thread
+sqlite_connection: sqlite3.Connection | None = None
+sqlite_executor: ThreadPoolExecutor | None = None
+
+T = TypeVar("T")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_records (
+    id TEXT PRIMARY KEY,                 -- ObjectId hex, so the order follows insertion time
+    user_id TEXT,
+    brand_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    visibility_score REAL,
+    timestamp TEXT NOT NULL,
+    processed_at TEXT,
+    document TEXT NOT NULL,              -- the full QueryRecord as JSON
+    lease_owner TEXT,                    -- analysis worker holding the record (ANALYSIS_MODE=WORKER)
+    lease_expires_at TEXT,
+    lease_attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_query_records_comparison ON query_records (json_extract(document, '$.comparison_id'));
+CREATE INDEX IF NOT EXISTS idx_query_records_brand ON query_records (brand_name, id);
+
+CREATE TABLE IF NOT EXISTS tracked_brands (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    brand_name TEXT NOT NULL,
+    cadence TEXT NOT NULL,
+    offset_seconds REAL NOT NULL,        -- position of the runs within the cadence interval
+    created_at TEXT NOT NULL,
+    next_run_at TEXT NOT NULL,
+    last_run_at TEXT,
+    last_response_id TEXT,
+    lease_owner TEXT,                    -- scheduler currently running it
+    lease_expires_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tracked_brands_due ON tracked_brands (next_run_at);
+CREATE INDEX IF NOT EXISTS idx_tracked_brands_user ON tracked_brands (user_id);
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key_id TEXT PRIMARY KEY,             -- user and Idempotency-Key header of a POST /query-brand
+    request_hash TEXT NOT NULL,
+    owner TEXT NOT NULL,                 -- request currently (or last) running it
+    response TEXT,                       -- the first response as JSON, once it completed
+    created_at TEXT NOT NULL,
+    locked_until TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expiry ON idempotency_keys (expires_at);
+
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    hashed_password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS analysis_documents (
+    response_id TEXT PRIMARY KEY,
+    brand_keyword TEXT NOT NULL,
+    visibility_score REAL,
+    timestamp TEXT NOT NULL,
+    vector_dim INTEGER,
+    vector_row INTEGER,                  -- row of the embedding in the local vector file
+    document TEXT NOT NULL               -- the analysis document as JSON, without the embedding
+);
+CREATE INDEX IF NOT EXISTS idx_analysis_documents_brand_time ON analysis_documents (brand_keyword, timestamp);
+
+CREATE TABLE IF NOT EXISTS brand_performance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    brand_name TEXT NOT NULL,
+    visibility_score REAL NOT NULL,
+    query_timestamp TEXT NOT NULL,
+    response_id TEXT UNIQUE NOT NULL,
+    inserted_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_brand_performance_brand ON brand_performance (brand_name COLLATE NOCASE);
+"""
+
+
+def _open_connection(path: str) -> sqlite3.Connection:
+    # Writes go through `with connection:` so every call (or batch) commits as one transaction
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    # WAL: readers in other processes never block the writer; NORMAL sync is durable across app crashes
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA busy_timeout=5000")
+    connection.executescript(SCHEMA)
+    _migrate(connection)
+    return connection
+
+
+def _migrate(connection: sqlite3.Connection) -> None:
+    """Adds the columns introduced after a database file was created."""
+    columns = {row["name"] for row in connection.execute("PRAGMA table_info(query_records)")}
+    with connection:
+        for column, definition in (
+            ("lease_owner", "TEXT"),
+            ("lease_expires_at", "TEXT"),
+            ("lease_attempts", "INTEGER NOT NULL DEFAULT 0"),
+        ):
+            if column not in columns:
+                connection.execute(f"ALTER TABLE query_records ADD COLUMN {column} {definition}")
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_query_records_queue ON query_records (status, lease_expires_at)")
+
+
+async def connect_to_sqlite():
+    """Opens the embedded SQLite database (WAL mode) and creates the tables if needed."""
+    global sqlite_connection, sqlite_executor
+    print(f"Opening embedded SQLite database at {SQLITE_PATH}...")
+    try:
+        os.makedirs(os.path.dirname(SQLITE_PATH) or ".", exist_ok=True)
+        sqlite_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        sqlite_connection = await asyncio.get_running_loop().run_in_executor(sqlite_executor, _open_connection, SQLITE_PATH)
+        print("Embedded SQLite database ready!")
+    except Exception as e:
+        print(f"Could not open the SQLite database: {e}")
+        raise
+
+
+async def close_sqlite():
+    """Closes the SQLite connection and its thread."""
+    global sqlite_connection, sqlite_executor
+    if sqlite_connection is not None:
+        await asyncio.get_running_loop().run_in_executor(sqlite_executor, sqlite_connection.close)
+        sqlite_connection = None
+        print("SQLite connection closed.")
+    if sqlite_executor is not None:
+        sqlite_executor.shutdown(wait=True)
+        sqlite_executor = None
+
+
+async def run_sqlite(func: Callable[[sqlite3.Connection], T]) -> T:
+    """Runs func(connection) on the SQLite thread, keeping blocking I/O off the event loop."""
+    if sqlite_connection is None:
+        raise ConnectionError("SQLite database is not initialized. Check startup event.")
+    return await asyncio.get_running_loop().run_in_executor(sqlite_executor, func, sqlite_connection)
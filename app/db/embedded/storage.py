@@ -0,0 +1,652 @@
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from app.analysis.vector_store import LocalVectorStore
+from app.auth.core.utils import hash_password
+from app.auth.models.auth_models import UserInDB
+from app.core.config import settings
+from app.core.metrics import track_db
+from app.db.embedded.client import connect_to_sqlite, close_sqlite, run_sqlite
+from app.db.export_rows import query_record_row
+from app.db.storage_base import StorageBackend
+
+VECTOR_KEY = "analysis_documents"
+
+
+def _ts(value: datetime.datetime | str | None) -> str | None:
+    """UTC timestamp text with a fixed width, so SQLite can compare and sort it as a string."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return _ts(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def _dumps(document: Dict[str, Any]) -> str:
+    return json.dumps(document, default=_json_default)
+
+
+class EmbeddedStorageBackend(StorageBackend):
+    """
+    Single-node storage with no network services: SQLite in WAL mode for query records,
+    users, analysis documents and brand performance rows, plus a local memory-mapped
+    vector file for the embeddings.
+
+    Similarity search is an exact, vectorised scan over the embeddings that pass the
+    filters, so num_candidates is ignored and recall is always 1.
+    """
+
+    def __init__(self, data_dir: str):
+        self.vectors = LocalVectorStore(
+            directory=os.path.join(data_dir, "vectors"),
+            dtype=settings.VECTOR_STORE_DTYPE,
+            max_rows=0,  # rows are referenced by analysis_documents.vector_row, never compacted
+        )
+
+    async def connect(self) -> None:
+        await connect_to_sqlite()
+
+    async def close(self) -> None:
+        await close_sqlite()
+
+    # --- Query records ---
+    @track_db("sqlite", "insert_query_record")
+    async def insert_query_record(self, document: Dict[str, Any]) -> str:
+        response_id = str(ObjectId())
+        response_data = document["response_data"]
+
+        def insert(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute(
+                    "INSERT INTO query_records (id, user_id, brand_name, status, visibility_score, timestamp, document) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        response_id,
+                        document.get("user_id"),
+                        response_data["brand_name"],
+                        response_data.get("status", "Processing"),
+                        response_data.get("visibility_score"),
+                        _ts(document["timestamp"]),
+                        _dumps(document),
+                    ),
+                )
+        await run_sqlite(insert)
+        return response_id
+
+    @staticmethod
+    def _response_data(row: sqlite3.Row) -> Dict[str, Any]:
+        # Status and score live in their own columns; the JSON keeps the record as first inserted
+        response_data = json.loads(row["document"])["response_data"]
+        response_data.update({
+            "response_id": row["id"],
+            "status": row["status"],
+            "visibility_score": row["visibility_score"],
+            "processed_at": row["processed_at"],
+        })
+        return response_data
+
+    @track_db("sqlite", "get_query_details_by_id")
+    async def get_query_details_by_id(self, response_id: str) -> Dict[str, Any] | None:
+        row = await run_sqlite(lambda c: c.execute(
+            "SELECT id, status, visibility_score, processed_at, document FROM query_records WHERE id = ?", (response_id,)
+        ).fetchone())
+        return self._response_data(row) if row else None
+
+    @track_db("sqlite", "get_query_details_by_comparison")
+    async def get_query_details_by_comparison(self, comparison_id: str) -> List[Dict[str, Any]]:
+        rows = await run_sqlite(lambda c: c.execute(
+            "SELECT id, status, visibility_score, processed_at, document FROM query_records "
+            "WHERE json_extract(document, '$.comparison_id') = ? ORDER BY id",
+            (comparison_id,),
+        ).fetchall())
+        return [self._response_data(row) for row in rows]
+
+    @track_db("sqlite", "update_query_status_and_score")
+    async def update_query_status_and_score(self, response_id: str, visibility_score: float) -> None:
+        matched = await self.bulk_update_query_scores({response_id: visibility_score})
+        if matched == 0:
+            print(f"Warning: SQLite record with ID {response_id} not found for update.")
+
+    @track_db("sqlite", "bulk_update_query_scores")
+    async def bulk_update_query_scores(self, scores: Dict[str, float]) -> int:
+        if not scores:
+            return 0
+        processed_at = _ts(datetime.datetime.now(datetime.timezone.utc))
+
+        def update(connection: sqlite3.Connection) -> int:
+            with connection:
+                cursor = connection.executemany(
+                    "UPDATE query_records SET status = 'Complete', visibility_score = ?, processed_at = ? WHERE id = ?",
+                    [(score, processed_at, response_id) for response_id, score in scores.items()],
+                )
+            return cursor.rowcount
+        return await run_sqlite(update)
+
+    async def iter_query_records(self, batch_size: int, after_id: str | None = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        last_id = after_id or ""
+        while True:
+            rows = await run_sqlite(lambda c: c.execute(
+                "SELECT id, status, visibility_score, processed_at, timestamp, document FROM query_records "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall())
+            if not rows:
+                return
+            yield [
+                {
+                    "_id": row["id"],
+                    "timestamp": datetime.datetime.fromisoformat(row["timestamp"]),
+                    "response_data": self._response_data(row),
+                }
+                for row in rows
+            ]
+            last_id = rows[-1]["id"]
+
+    @track_db("sqlite", "get_query_records_before")
+    async def get_query_records_before(self, brand_name: str, before_id: str, limit: int) -> List[Dict[str, Any]]:
+        rows = await run_sqlite(lambda c: c.execute(
+            "SELECT id, status, visibility_score, processed_at, timestamp, document FROM query_records "
+            "WHERE brand_name = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (brand_name, before_id, limit),
+        ).fetchall())
+        return [
+            {
+                "_id": row["id"],
+                "timestamp": datetime.datetime.fromisoformat(row["timestamp"]),
+                "response_data": self._response_data(row),
+            }
+            for row in reversed(rows)
+        ]
+
+    # --- Analysis queue ---
+    @track_db("sqlite", "claim_queued_records")
+    async def claim_queued_records(self, worker_id: str, limit: int, lease_seconds: float, max_attempts: int) -> List[Dict[str, Any]]:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        expires_at = _ts(now + datetime.timedelta(seconds=lease_seconds))
+
+        def claim(connection: sqlite3.Connection) -> List[sqlite3.Row]:
+            # One transaction holding SQLite's write lock: other worker processes wait, then see the new leases
+            with connection:
+                connection.execute(
+                    "UPDATE query_records SET status = 'Failed', processed_at = ?, lease_owner = NULL, lease_expires_at = NULL "
+                    "WHERE (status = 'Queued' OR (status = 'Processing' AND lease_expires_at < ?)) AND lease_attempts >= ?",
+                    (_ts(now), _ts(now), max_attempts),
+                )
+                return connection.execute(
+                    "UPDATE query_records SET status = 'Processing', lease_owner = ?, lease_expires_at = ?, "
+                    "lease_attempts = lease_attempts + 1 "
+                    "WHERE id IN (SELECT id FROM query_records "
+                    "WHERE status = 'Queued' OR (status = 'Processing' AND lease_expires_at < ?) ORDER BY id LIMIT ?) "
+                    "RETURNING id, timestamp, status, visibility_score, processed_at, document",
+                    (worker_id, expires_at, _ts(now), limit),
+                ).fetchall()
+        rows = sorted(await run_sqlite(claim), key=lambda row: row["id"])
+        return [
+            {"_id": row["id"], "timestamp": datetime.datetime.fromisoformat(row["timestamp"]), "response_data": self._response_data(row)}
+            for row in rows
+        ]
+
+    @track_db("sqlite", "renew_leases")
+    async def renew_leases(self, worker_id: str, response_ids: List[str], lease_seconds: float) -> int:
+        expires_at = _ts(datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=lease_seconds))
+
+        def renew(connection: sqlite3.Connection) -> int:
+            with connection:
+                cursor = connection.executemany(
+                    "UPDATE query_records SET lease_expires_at = ? WHERE id = ? AND lease_owner = ?",
+                    [(expires_at, response_id, worker_id) for response_id in response_ids],
+                )
+            return cursor.rowcount
+        return await run_sqlite(renew)
+
+    @track_db("sqlite", "release_leases")
+    async def release_leases(self, worker_id: str, response_ids: List[str]) -> None:
+        def release(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.executemany(
+                    "UPDATE query_records SET status = CASE WHEN status = 'Processing' THEN 'Queued' ELSE status END, "
+                    "lease_owner = NULL, lease_expires_at = NULL WHERE id = ? AND lease_owner = ?",
+                    [(response_id, worker_id) for response_id in response_ids],
+                )
+        await run_sqlite(release)
+
+    # --- Export (keyset pagination: each batch is one indexed query, nothing is held open) ---
+    async def iter_export_records(self, batch_size, brand_name=None, user_id=None, start=None, end=None) -> AsyncIterator[List[Dict[str, Any]]]:
+        conditions, args = ["id > ?"], [""]
+        if brand_name:
+            conditions.append("brand_name = ? COLLATE NOCASE")
+            args.append(brand_name)
+        if user_id:
+            conditions.append("user_id = ?")
+            args.append(user_id)
+        if start:
+            conditions.append("timestamp >= ?")
+            args.append(_ts(start))
+        if end:
+            conditions.append("timestamp <= ?")
+            args.append(_ts(end))
+        sql = (f"SELECT id, status, visibility_score, processed_at, timestamp, document FROM query_records "
+               f"WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?")
+
+        while True:
+            rows = await run_sqlite(lambda c: c.execute(sql, (*args, batch_size)).fetchall())
+            if not rows:
+                return
+            batch = []
+            for row in rows:
+                document = json.loads(row["document"])
+                document["response_data"] = self._response_data(row)
+                document["timestamp"] = datetime.datetime.fromisoformat(row["timestamp"])
+                if row["processed_at"]:
+                    document["response_data"]["processed_at"] = datetime.datetime.fromisoformat(row["processed_at"])
+                batch.append(query_record_row(row["id"], document))
+            yield batch
+            args[0] = rows[-1]["id"]
+
+    async def iter_performance_rows(self, batch_size, brand_name=None, start=None, end=None) -> AsyncIterator[List[Dict[str, Any]]]:
+        conditions, args = ["id > ?"], [0]
+        if brand_name:
+            conditions.append("brand_name = ? COLLATE NOCASE")
+            args.append(brand_name)
+        if start:
+            conditions.append("query_timestamp >= ?")
+            args.append(_ts(start))
+        if end:
+            conditions.append("query_timestamp <= ?")
+            args.append(_ts(end))
+        sql = (f"SELECT id, response_id, brand_name, visibility_score, query_timestamp FROM brand_performance "
+               f"WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?")
+
+        while True:
+            rows = await run_sqlite(lambda c: c.execute(sql, (*args, batch_size)).fetchall())
+            if not rows:
+                return
+            yield [
+                {
+                    "response_id": row["response_id"],
+                    "brand_name": row["brand_name"],
+                    "visibility_score": row["visibility_score"],
+                    "sentiment_score": None,
+                    "query_timestamp": datetime.datetime.fromisoformat(row["query_timestamp"]),
+                }
+                for row in rows
+            ]
+            args[0] = rows[-1]["id"]
+
+    # --- Tracked brands ---
+    @staticmethod
+    def _tracked_brand(row: sqlite3.Row) -> Dict[str, Any]:
+        def parse(value: str | None) -> datetime.datetime | None:
+            return datetime.datetime.fromisoformat(value) if value else None
+        return {
+            "tracking_id": row["id"],
+            "user_id": row["user_id"],
+            "brand_name": row["brand_name"],
+            "cadence": row["cadence"],
+            "offset_seconds": row["offset_seconds"],
+            "created_at": parse(row["created_at"]),
+            "next_run_at": parse(row["next_run_at"]),
+            "last_run_at": parse(row["last_run_at"]),
+            "last_response_id": row["last_response_id"],
+        }
+
+    @track_db("sqlite", "insert_tracked_brand")
+    async def insert_tracked_brand(self, document: Dict[str, Any]) -> str:
+        tracking_id = str(ObjectId())
+
+        def insert(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute(
+                    "INSERT INTO tracked_brands (id, user_id, brand_name, cadence, offset_seconds, created_at, next_run_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        tracking_id,
+                        document["user_id"],
+                        document["brand_name"],
+                        document["cadence"],
+                        document["offset_seconds"],
+                        _ts(document["created_at"]),
+                        _ts(document["next_run_at"]),
+                    ),
+                )
+        await run_sqlite(insert)
+        return tracking_id
+
+    @track_db("sqlite", "list_tracked_brands")
+    async def list_tracked_brands(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = await run_sqlite(lambda c: c.execute(
+            "SELECT * FROM tracked_brands WHERE user_id = ? ORDER BY id", (user_id,)
+        ).fetchall())
+        return [self._tracked_brand(row) for row in rows]
+
+    @track_db("sqlite", "count_tracked_brands")
+    async def count_tracked_brands(self, user_id: str) -> int:
+        row = await run_sqlite(lambda c: c.execute(
+            "SELECT COUNT(*) AS n FROM tracked_brands WHERE user_id = ?", (user_id,)
+        ).fetchone())
+        return row["n"]
+
+    @track_db("sqlite", "delete_tracked_brand")
+    async def delete_tracked_brand(self, tracking_id: str, user_id: str) -> bool:
+        def delete(connection: sqlite3.Connection) -> int:
+            with connection:
+                return connection.execute(
+                    "DELETE FROM tracked_brands WHERE id = ? AND user_id = ?", (tracking_id, user_id)
+                ).rowcount
+        return await run_sqlite(delete) == 1
+
+    @track_db("sqlite", "claim_due_tracked_brands")
+    async def claim_due_tracked_brands(self, owner: str, now: datetime.datetime, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        expires_at = _ts(now + datetime.timedelta(seconds=lease_seconds))
+
+        def claim(connection: sqlite3.Connection) -> List[sqlite3.Row]:
+            # A single UPDATE ... RETURNING under SQLite's write lock: each due brand goes to one scheduler
+            with connection:
+                return connection.execute(
+                    "UPDATE tracked_brands SET lease_owner = ?, lease_expires_at = ? "
+                    "WHERE id IN (SELECT id FROM tracked_brands WHERE next_run_at <= ? "
+                    "AND (lease_expires_at IS NULL OR lease_expires_at < ?) ORDER BY next_run_at LIMIT ?) "
+                    "RETURNING *",
+                    (owner, expires_at, _ts(now), _ts(now), limit),
+                ).fetchall()
+        rows = sorted(await run_sqlite(claim), key=lambda row: row["next_run_at"])
+        return [self._tracked_brand(row) for row in rows]
+
+    @track_db("sqlite", "finish_tracked_run")
+    async def finish_tracked_run(self, tracking_id: str, owner: str, next_run_at: datetime.datetime, response_id: str | None) -> None:
+        def finish(connection: sqlite3.Connection) -> None:
+            with connection:
+                if response_id is not None:
+                    connection.execute(
+                        "UPDATE tracked_brands SET last_run_at = ?, last_response_id = ? WHERE id = ? AND lease_owner = ?",
+                        (_ts(datetime.datetime.now(datetime.timezone.utc)), response_id, tracking_id, owner),
+                    )
+                connection.execute(
+                    "UPDATE tracked_brands SET next_run_at = ?, lease_owner = NULL, lease_expires_at = NULL "
+                    "WHERE id = ? AND lease_owner = ?",
+                    (_ts(next_run_at), tracking_id, owner),
+                )
+        await run_sqlite(finish)
+
+    # --- Idempotency keys ---
+    @track_db("sqlite", "claim_idempotency_key")
+    async def claim_idempotency_key(self, key_id, owner, request_hash, now, lock_seconds, ttl_seconds) -> Optional[Dict[str, Any]]:
+        locked_until = _ts(now + datetime.timedelta(seconds=lock_seconds))
+        expires_at = _ts(now + datetime.timedelta(seconds=ttl_seconds))
+
+        def claim(connection: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            with connection:
+                # No TTL index in SQLite: expired keys are purged by the next claim
+                connection.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (_ts(now),))
+                # Insert, or take over a key left locked by a request that died; RETURNING only yields a row if we own it
+                claimed = connection.execute(
+                    "INSERT INTO idempotency_keys (key_id, request_hash, owner, created_at, locked_until, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key_id) DO UPDATE SET owner = excluded.owner, created_at = excluded.created_at, "
+                    "locked_until = excluded.locked_until, expires_at = excluded.expires_at "
+                    "WHERE response IS NULL AND locked_until <= ? AND request_hash = excluded.request_hash "
+                    "RETURNING owner",
+                    (key_id, request_hash, owner, _ts(now), locked_until, expires_at, _ts(now)),
+                ).fetchone()
+                if claimed is not None:
+                    return None
+                return connection.execute(
+                    "SELECT request_hash, response FROM idempotency_keys WHERE key_id = ?", (key_id,)
+                ).fetchone()
+        row = await run_sqlite(claim)
+        if row is None:
+            return None
+        return {"request_hash": row["request_hash"], "response": json.loads(row["response"]) if row["response"] else None}
+
+    @track_db("sqlite", "renew_idempotency_key")
+    async def renew_idempotency_key(self, key_id: str, owner: str, now: datetime.datetime, lock_seconds: float) -> bool:
+        locked_until = _ts(now + datetime.timedelta(seconds=lock_seconds))
+
+        def renew(connection: sqlite3.Connection) -> int:
+            with connection:
+                return connection.execute(
+                    "UPDATE idempotency_keys SET locked_until = ? WHERE key_id = ? AND owner = ? AND response IS NULL",
+                    (locked_until, key_id, owner),
+                ).rowcount
+        return await run_sqlite(renew) > 0
+
+    @track_db("sqlite", "complete_idempotency_key")
+    async def complete_idempotency_key(self, key_id: str, owner: str, response: Dict[str, Any]) -> None:
+        def complete(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute(
+                    "UPDATE idempotency_keys SET response = ? WHERE key_id = ? AND owner = ?",
+                    (json.dumps(response, default=str), key_id, owner),
+                )
+        await run_sqlite(complete)
+
+    @track_db("sqlite", "release_idempotency_key")
+    async def release_idempotency_key(self, key_id: str, owner: str) -> None:
+        def release(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute(
+                    "DELETE FROM idempotency_keys WHERE key_id = ? AND owner = ? AND response IS NULL", (key_id, owner)
+                )
+        await run_sqlite(release)
+
+    # --- Users ---
+    @track_db("sqlite", "get_user_by_email")
+    async def get_user_by_email(self, email: str) -> Optional[UserInDB]:
+        row = await run_sqlite(lambda c: c.execute(
+            "SELECT email, hashed_password FROM users WHERE email = ?", (email,)
+        ).fetchone())
+        return UserInDB(email=row["email"], hashed_password=row["hashed_password"]) if row else None
+
+    @track_db("sqlite", "create_user")
+    async def create_user(self, email: str, password: str) -> Optional[UserInDB]:
+        hashed_password = hash_password(password)
+
+        def insert(connection: sqlite3.Connection) -> int:
+            with connection:
+                return connection.execute(
+                    "INSERT OR IGNORE INTO users (email, hashed_password) VALUES (?, ?)", (email, hashed_password)
+                ).rowcount
+        inserted = await run_sqlite(insert)
+        if not inserted:
+            return None
+        print(f"User {email} created successfully.")
+        return UserInDB(email=email, hashed_password=hashed_password)
+
+    # --- Analysis documents ---
+    def _analysis_row(self, document: Dict[str, Any], previous: Optional[sqlite3.Row]) -> tuple:
+        """
+        Stores the embedding in the vector file and returns the analysis_documents row.
+        A re-indexed document overwrites its previous vector row instead of orphaning it.
+        """
+        document = dict(document)
+        embedding = document.pop("embedding_vector", None)
+        vector_dim = vector_row = None
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            vector_dim = int(embedding.shape[0])
+            if previous is not None and previous["vector_row"] is not None and previous["vector_dim"] == vector_dim:
+                vector_row = previous["vector_row"]
+                self.vectors.write(VECTOR_KEY, vector_row, embedding)
+            else:
+                vector_row = self.vectors.append(VECTOR_KEY, embedding)
+        return (
+            document["response_id"],
+            document["brand_keyword"],
+            document.get("visibility_score"),
+            _ts(document["timestamp"]),
+            vector_dim,
+            vector_row,
+            _dumps(document),
+        )
+
+    async def _write_analysis_rows(self, documents: List[Dict[str, Any]]) -> int:
+        response_ids = [document["response_id"] for document in documents]
+        previous_rows = await run_sqlite(lambda c: c.execute(
+            f"SELECT response_id, vector_dim, vector_row FROM analysis_documents WHERE response_id IN ({','.join('?' * len(response_ids))})",
+            response_ids,
+        ).fetchall())
+        previous = {row["response_id"]: row for row in previous_rows}
+        rows = await asyncio.to_thread(lambda: [self._analysis_row(document, previous.get(document["response_id"])) for document in documents])
+
+        def upsert(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO analysis_documents "
+                    "(response_id, brand_keyword, visibility_score, timestamp, vector_dim, vector_row, document) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        await run_sqlite(upsert)
+        return len(rows)
+
+    @track_db("sqlite", "index_analysis_document")
+    async def index_analysis_document(self, document: Dict[str, Any]) -> None:
+        if not document.get("response_id"):
+            raise ValueError("Document must contain a 'response_id' for indexing.")
+        await self._write_analysis_rows([document])
+
+    @track_db("sqlite", "bulk_index_analysis_documents")
+    async def bulk_index_analysis_documents(self, documents: List[Dict[str, Any]]) -> int:
+        return await self._write_analysis_rows(documents)
+
+    @track_db("sqlite", "get_visibility_scores")
+    async def get_visibility_scores(self, brand_name: str) -> List[float]:
+        rows = await run_sqlite(lambda c: c.execute(
+            "SELECT visibility_score FROM analysis_documents WHERE brand_keyword = ? AND visibility_score IS NOT NULL "
+            "ORDER BY timestamp DESC LIMIT 1000",
+            (brand_name,),
+        ).fetchall())
+        return [row["visibility_score"] for row in rows]
+
+    @track_db("sqlite", "get_analysis_embedding")
+    async def get_analysis_embedding(self, response_id: str) -> Optional[List[float]]:
+        row = await run_sqlite(lambda c: c.execute(
+            "SELECT vector_dim, vector_row FROM analysis_documents WHERE response_id = ?", (response_id,)
+        ).fetchone())
+        if row is None or row["vector_row"] is None:
+            return None
+        vectors = self.vectors.vectors(VECTOR_KEY, row["vector_dim"])
+        if row["vector_row"] >= vectors.shape[0]:
+            return None
+        return vectors[row["vector_row"]].astype(np.float32).tolist()
+
+    async def _search(
+        self,
+        query_vector: List[float],
+        k: int,
+        brand_name: Optional[str],
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+        exclude_id: Optional[str],
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        sql = ("SELECT response_id, brand_keyword, visibility_score, timestamp, vector_row FROM analysis_documents "
+               "WHERE vector_dim = ? AND vector_row IS NOT NULL")
+        params: List[Any] = [int(query.shape[0])]
+        if brand_name:
+            sql += " AND brand_keyword = ?"
+            params.append(brand_name)
+        if start:
+            sql += " AND timestamp >= ?"
+            params.append(_ts(start))
+        if end:
+            sql += " AND timestamp <= ?"
+            params.append(_ts(end))
+        if exclude_id:
+            sql += " AND response_id != ?"
+            params.append(exclude_id)
+        candidates = await run_sqlite(lambda c: c.execute(sql, params).fetchall())
+
+        def rank() -> List[Dict[str, Any]]:
+            vectors = self.vectors.vectors(VECTOR_KEY, query.shape[0])
+            usable = [row for row in candidates if row["vector_row"] < vectors.shape[0]]
+            if not usable:
+                return []
+            similarities = vectors[[row["vector_row"] for row in usable]] @ query
+            top = np.argsort(-similarities)[:k]
+            return [
+                {
+                    "response_id": usable[i]["response_id"],
+                    "brand_name": usable[i]["brand_keyword"],
+                    "score": round((float(similarities[i]) + 1) / 2, 4),  # cosine [-1,1] → [0,1], as in ES
+                    "visibility_score": usable[i]["visibility_score"],
+                    "timestamp": usable[i]["timestamp"],
+                }
+                for i in top
+            ]
+        hits = await asyncio.to_thread(rank)
+        return {"took_ms": int((time.perf_counter() - started) * 1000), "hits": hits}
+
+    @track_db("sqlite", "search_similar_responses")
+    async def search_similar_responses(self, query_vector, k, num_candidates, brand_name=None, start=None, end=None, exclude_id=None):
+        return await self._search(query_vector, k, brand_name, start, end, exclude_id)
+
+    @track_db("sqlite", "search_similar_responses_exact")
+    async def search_similar_responses_exact(self, query_vector, k, brand_name=None, start=None, end=None, exclude_id=None):
+        return await self._search(query_vector, k, brand_name, start, end, exclude_id)
+
+    # --- Brand performance ---
+    async def _upsert_performance(self, rows: List[tuple]) -> None:
+        def upsert(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO brand_performance (brand_name, visibility_score, query_timestamp, response_id) "
+                    "VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (response_id) DO UPDATE SET visibility_score = excluded.visibility_score",
+                    rows,
+                )
+        await run_sqlite(upsert)
+
+    @track_db("sqlite", "record_performance")
+    async def record_performance(self, analysis_document: Dict[str, Any], raw_llm_response: str) -> None:
+        await self._upsert_performance([(
+            analysis_document["brand_keyword"],
+            analysis_document["visibility_score"],
+            _ts(analysis_document["timestamp"]),
+            analysis_document["response_id"],
+        )])
+
+    @track_db("sqlite", "update_performance_scores")
+    async def update_performance_scores(self, documents: List[Dict[str, Any]]) -> None:
+        await self._upsert_performance([
+            (doc["brand_keyword"], doc["visibility_score"], _ts(doc["timestamp"]), doc["response_id"]) for doc in documents
+        ])
+
+    @track_db("sqlite", "get_brand_metrics")
+    async def get_brand_metrics(self, brand_name: str) -> Dict[str, Any]:
+        # LIKE without wildcards is a case-insensitive match, like ILIKE in the PostgreSQL query
+        row = await run_sqlite(lambda c: c.execute(
+            "SELECT COUNT(visibility_score) AS total_queries, AVG(visibility_score) AS average_score "
+            "FROM brand_performance WHERE brand_name LIKE ?",
+            (brand_name,),
+        ).fetchone())
+        if row and row["total_queries"] > 0:
+            return {
+                "brand_name": brand_name,
+                "total_queries": row["total_queries"],
+                "average_visibility_score": round(row["average_score"], 2),
+            }
+        return {"brand_name": brand_name, "total_queries": 0, "average_visibility_score": 0.0}
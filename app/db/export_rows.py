@@ -0,0 +1,46 @@
+from typing import Any, Dict, List, Tuple
+
+# Column name and kind ("string", "float" or "datetime") of each export dataset, in output order
+RECORD_COLUMNS: List[Tuple[str, str]] = [
+    ("response_id", "string"),
+    ("user_id", "string"),
+    ("brand_name", "string"),
+    ("status", "string"),
+    ("visibility_score", "float"),
+    ("model", "string"),
+    ("latency_ms", "float"),
+    ("timestamp", "datetime"),
+    ("processed_at", "datetime"),
+    ("comparison_id", "string"),
+    ("tracking_id", "string"),
+    ("user_query", "string"),
+    ("raw_llm_response", "string"),
+]
+
+PERFORMANCE_COLUMNS: List[Tuple[str, str]] = [
+    ("response_id", "string"),
+    ("brand_name", "string"),
+    ("visibility_score", "float"),
+    ("sentiment_score", "float"),       # only kept by the BigQuery history table
+    ("query_timestamp", "datetime"),
+]
+
+
+def query_record_row(response_id: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Flat export row (RECORD_COLUMNS) of a stored QueryRecord document."""
+    response_data = document["response_data"]
+    return {
+        "response_id": response_id,
+        "user_id": document.get("user_id"),
+        "brand_name": response_data.get("brand_name"),
+        "status": response_data.get("status"),
+        "visibility_score": response_data.get("visibility_score"),
+        "model": response_data.get("model"),
+        "latency_ms": response_data.get("latency_ms"),
+        "timestamp": document.get("timestamp"),
+        "processed_at": response_data.get("processed_at"),
+        "comparison_id": document.get("comparison_id"),
+        "tracking_id": document.get("tracking_id"),
+        "user_query": document.get("user_query"),
+        "raw_llm_response": response_data.get("raw_llm_response"),
+    }
@@ -0,0 +1,239 @@
+import asyncio
+import datetime
+import glob
+import io
+import mmap
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from bson import json_util
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings, ArchiveTarget
+from app.db.mongodb import compression
+from app.db.mongodb.client import get_mongo_db
+from app.core.metrics import track_db
+
+COLLECTION_NAME = settings.MONGO_COLLECTION_NAME
+ARCHIVE_COLLECTION_NAME = f"{COLLECTION_NAME}_archive"
+
+
+def archive_file_path(object_id: ObjectId) -> str:
+    """Monthly archive file of a record; the month comes from the ObjectId's creation time."""
+    month = object_id.generation_time.strftime("%Y-%m")
+    return os.path.join(settings.ARCHIVE_DIR, f"{COLLECTION_NAME}-{month}.ndjson.zst")
+
+
+def index_file_path(path: str) -> str:
+    """Sidecar of an NDJSON archive: one '<_id> <frame offset>' line per record."""
+    return f"{path}.idx"
+
+
+def _append_index(index_path: str, entries: List[Tuple[str, int]]) -> None:
+    with open(index_path, "a", encoding="ascii") as f:
+        f.write("".join(f"{response_id} {offset}\n" for response_id, offset in entries))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _append_ndjson(path: str, documents: List[Dict[str, Any]]) -> None:
+    # Each call appends one independent zstd frame; the sidecar index maps every _id to its frame
+    compressor, _ = compression.get_codec()
+    lines = "".join(json_util.dumps(document) + "\n" for document in documents)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path) and not os.path.exists(index_file_path(path)):
+        _build_ndjson_index(path)  # written before the index existed
+    with open(path, "ab") as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(compressor.compress(lines.encode("utf-8")))
+        f.flush()
+        os.fsync(f.fileno())
+    # Indexed after the frame is on disk; if this is lost, the batch is still in the hot
+    # collection and the next run archives (and indexes) it again
+    _append_index(index_file_path(path), [(str(document["_id"]), offset) for document in documents])
+
+
+def _frames(path: str) -> Iterator[Tuple[int, bytes]]:
+    """(offset, decompressed content) of every zstd frame in the file."""
+    _, decompressor = compression.get_codec()
+    with open(path, "rb") as f:
+        offset = 0
+        while True:
+            f.seek(offset)
+            reader = decompressor.decompressobj()
+            chunks, consumed = [], 0
+            while not reader.eof:
+                data = f.read(1 << 20)
+                if not data:
+                    return  # end of file (or a truncated last frame)
+                chunks.append(reader.decompress(data))
+                consumed += len(data)
+            yield offset, b"".join(chunks)
+            offset += consumed - len(reader.unused_data)
+
+
+def _build_ndjson_index(path: str) -> int:
+    """Writes the sidecar index of an NDJSON archive by decoding it once. Returns the records indexed."""
+    entries = [
+        (str(json_util.loads(line)["_id"]), offset)
+        for offset, content in _frames(path)
+        for line in content.decode("utf-8").splitlines() if line
+    ]
+    index_path = index_file_path(path)
+    _append_index(f"{index_path}.tmp", entries)
+    os.replace(f"{index_path}.tmp", index_path)
+    return len(entries)
+
+
+def index_ndjson_archives() -> int:
+    """Builds the missing sidecar indexes under ARCHIVE_DIR. Returns the number of files indexed."""
+    indexed = 0
+    for path in sorted(glob.glob(os.path.join(settings.ARCHIVE_DIR, "*.ndjson.zst"))):
+        if not os.path.exists(index_file_path(path)):
+            print(f"Indexed {_build_ndjson_index(path)} records of {path}.")
+            indexed += 1
+    return indexed
+
+
+def _indexed_offset(index_path: str, response_id: str) -> Optional[int]:
+    if os.path.getsize(index_path) == 0:
+        return None
+    with open(index_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+        start = index.find(f"{response_id} ".encode("ascii"))
+        if start < 0:
+            return None
+        end = index.find(b"\n", start)
+        return int(index[start + len(response_id) + 1:end])
+
+
+def _find_in_ndjson(path: str, response_id: str) -> Dict[str, Any] | None:
+    if not os.path.exists(path):
+        return None
+    index_path = index_file_path(path)
+    if not os.path.exists(index_path):
+        print(f"'{path}' has no index and is not searched; run python -m app.cli.archive --index-ndjson.")
+        return None
+    offset = _indexed_offset(index_path, response_id)
+    if offset is None:
+        return None
+
+    # Only the frame (archive batch) holding the record is decompressed
+    _, decompressor = compression.get_codec()
+    needle = f'"$oid": "{response_id}"'
+    with open(path, "rb") as f:
+        f.seek(offset)
+        reader = decompressor.stream_reader(f, read_across_frames=False)
+        for line in io.TextIOWrapper(reader, encoding="utf-8"):
+            # Cheap substring test before parsing the line
+            if needle in line:
+                document = json_util.loads(line)
+                if str(document["_id"]) == response_id:
+                    return document
+    return None
+
+
+@track_db("mongodb", "find_archived")
+async def find_archived(response_id: str) -> Dict[str, Any] | None:
+    """
+    Looks a record up in the cold tier: the archive collection, then the monthly NDJSON file.
+    Returns the full QueryRecord document (raw_llm_response decompressed), or None.
+    """
+    try:
+        object_id = ObjectId(response_id)
+    except Exception:
+        return None
+
+    document = await get_mongo_db()[ARCHIVE_COLLECTION_NAME].find_one({"_id": object_id})
+    if document is None:
+        document = await asyncio.to_thread(_find_in_ndjson, archive_file_path(object_id), response_id)
+    if document is not None:
+        compression.decompress_response_data(document["response_data"])
+    return document
+
+
+async def archive_records(older_than: datetime.datetime, target: ArchiveTarget, batch_size: int = 500) -> int:
+    """
+    Moves finished records (Complete or Failed) with a timestamp before `older_than` out of
+    the hot collection, to the archive collection (compressed) or to monthly zstd NDJSON files.
+    Each batch is written to the archive before it is deleted from the hot collection, so an
+    interrupted run leaves at most duplicates, never losses. Returns the number moved.
+    """
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot archive records.")
+
+    hot = mongo_db[COLLECTION_NAME]
+    query = {"timestamp": {"$lt": older_than}, "response_data.status": {"$in": ["Complete", "Failed"]}}
+    moved = 0
+    while True:
+        batch = await hot.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return moved
+
+        if target == ArchiveTarget.COLLECTION:
+            for document in batch:
+                compression.compress_response_data(document["response_data"], min_bytes=0)
+            try:
+                await mongo_db[ARCHIVE_COLLECTION_NAME].insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Already archived by an interrupted run (duplicate _id): anything else is fatal
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+        else:
+            by_file: Dict[str, List[Dict[str, Any]]] = {}
+            for document in batch:
+                compression.decompress_response_data(document["response_data"])
+                by_file.setdefault(archive_file_path(document["_id"]), []).append(document)
+            for path, documents in by_file.items():
+                await asyncio.to_thread(_append_ndjson, path, documents)
+
+        await hot.delete_many({"_id": {"$in": [document["_id"] for document in batch]}})
+        moved += len(batch)
+        print(f"Archived {moved} records...")
+
+
+async def compress_hot_records(batch_size: int = 500) -> int:
+    """Compresses raw_llm_response in existing hot records above the size threshold. Returns the number rewritten."""
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot compress records.")
+
+    hot = mongo_db[COLLECTION_NAME]
+    rewritten = 0
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {"response_data.raw_llm_response": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await hot.find(query, {"response_data.raw_llm_response": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return rewritten
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for document in batch:
+            response_data = compression.compress_response_data(document["response_data"])
+            if compression.COMPRESSED_FIELD in response_data:
+                operations.append(UpdateOne(
+                    {"_id": document["_id"]},
+                    {
+                        "$set": {f"response_data.{compression.COMPRESSED_FIELD}": response_data[compression.COMPRESSED_FIELD]},
+                        "$unset": {"response_data.raw_llm_response": ""},
+                    },
+                ))
+        if operations:
+            await hot.bulk_write(operations, ordered=False)
+            rewritten += len(operations)
+
+
+async def collection_stats(name: str) -> Dict[str, Any]:
+    """Document count, data size, on-disk size and index size of a collection (bytes)."""
+    stats = await get_mongo_db().command("collStats", name)
+    return {
+        "count": stats.get("count", 0),
+        "size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "total_index_size": stats.get("totalIndexSize", 0),
+    }
@@ -18,6 +18,19 @@ async def connect_to_mongodb():
         # Verify connection by pinging the server
         await db_client.admin.command('ping') 
         mongo_db = db_client[DB_NAME]
+        # Comparison lookups; single-model records (comparison_id null) stay out of the index
+        await mongo_db[settings.MONGO_COLLECTION_NAME].create_index(
+            "comparison_id", partialFilterExpression={"comparison_id": {"$type": "string"}}
+        )
+        # Analysis queue claims (ANALYSIS_MODE=WORKER)
+        await mongo_db[settings.MONGO_COLLECTION_NAME].create_index([("response_data.status", 1), ("lease.expires_at", 1)])
+        # Per-brand history lookups of a resumed backfill
+        await mongo_db[settings.MONGO_COLLECTION_NAME].create_index([("response_data.brand_name", 1), ("_id", -1)])
+        # Scheduler claims of due tracked brands, and per-user listings
+        await mongo_db["tracked_brands"].create_index("next_run_at")
+        await mongo_db["tracked_brands"].create_index("user_id")
+        # Idempotency keys of POST /query-brand expire on their own
+        await mongo_db["idempotency_keys"].create_index("expires_at", expireAfterSeconds=0)
         print("Connected successfully to MongoDB!")
     except Exception as e:
         print(f"Could not connect to MongoDB: {e}")
@@ -0,0 +1,55 @@
+from typing import Any, Dict
+from bson.binary import Binary
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # only needed when RAW_RESPONSE_COMPRESSION is on, or to read compressed records
+    zstandard = None
+
+# Compressed responses are stored under this key instead of response_data.raw_llm_response
+COMPRESSED_FIELD = "raw_llm_response_zstd"
+
+_compressor = None
+_decompressor = None
+
+
+def get_codec():
+    global _compressor, _decompressor
+    if zstandard is None:
+        raise RuntimeError("The 'zstandard' package is required for compressed LLM responses.")
+    if _compressor is None:
+        _compressor = zstandard.ZstdCompressor(level=settings.ZSTD_LEVEL)
+        _decompressor = zstandard.ZstdDecompressor()
+    return _compressor, _decompressor
+
+
+def compress_text(text: str) -> Binary:
+    compressor, _ = get_codec()
+    return Binary(compressor.compress(text.encode("utf-8")))
+
+
+def decompress_text(data: bytes) -> str:
+    _, decompressor = get_codec()
+    return decompressor.decompress(data).decode("utf-8")
+
+
+def compress_response_data(response_data: Dict[str, Any], min_bytes: int | None = None) -> Dict[str, Any]:
+    """
+    Replaces raw_llm_response with its zstd-compressed bytes when it is at least `min_bytes`
+    long (RAW_RESPONSE_COMPRESSION_MIN_BYTES by default). Modifies and returns the dict.
+    """
+    text = response_data.get("raw_llm_response")
+    threshold = settings.RAW_RESPONSE_COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+    if isinstance(text, str) and len(text.encode("utf-8")) >= threshold:
+        response_data[COMPRESSED_FIELD] = compress_text(text)
+        del response_data["raw_llm_response"]
+    return response_data
+
+
+def decompress_response_data(response_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Restores raw_llm_response from a compressed record (no-op for plain records)."""
+    data = response_data.pop(COMPRESSED_FIELD, None)
+    if data is not None:
+        response_data["raw_llm_response"] = decompress_text(bytes(data))
+    return response_data
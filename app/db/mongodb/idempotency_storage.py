@@ -0,0 +1,73 @@
+import datetime
+from typing import Any, Dict, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.db.mongodb.client import get_mongo_db
+from app.core.metrics import track_db
+
+# Entries are removed by the TTL index on expires_at (see client.connect_to_mongodb)
+IDEMPOTENCY_COLLECTION_NAME = "idempotency_keys"
+
+
+def _collection():
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot access idempotency keys.")
+    return mongo_db[IDEMPOTENCY_COLLECTION_NAME]
+
+
+@track_db("mongodb", "claim_idempotency_key")
+async def claim_idempotency_key(
+    key_id: str, owner: str, request_hash: str, now: datetime.datetime, lock_seconds: float, ttl_seconds: float
+) -> Optional[Dict[str, Any]]:
+    collection = _collection()
+    entry = {
+        "request_hash": request_hash,
+        "owner": owner,
+        "response": None,
+        "created_at": now,
+        "locked_until": now + datetime.timedelta(seconds=lock_seconds),
+        "expires_at": now + datetime.timedelta(seconds=ttl_seconds),
+    }
+    while True:
+        try:
+            # The unique _id makes the first request the owner; every duplicate gets DuplicateKeyError
+            await collection.insert_one({"_id": key_id, **entry})
+            return None
+        except DuplicateKeyError:
+            pass
+        # Expired but not yet removed (the TTL monitor runs once a minute), or left locked by
+        # a request that died: take it over
+        taken = await collection.find_one_and_update(
+            {"_id": key_id, "$or": [
+                {"expires_at": {"$lte": now}},
+                {"response": None, "locked_until": {"$lte": now}, "request_hash": request_hash},
+            ]},
+            {"$set": entry},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken is not None:
+            return None
+        existing = await collection.find_one({"_id": key_id})
+        if existing is not None:
+            return existing
+        # Released in between: try to insert again
+
+
+@track_db("mongodb", "renew_idempotency_key")
+async def renew_idempotency_key(key_id: str, owner: str, now: datetime.datetime, lock_seconds: float) -> bool:
+    result = await _collection().update_one(
+        {"_id": key_id, "owner": owner, "response": None},
+        {"$set": {"locked_until": now + datetime.timedelta(seconds=lock_seconds)}},
+    )
+    return result.matched_count > 0
+
+
+@track_db("mongodb", "complete_idempotency_key")
+async def complete_idempotency_key(key_id: str, owner: str, response: Dict[str, Any]) -> None:
+    await _collection().update_one({"_id": key_id, "owner": owner}, {"$set": {"response": response}})
+
+
+@track_db("mongodb", "release_idempotency_key")
+async def release_idempotency_key(key_id: str, owner: str) -> None:
+    await _collection().delete_one({"_id": key_id, "owner": owner, "response": None})
@@ -1,22 +1,33 @@
 import datetime
-from typing import Any, Dict
+import re
+from typing import Any, AsyncIterator, Dict, List
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
 from app.core.config import settings
 from app.db.mongodb.client import get_mongo_db
+from app.db.mongodb import archive, compression
+from app.db.export_rows import query_record_row
+from app.core.metrics import track_db
 
 
 COLLECTION_NAME = settings.MONGO_COLLECTION_NAME
 
+@track_db("mongodb", "insert_query_record")
 async def insert_query_record(document: dict[str, Any]) -> str:
     mongo_db = get_mongo_db()
     if mongo_db is None:
         raise ConnectionError("MongoDB client is not initialized. Check startup event.")
+
+    if settings.RAW_RESPONSE_COMPRESSION:
+        # Compress a copy; the caller's dict keeps the plain text
+        document = {**document, "response_data": compression.compress_response_data(dict(document["response_data"]))}
         
     # MongoDB creates the collection implicitly upon the first insertion if it doesn't exist.
     result = await mongo_db[COLLECTION_NAME].insert_one(document)
     
     return str(result.inserted_id)
 
+@track_db("mongodb", "update_query_status_and_score")
 async def update_query_status_and_score(response_id: str, visibility_score: float) -> None:
     mongo_db = get_mongo_db()
     if mongo_db is None:
@@ -46,9 +57,129 @@ async def update_query_status_and_score(response_id: str, visibility_score: floa
     if result.matched_count == 0:
         print(f"Warning: MongoDB record with ID {response_id} not found for update.")
 
+@track_db("mongodb", "bulk_update_query_scores")
+async def bulk_update_query_scores(scores: Dict[str, float]) -> int:
+    """
+    Sets status and visibility score for many records in one unordered bulk write.
+
+    Args:
+        scores: Mapping of response_id to the recalculated visibility score.
+
+    Returns:
+        The number of matched records.
+    """
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot update records.")
+
+    processed_at = datetime.datetime.now(datetime.timezone.utc)
+    operations = [
+        UpdateOne(
+            {"_id": ObjectId(response_id)},
+            {"$set": {
+                "response_data.status": "Complete",
+                "response_data.visibility_score": visibility_score,
+                "response_data.processed_at": processed_at,
+            }}
+        )
+        for response_id, visibility_score in scores.items()
+    ]
+    if not operations:
+        return 0
+
+    result = await mongo_db[COLLECTION_NAME].bulk_write(operations, ordered=False)
+    return result.matched_count
+
+async def iter_query_records(batch_size: int, after_id: str | None = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Streams stored QueryRecords in ascending _id order, yielding lists of up to batch_size documents.
+    Passing after_id resumes the scan just after that record.
+    """
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot read records.")
+
+    query: Dict[str, Any] = {"$or": [
+        {"response_data.raw_llm_response": {"$exists": True}},
+        {f"response_data.{compression.COMPRESSED_FIELD}": {"$exists": True}},
+    ]}
+    if after_id:
+        query["_id"] = {"$gt": ObjectId(after_id)}
+
+    cursor = mongo_db[COLLECTION_NAME].find(query).sort("_id", 1).batch_size(batch_size)
+    batch: List[Dict[str, Any]] = []
+    async for document in cursor:
+        compression.decompress_response_data(document["response_data"])
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@track_db("mongodb", "get_query_records_before")
+async def get_query_records_before(brand_name: str, before_id: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Returns the brand's last `limit` scorable records with an _id below before_id, oldest first.
+    Lets a resumed backfill rebuild the history it had before the interruption.
+    """
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot read records.")
+
+    query: Dict[str, Any] = {
+        "_id": {"$lt": ObjectId(before_id)},
+        "response_data.brand_name": brand_name,
+        "$or": [
+            {"response_data.raw_llm_response": {"$exists": True}},
+            {f"response_data.{compression.COMPRESSED_FIELD}": {"$exists": True}},
+        ],
+    }
+    documents = await mongo_db[COLLECTION_NAME].find(query).sort("_id", -1).limit(limit).to_list(length=limit)
+    for document in documents:
+        compression.decompress_response_data(document["response_data"])
+    return documents[::-1]
+
+async def iter_export_records(
+    batch_size: int,
+    brand_name: str | None = None,
+    user_id: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Streams flat export rows of the hot collection's records, oldest first. The cursor
+    fetches batch_size documents per round trip, so memory stays flat however many match.
+    """
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot read records.")
+
+    query: Dict[str, Any] = {}
+    if brand_name:
+        # Case-insensitive, like the brand metrics
+        query["response_data.brand_name"] = {"$regex": f"^{re.escape(brand_name)}$", "$options": "i"}
+    if user_id:
+        query["user_id"] = user_id
+    if start or end:
+        query["timestamp"] = {**({"$gte": start} if start else {}), **({"$lte": end} if end else {})}
+
+    cursor = mongo_db[COLLECTION_NAME].find(query, {"lease": 0}).sort("_id", 1).batch_size(batch_size)
+    batch: List[Dict[str, Any]] = []
+    async for document in cursor:
+        compression.decompress_response_data(document["response_data"])
+        batch.append(query_record_row(str(document["_id"]), document))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@track_db("mongodb", "get_query_details_by_id")
 async def get_query_details_by_id(response_id: str) -> Dict[str, Any] | None:
     """
     Feature 5: Retrieves the full query record (including status and score) from MongoDB.
+    Falls back to the archive (collection or NDJSON files) for records moved out of the hot collection.
     """
     mongo_db = get_mongo_db()
     if mongo_db is None:
@@ -61,11 +192,100 @@ async def get_query_details_by_id(response_id: str) -> Dict[str, Any] | None:
 
     # Fetch the document by its _id
     document = await mongo_db[COLLECTION_NAME].find_one({"_id": object_id})
+    if document is None:
+        document = await archive.find_archived(response_id)
     
     if document:
+        compression.decompress_response_data(document['response_data'])
         # Convert ObjectId to string for Pydantic compatibility
         document['response_data']['response_id'] = str(document.pop('_id')) 
         # MongoDB stores the full QueryRecord structure, we extract the response_data
         return document['response_data']
     
-    return None
\ No newline at end of file
+    return None
+
+
+@track_db("mongodb", "get_query_details_by_comparison")
+async def get_query_details_by_comparison(comparison_id: str) -> List[Dict[str, Any]]:
+    """
+    Retrieves the response_data of every record stored by one multi-model comparison.
+    """
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot fetch records.")
+
+    results = []
+    async for document in mongo_db[COLLECTION_NAME].find({"comparison_id": comparison_id}).sort("_id", 1):
+        compression.decompress_response_data(document['response_data'])
+        document['response_data']['response_id'] = str(document.pop('_id'))
+        results.append(document['response_data'])
+    return results
+
+# --- Analysis queue: leases live on the record ({"lease": {"owner", "expires_at", "attempts"}}) ---
+
+@track_db("mongodb", "claim_queued_records")
+async def claim_queued_records(worker_id: str, limit: int, lease_seconds: float, max_attempts: int) -> List[Dict[str, Any]]:
+    """
+    Leases up to `limit` queued (or abandoned) records for worker_id, oldest first.
+    Each claim is a single find_one_and_update, so concurrent workers never get the same record.
+    """
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot claim records.")
+
+    collection = mongo_db[COLLECTION_NAME]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expired = {"response_data.status": "Processing", "lease.expires_at": {"$lt": now}}
+    claimable = {"$or": [{"response_data.status": "Queued"}, expired]}
+
+    # Records that keep failing or losing their worker (crash, timeout) stop being retried
+    await collection.update_many(
+        {**claimable, "lease.attempts": {"$gte": max_attempts}},
+        {"$set": {"response_data.status": "Failed", "response_data.processed_at": now}, "$unset": {"lease.owner": "", "lease.expires_at": ""}},
+    )
+
+    claimed = []
+    for _ in range(limit):
+        document = await collection.find_one_and_update(
+            claimable,
+            {
+                "$set": {
+                    "response_data.status": "Processing",
+                    "lease.owner": worker_id,
+                    "lease.expires_at": now + datetime.timedelta(seconds=lease_seconds),
+                },
+                "$inc": {"lease.attempts": 1},
+            },
+            sort=[("_id", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if document is None:
+            break
+        compression.decompress_response_data(document["response_data"])
+        claimed.append(document)
+    return claimed
+
+@track_db("mongodb", "renew_leases")
+async def renew_leases(worker_id: str, response_ids: List[str], lease_seconds: float) -> int:
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot renew leases.")
+
+    result = await mongo_db[COLLECTION_NAME].update_many(
+        {"_id": {"$in": [ObjectId(rid) for rid in response_ids]}, "lease.owner": worker_id},
+        {"$set": {"lease.expires_at": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=lease_seconds)}},
+    )
+    return result.modified_count
+
+@track_db("mongodb", "release_leases")
+async def release_leases(worker_id: str, response_ids: List[str]) -> None:
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot release leases.")
+
+    owned = {"_id": {"$in": [ObjectId(rid) for rid in response_ids]}, "lease.owner": worker_id}
+    # Unfinished records go back to the queue; the attempt count is kept
+    await mongo_db[COLLECTION_NAME].update_many(
+        {**owned, "response_data.status": "Processing"}, {"$set": {"response_data.status": "Queued"}}
+    )
+    await mongo_db[COLLECTION_NAME].update_many(owned, {"$unset": {"lease.owner": "", "lease.expires_at": ""}})
@@ -0,0 +1,78 @@
+import datetime
+from typing import Any, Dict, List
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from app.db.mongodb.client import get_mongo_db
+from app.core.metrics import track_db
+
+TRACKING_COLLECTION_NAME = "tracked_brands"
+
+
+def _public(document: Dict[str, Any]) -> Dict[str, Any]:
+    document["tracking_id"] = str(document.pop("_id"))
+    document.pop("lease", None)
+    return document
+
+
+def _collection():
+    mongo_db = get_mongo_db()
+    if mongo_db is None:
+        raise ConnectionError("MongoDB client is not initialized. Cannot access tracked brands.")
+    return mongo_db[TRACKING_COLLECTION_NAME]
+
+
+@track_db("mongodb", "insert_tracked_brand")
+async def insert_tracked_brand(document: Dict[str, Any]) -> str:
+    result = await _collection().insert_one(dict(document))
+    return str(result.inserted_id)
+
+
+@track_db("mongodb", "list_tracked_brands")
+async def list_tracked_brands(user_id: str) -> List[Dict[str, Any]]:
+    return [_public(document) async for document in _collection().find({"user_id": user_id}).sort("_id", 1)]
+
+
+@track_db("mongodb", "count_tracked_brands")
+async def count_tracked_brands(user_id: str) -> int:
+    return await _collection().count_documents({"user_id": user_id})
+
+
+@track_db("mongodb", "delete_tracked_brand")
+async def delete_tracked_brand(tracking_id: str, user_id: str) -> bool:
+    try:
+        object_id = ObjectId(tracking_id)
+    except Exception:
+        return False
+    result = await _collection().delete_one({"_id": object_id, "user_id": user_id})
+    return result.deleted_count == 1
+
+
+@track_db("mongodb", "claim_due_tracked_brands")
+async def claim_due_tracked_brands(owner: str, now: datetime.datetime, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+    """Each claim is a single find_one_and_update, so concurrent schedulers never run the same brand."""
+    collection = _collection()
+    due = {
+        "next_run_at": {"$lte": now},
+        "$or": [{"lease.expires_at": None}, {"lease.expires_at": {"$lt": now}}],
+    }
+    claimed = []
+    for _ in range(limit):
+        document = await collection.find_one_and_update(
+            due,
+            {"$set": {"lease": {"owner": owner, "expires_at": now + datetime.timedelta(seconds=lease_seconds)}}},
+            sort=[("next_run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if document is None:
+            break
+        claimed.append(_public(document))
+    return claimed
+
+
+@track_db("mongodb", "finish_tracked_run")
+async def finish_tracked_run(tracking_id: str, owner: str, next_run_at: datetime.datetime, response_id: str | None) -> None:
+    update: Dict[str, Any] = {"next_run_at": next_run_at, "lease": None}
+    if response_id is not None:
+        update.update({"last_run_at": datetime.datetime.now(datetime.timezone.utc), "last_response_id": response_id})
+    # Only the lease holder advances the schedule (a run that outlived its lease changes nothing)
+    await _collection().update_one({"_id": ObjectId(tracking_id), "lease.owner": owner}, {"$set": update})
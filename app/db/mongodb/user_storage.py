@@ -1,10 +1,12 @@
 from typing import Optional
 from app.db.mongodb.client import get_mongo_db
+from app.core.metrics import track_db
 from app.auth.models.auth_models import UserInDB
 from app.auth.core.utils import hash_password
 
 USER_COLLECTION_NAME = "users"
 
+@track_db("mongodb", "get_user_by_email")
 async def get_user_by_email(email: str) -> Optional[UserInDB]:
     """Retrieves a user document from MongoDB by email."""
     mongo_db = get_mongo_db()
@@ -22,6 +24,7 @@ async def get_user_by_email(email: str) -> Optional[UserInDB]:
         )
     return None
 
+@track_db("mongodb", "create_user")
 async def create_user(email: str, password: str) -> Optional[UserInDB]:
     """
     Creates a new user document in MongoDB.
@@ -1,7 +1,13 @@
 import datetime
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict, List, Tuple
 from app.db.postgres.client import get_postgres_pool
+from app.core.metrics import track_db
 
+def _utc(value: datetime.datetime) -> datetime.datetime:
+    # MongoDB hands back naive UTC datetimes; asyncpg would read those as local time
+    return value.replace(tzinfo=datetime.timezone.utc) if value.tzinfo is None else value
+
+@track_db("postgres", "insert_brand_performance")
 async def insert_brand_performance(
     response_id: str, 
     brand_name: str, 
@@ -40,6 +46,37 @@ async def insert_brand_performance(
     
     print(f"PostgreSQL: Inserted performance record for {brand_name} (Score: {visibility_score}).")
 
+@track_db("postgres", "upsert_brand_performance_batch")
+async def upsert_brand_performance_batch(rows: List[Tuple[str, str, float, datetime.datetime]]) -> None:
+    """
+    Inserts or refreshes many brand_performance rows in one executemany round trip.
+    Existing rows (matched on the unique response_id) get the new visibility score.
+
+    Args:
+        rows: (response_id, brand_name, visibility_score, query_timestamp) tuples, where
+            query_timestamp is when the source query ran (naive values are UTC, as stored by MongoDB).
+    """
+    postgres_pool = get_postgres_pool()
+    if postgres_pool is None:
+        raise ConnectionError("PostgreSQL connection pool is not initialized.")
+
+    UPSERT_QUERY = """
+    INSERT INTO brand_performance
+    (brand_name, visibility_score, query_timestamp, response_id)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (response_id) DO UPDATE SET visibility_score = EXCLUDED.visibility_score;
+    """
+
+    async with postgres_pool.acquire() as connection:
+        await connection.executemany(
+            UPSERT_QUERY,
+            [
+                (brand_name, visibility_score, _utc(query_timestamp), response_id)
+                for response_id, brand_name, visibility_score, query_timestamp in rows
+            ]
+        )
+
+@track_db("postgres", "get_brand_metrics")
 async def get_brand_metrics(brand_name: str) -> Dict[str, Any]:
     """
     Feature 5: Retrieves the average visibility score and count of queries for a brand.
@@ -80,3 +117,54 @@ async def get_brand_metrics(brand_name: str) -> Dict[str, Any]:
             "total_queries": 0,
             "average_visibility_score": 0.0
         }
+
+async def iter_brand_performance(
+    batch_size: int,
+    brand_name: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Streams brand_performance rows in insertion order with keyset pagination: each batch is
+    one query on the primary key, so no connection or transaction is held between batches
+    and the result set is never held in memory.
+    """
+    postgres_pool = get_postgres_pool()
+    if postgres_pool is None:
+        raise ConnectionError("PostgreSQL connection pool is not initialized.")
+
+    args: List[Any] = [0]
+    conditions: List[str] = ["id > $1"]
+    if brand_name:
+        args.append(brand_name)
+        # Exact, case-insensitive: '%' and '_' in a brand name are not wildcards here
+        conditions.append(f"LOWER(brand_name) = LOWER(${len(args)})")
+    if start:
+        args.append(start)
+        conditions.append(f"query_timestamp >= ${len(args)}")
+    if end:
+        args.append(end)
+        conditions.append(f"query_timestamp <= ${len(args)}")
+    args.append(batch_size)
+    EXPORT_QUERY = f"""
+    SELECT id, response_id, brand_name, visibility_score, query_timestamp
+    FROM brand_performance WHERE {' AND '.join(conditions)}
+    ORDER BY id LIMIT ${len(args)};
+    """
+
+    while True:
+        async with postgres_pool.acquire() as connection:
+            rows = await connection.fetch(EXPORT_QUERY, *args)
+        if not rows:
+            return
+        args[0] = rows[-1]["id"]
+        yield [
+            {
+                "response_id": row["response_id"],
+                "brand_name": row["brand_name"],
+                "visibility_score": row["visibility_score"],
+                "sentiment_score": None,
+                "query_timestamp": row["query_timestamp"],
+            }
+            for row in rows
+        ]
@@ -0,0 +1,360 @@
+import datetime
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.auth.models.auth_models import UserInDB
+from app.core.config import settings
+from app.core.models import BigQueryHistoryRecord
+from app.db.mongodb import client as mongo_client, storage as mongo_storage, user_storage, tracking_storage, idempotency_storage
+from app.db.elasticsearch import client as es_client, indexing as es_indexing
+from app.db.postgres import client as pg_client, storage as pg_storage
+from app.db.big_query import service as bq_service
+
+# --- Abstract Base Class (StorageBackend) ---
+
+class StorageBackend(ABC):
+    """
+    Abstract Base Class for everything the API, the analysis pipeline and the CLIs persist:
+    query records and users (MongoDB), analysis documents with embeddings (Elasticsearch)
+    and brand performance rows (PostgreSQL/BigQuery).
+    """
+
+    @abstractmethod
+    async def connect(self) -> None:
+        """Opens connections and creates the schema / indices if needed."""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Releases every connection opened by connect()."""
+
+    # --- Query records ---
+    @abstractmethod
+    async def insert_query_record(self, document: Dict[str, Any]) -> str:
+        """Stores a QueryRecord and returns its response_id."""
+
+    @abstractmethod
+    async def get_query_details_by_id(self, response_id: str) -> Dict[str, Any] | None:
+        """Returns the record's response_data (with response_id), or None."""
+
+    @abstractmethod
+    async def get_query_details_by_comparison(self, comparison_id: str) -> List[Dict[str, Any]]:
+        """response_data (with response_id) of every record of a multi-model comparison, oldest first."""
+
+    @abstractmethod
+    async def update_query_status_and_score(self, response_id: str, visibility_score: float) -> None:
+        """Marks the record Complete with its visibility score."""
+
+    @abstractmethod
+    async def bulk_update_query_scores(self, scores: Dict[str, float]) -> int:
+        """Marks many records Complete; returns the number of matched records."""
+
+    @abstractmethod
+    def iter_query_records(self, batch_size: int, after_id: str | None = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Streams records (with '_id', 'timestamp' and 'response_data') oldest first, in batches."""
+
+    @abstractmethod
+    async def get_query_records_before(self, brand_name: str, before_id: str, limit: int) -> List[Dict[str, Any]]:
+        """The brand's last `limit` records (shaped like iter_query_records) stored before `before_id`, oldest first."""
+
+    # --- Analysis queue (ANALYSIS_MODE=WORKER) ---
+    @abstractmethod
+    async def claim_queued_records(self, worker_id: str, limit: int, lease_seconds: float, max_attempts: int) -> List[Dict[str, Any]]:
+        """
+        Atomically leases up to `limit` records that are Queued, or Processing with an expired
+        lease, oldest first; sets them Processing. Records already claimed `max_attempts`
+        times are marked Failed instead. Returns them with '_id', 'timestamp' and 'response_data'.
+        """
+
+    @abstractmethod
+    async def renew_leases(self, worker_id: str, response_ids: List[str], lease_seconds: float) -> int:
+        """Extends the leases still held by worker_id; returns how many were renewed."""
+
+    @abstractmethod
+    async def release_leases(self, worker_id: str, response_ids: List[str]) -> None:
+        """Drops worker_id's leases; records not Complete go back to Queued."""
+
+    # --- Tracked brands (scheduled queries) ---
+    @abstractmethod
+    async def insert_tracked_brand(self, document: Dict[str, Any]) -> str:
+        """Stores a tracked brand (user_id, brand_name, cadence, offset_seconds, created_at, next_run_at); returns its tracking_id."""
+
+    @abstractmethod
+    async def list_tracked_brands(self, user_id: str) -> List[Dict[str, Any]]:
+        """The user's tracked brands (with tracking_id), oldest first."""
+
+    @abstractmethod
+    async def count_tracked_brands(self, user_id: str) -> int:
+        """Number of brands the user tracks (checked against TRACKING_MAX_PER_USER)."""
+
+    @abstractmethod
+    async def delete_tracked_brand(self, tracking_id: str, user_id: str) -> bool:
+        """Deletes one of the user's tracked brands; False if there is no such tracked brand."""
+
+    @abstractmethod
+    async def claim_due_tracked_brands(self, owner: str, now: datetime.datetime, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """
+        Atomically leases up to `limit` tracked brands whose next_run_at has passed and that no
+        live lease holds, most overdue first. A run whose scheduler died is claimed again when
+        its lease expires.
+        """
+
+    @abstractmethod
+    async def finish_tracked_run(self, tracking_id: str, owner: str, next_run_at: datetime.datetime, response_id: str | None) -> None:
+        """Drops owner's lease and sets the next run; a response_id also records a successful run now."""
+
+    # --- Idempotency keys (POST /query-brand retries) ---
+    @abstractmethod
+    async def claim_idempotency_key(
+        self, key_id: str, owner: str, request_hash: str, now: datetime.datetime, lock_seconds: float, ttl_seconds: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically reserves key_id for owner's request and returns None: a new key, an expired one,
+        or one whose request died (lock_seconds passed without a response). Otherwise returns the
+        stored entry with 'request_hash' and 'response' (None while the first request is running).
+        """
+
+    @abstractmethod
+    async def renew_idempotency_key(self, key_id: str, owner: str, now: datetime.datetime, lock_seconds: float) -> bool:
+        """Extends owner's lock on a running request to now + lock_seconds; False if owner lost the key."""
+
+    @abstractmethod
+    async def complete_idempotency_key(self, key_id: str, owner: str, response: Dict[str, Any]) -> None:
+        """Stores the response of owner's request; it is returned to retries until the key expires."""
+
+    @abstractmethod
+    async def release_idempotency_key(self, key_id: str, owner: str) -> None:
+        """Forgets owner's key after its request failed, so a retry runs again."""
+
+    # --- Export ---
+    @abstractmethod
+    def iter_export_records(
+        self,
+        batch_size: int,
+        brand_name: Optional[str] = None,
+        user_id: Optional[str] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Flat query record rows (export_rows.RECORD_COLUMNS) matching the filters, in batches read from a cursor."""
+
+    @abstractmethod
+    def iter_performance_rows(
+        self,
+        batch_size: int,
+        brand_name: Optional[str] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Brand performance rows (export_rows.PERFORMANCE_COLUMNS) matching the filters, in batches read from a cursor."""
+
+    # --- Users ---
+    @abstractmethod
+    async def get_user_by_email(self, email: str) -> Optional[UserInDB]:
+        pass
+
+    @abstractmethod
+    async def create_user(self, email: str, password: str) -> Optional[UserInDB]:
+        """Returns the new user, or None if the email is already registered."""
+
+    # --- Analysis documents ---
+    @abstractmethod
+    async def index_analysis_document(self, document: Dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    async def bulk_index_analysis_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """Indexes many documents; returns the number written."""
+
+    @abstractmethod
+    async def get_visibility_scores(self, brand_name: str) -> List[float]:
+        """Previous visibility scores of a brand, used by the score-based consistency."""
+
+    @abstractmethod
+    async def get_analysis_embedding(self, response_id: str) -> Optional[List[float]]:
+        """The stored embedding, or None when it is missing or not retrievable (callers re-embed the response)."""
+
+    @abstractmethod
+    async def search_similar_responses(
+        self,
+        query_vector: List[float],
+        k: int,
+        num_candidates: int,
+        brand_name: Optional[str] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        exclude_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Approximate top-k by cosine similarity: {'took_ms': int, 'hits': [...]}, scores in [0, 1]."""
+
+    @abstractmethod
+    async def search_similar_responses_exact(
+        self,
+        query_vector: List[float],
+        k: int,
+        brand_name: Optional[str] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        exclude_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Exact top-k with the same filters and result shape, used to measure recall."""
+
+    # --- Brand performance ---
+    @abstractmethod
+    async def record_performance(self, analysis_document: Dict[str, Any], raw_llm_response: str) -> None:
+        """Appends the historical performance row of one analysed response."""
+
+    @abstractmethod
+    async def update_performance_scores(self, documents: List[Dict[str, Any]]) -> None:
+        """Refreshes the scores of existing performance rows from re-scored analysis documents."""
+
+    @abstractmethod
+    async def get_brand_metrics(self, brand_name: str) -> Dict[str, Any]:
+        """{'brand_name', 'total_queries', 'average_visibility_score'} for the brand."""
+
+
+class ExternalStorageBackend(StorageBackend):
+    """
+    The networked deployment: MongoDB, Elasticsearch, and PostgreSQL (LOCAL) or BigQuery (CLOUD).
+    Delegates to the store modules under app/db/.
+    """
+
+    async def connect(self) -> None:
+        await es_client.connect_to_elasticsearch()
+        await mongo_client.connect_to_mongodb()
+        await pg_client.connect_to_postgres()
+        await bq_service.connect_to_big_query()
+        await es_indexing.initialize_es_index()
+
+    async def close(self) -> None:
+        await mongo_client.close_mongodb()
+        await pg_client.close_postgres()
+        await es_client.close_elasticsearch()
+        await bq_service.close_big_query()
+
+    async def insert_query_record(self, document: Dict[str, Any]) -> str:
+        return await mongo_storage.insert_query_record(document)
+
+    async def get_query_details_by_id(self, response_id: str) -> Dict[str, Any] | None:
+        return await mongo_storage.get_query_details_by_id(response_id)
+
+    async def get_query_details_by_comparison(self, comparison_id: str) -> List[Dict[str, Any]]:
+        return await mongo_storage.get_query_details_by_comparison(comparison_id)
+
+    async def update_query_status_and_score(self, response_id: str, visibility_score: float) -> None:
+        await mongo_storage.update_query_status_and_score(response_id, visibility_score)
+
+    async def bulk_update_query_scores(self, scores: Dict[str, float]) -> int:
+        return await mongo_storage.bulk_update_query_scores(scores)
+
+    def iter_query_records(self, batch_size: int, after_id: str | None = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        return mongo_storage.iter_query_records(batch_size=batch_size, after_id=after_id)
+
+    async def get_query_records_before(self, brand_name: str, before_id: str, limit: int) -> List[Dict[str, Any]]:
+        return await mongo_storage.get_query_records_before(brand_name, before_id, limit)
+
+    async def claim_queued_records(self, worker_id: str, limit: int, lease_seconds: float, max_attempts: int) -> List[Dict[str, Any]]:
+        return await mongo_storage.claim_queued_records(worker_id, limit, lease_seconds, max_attempts)
+
+    async def renew_leases(self, worker_id: str, response_ids: List[str], lease_seconds: float) -> int:
+        return await mongo_storage.renew_leases(worker_id, response_ids, lease_seconds)
+
+    async def release_leases(self, worker_id: str, response_ids: List[str]) -> None:
+        await mongo_storage.release_leases(worker_id, response_ids)
+
+    async def insert_tracked_brand(self, document: Dict[str, Any]) -> str:
+        return await tracking_storage.insert_tracked_brand(document)
+
+    async def list_tracked_brands(self, user_id: str) -> List[Dict[str, Any]]:
+        return await tracking_storage.list_tracked_brands(user_id)
+
+    async def count_tracked_brands(self, user_id: str) -> int:
+        return await tracking_storage.count_tracked_brands(user_id)
+
+    async def delete_tracked_brand(self, tracking_id: str, user_id: str) -> bool:
+        return await tracking_storage.delete_tracked_brand(tracking_id, user_id)
+
+    async def claim_due_tracked_brands(self, owner: str, now: datetime.datetime, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        return await tracking_storage.claim_due_tracked_brands(owner, now, limit, lease_seconds)
+
+    async def finish_tracked_run(self, tracking_id: str, owner: str, next_run_at: datetime.datetime, response_id: str | None) -> None:
+        await tracking_storage.finish_tracked_run(tracking_id, owner, next_run_at, response_id)
+
+    async def claim_idempotency_key(self, key_id, owner, request_hash, now, lock_seconds, ttl_seconds) -> Optional[Dict[str, Any]]:
+        return await idempotency_storage.claim_idempotency_key(key_id, owner, request_hash, now, lock_seconds, ttl_seconds)
+
+    async def renew_idempotency_key(self, key_id: str, owner: str, now: datetime.datetime, lock_seconds: float) -> bool:
+        return await idempotency_storage.renew_idempotency_key(key_id, owner, now, lock_seconds)
+
+    async def complete_idempotency_key(self, key_id: str, owner: str, response: Dict[str, Any]) -> None:
+        await idempotency_storage.complete_idempotency_key(key_id, owner, response)
+
+    async def release_idempotency_key(self, key_id: str, owner: str) -> None:
+        await idempotency_storage.release_idempotency_key(key_id, owner)
+
+    def iter_export_records(self, batch_size, brand_name=None, user_id=None, start=None, end=None):
+        return mongo_storage.iter_export_records(batch_size, brand_name=brand_name, user_id=user_id, start=start, end=end)
+
+    def iter_performance_rows(self, batch_size, brand_name=None, start=None, end=None):
+        if settings.ENVIRONMENT == "CLOUD":
+            return bq_service.get_big_query().iter_history(batch_size, brand_name=brand_name, start=start, end=end)
+        return pg_storage.iter_brand_performance(batch_size, brand_name=brand_name, start=start, end=end)
+
+    async def get_user_by_email(self, email: str) -> Optional[UserInDB]:
+        return await user_storage.get_user_by_email(email)
+
+    async def create_user(self, email: str, password: str) -> Optional[UserInDB]:
+        return await user_storage.create_user(email, password)
+
+    async def index_analysis_document(self, document: Dict[str, Any]) -> None:
+        await es_indexing.index_analysis_document(document)
+
+    async def bulk_index_analysis_documents(self, documents: List[Dict[str, Any]]) -> int:
+        return await es_indexing.bulk_index_analysis_documents(documents)
+
+    async def get_visibility_scores(self, brand_name: str) -> List[float]:
+        return await es_indexing.get_visibility_scores(brand_name=brand_name)
+
+    async def get_analysis_embedding(self, response_id: str) -> Optional[List[float]]:
+        return await es_indexing.get_analysis_embedding(response_id)
+
+    async def search_similar_responses(self, query_vector, k, num_candidates, brand_name=None, start=None, end=None, exclude_id=None):
+        return await es_indexing.search_similar_responses(
+            query_vector, k, num_candidates, brand_name=brand_name, start=start, end=end, exclude_id=exclude_id
+        )
+
+    async def search_similar_responses_exact(self, query_vector, k, brand_name=None, start=None, end=None, exclude_id=None):
+        return await es_indexing.search_similar_responses_exact(
+            query_vector, k, brand_name=brand_name, start=start, end=end, exclude_id=exclude_id
+        )
+
+    async def record_performance(self, analysis_document: Dict[str, Any], raw_llm_response: str) -> None:
+        if settings.ENVIRONMENT == "CLOUD":
+            # Historical record in BigQuery (embedding removed)
+            historical_doc = analysis_document.copy()
+            historical_doc.pop("embedding_vector", None)
+            historical_doc["llm_response"] = raw_llm_response
+            await bq_service.get_big_query().insert_record(record=BigQueryHistoryRecord(**historical_doc))
+        else:
+            await pg_storage.insert_brand_performance(
+                analysis_document["response_id"], analysis_document["brand_keyword"], analysis_document["visibility_score"]
+            )
+
+    async def update_performance_scores(self, documents: List[Dict[str, Any]]) -> None:
+        if settings.ENVIRONMENT == "CLOUD":
+            await bq_service.get_big_query().update_scores([
+                {
+                    "response_id": doc["response_id"],
+                    "sentiment_score": doc["sentiment_score"],
+                    "visibility_score": doc["visibility_score"],
+                }
+                for doc in documents
+            ])
+        else:
+            await pg_storage.upsert_brand_performance_batch([
+                (doc["response_id"], doc["brand_keyword"], doc["visibility_score"], doc["timestamp"]) for doc in documents
+            ])
+
+    async def get_brand_metrics(self, brand_name: str) -> Dict[str, Any]:
+        if settings.ENVIRONMENT == "CLOUD":
+            return await bq_service.get_big_query().get_brand_metrics(brand_name=brand_name)
+        return await pg_storage.get_brand_metrics(brand_name=brand_name)
@@ -0,0 +1,23 @@
+from app.db.storage_base import StorageBackend, ExternalStorageBackend
+from app.db.embedded.storage import EmbeddedStorageBackend
+from app.core.config import settings, StorageBackendType
+
+# Process-wide backend: it owns the connections opened at startup
+storage_backend: StorageBackend | None = None
+
+
+def get_storage() -> StorageBackend:
+    """Returns the storage implementation selected by STORAGE_BACKEND (created on first use)."""
+    global storage_backend
+    if storage_backend is None:
+        if settings.STORAGE_BACKEND == StorageBackendType.EMBEDDED:
+            storage_backend = EmbeddedStorageBackend(settings.EMBEDDED_DATA_DIR)
+        else:
+            storage_backend = ExternalStorageBackend()
+    return storage_backend
+
+
+def set_storage(backend: StorageBackend | None) -> None:
+    """Replaces the process-wide backend (e.g. with an in-memory one for load tests); None resets it."""
+    global storage_backend
+    storage_backend = backend
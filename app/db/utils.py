@@ -1,33 +1,24 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-from app.core.config import settings
-from app.db.mongodb.client import connect_to_mongodb, close_mongodb
-from app.db.elasticsearch.client import connect_to_elasticsearch, close_elasticsearch
-from app.db.elasticsearch.indexing import initialize_es_index
-from app.db.postgres.client import connect_to_postgres, close_postgres, _create_brand_performance_table
+from app.core.config import settings, LLMProvider
+from app.db.storage_selector import get_storage
 from app.analysis.nlp_pipeline import initialize_nlp_models
-from app.db.big_query.service import connect_to_big_query, close_big_query
 from app.services.llm_base import OllamaLLM
 
 async def connect_to_dbs():
-    """Initializes and connects to all database clients."""
+    """Initializes and connects the configured storage backend."""
     # This is the central control point for connecting all databases.
-    await connect_to_elasticsearch()
-    await connect_to_mongodb()
-    await connect_to_postgres()
-    await connect_to_big_query()
+    # EXTERNAL: MongoDB, Elasticsearch, PostgreSQL and BigQuery; EMBEDDED: SQLite + local vector file.
+    await get_storage().connect()
 
     await initialize_nlp_models()
-    await _create_brand_performance_table()
-    await initialize_es_index()
 
-    # initialize Ollama models gemma:2B
-    ollama_client = OllamaLLM()
-    await ollama_client.ensure_model_downloaded()
+    # initialize Ollama models gemma:2B (only needed when Ollama serves the queries)
+    if settings.LLM_PROVIDER == LLMProvider.OLLAMA:
+        ollama_client = OllamaLLM(settings.OLLAMA_MODEL)
+        await ollama_client.ensure_model_downloaded()
+        # Load it now, so the first user request does not pay for it
+        await ollama_client.warm_up()
 
 async def close_dbs():
     """Closes all database connections."""
     # This is the central control point for closing all databases.
-    await close_mongodb()
-    await close_postgres()
-    await close_elasticsearch()
-    await close_big_query()
\ No newline at end of file
+    await get_storage().close()
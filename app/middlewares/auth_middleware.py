@@ -3,6 +3,7 @@ from fastapi.security import OAuth2
 from jose import JWTError
 from typing import Optional
 from app.auth.core.utils import decode_access_token
+from app.core.config import settings
 
 
 # We extend OAuth2 to handle token extraction from a cookie instead of headers
@@ -68,4 +69,19 @@ async def get_current_user(token: Optional[str] = Depends(get_token_from_cookie)
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials or token expired.",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+
+async def get_admin_user(current_user_email: str = Depends(get_current_user)):
+    """
+    A FastAPI dependency restricting an endpoint to the users listed in ADMIN_EMAILS.
+
+    Raises:
+        HTTPException 403: If the authenticated user is not an administrator.
+    """
+    if current_user_email not in settings.ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator privileges required.",
+        )
+    return current_user_email
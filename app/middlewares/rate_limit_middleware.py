@@ -0,0 +1,45 @@
+import math
+from typing import Awaitable, Callable
+from fastapi import Depends, HTTPException, Response, status
+from app.core.config import settings
+from app.core.metrics import RATE_LIMITED_REQUESTS
+from app.core.rate_limit import get_rate_limit_store
+from app.middlewares.auth_middleware import get_current_user
+
+
+def rate_limit(endpoint_class: str) -> Callable[..., Awaitable[str]]:
+    """
+    Builds a FastAPI dependency that charges one token from the authenticated user's bucket
+    for `endpoint_class` (llm, compare, read), sized by the user's plan in RATE_LIMIT_PLANS.
+
+    Use it in place of get_current_user; it returns the user's email.
+
+    Raises:
+        HTTPException 429: With Retry-After, when the bucket is empty.
+    """
+    async def dependency(response: Response, current_user_email: str = Depends(get_current_user)) -> str:
+        if not settings.RATE_LIMIT_ENABLED:
+            return current_user_email
+
+        plan = settings.RATE_LIMIT_USER_PLANS.get(current_user_email, settings.RATE_LIMIT_DEFAULT_PLAN)
+        rule = settings.RATE_LIMIT_PLANS.get(plan, {}).get(endpoint_class)
+        if rule is None:
+            # No limit configured for this plan and endpoint class
+            return current_user_email
+
+        result = await get_rate_limit_store().consume(
+            f"{current_user_email}:{endpoint_class}", rule.capacity, rule.refill_per_minute / 60.0
+        )
+        headers = {"X-RateLimit-Limit": str(rule.capacity), "X-RateLimit-Remaining": str(math.floor(result.remaining))}
+        if not result.allowed:
+            RATE_LIMITED_REQUESTS.labels(endpoint_class, plan).inc()
+            retry_after = result.retry_after if math.isfinite(result.retry_after) else 3600
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded for '{endpoint_class}' requests on the '{plan}' plan.",
+                headers={**headers, "Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+        response.headers.update(headers)
+        return current_user_email
+
+    return dependency
@@ -0,0 +1,59 @@
+import asyncio
+import datetime
+
+from app.analysis.nlp_pipeline import start_analysis_pipeline
+from app.core.config import settings, AnalysisMode
+from app.core.models import QueryResponse, QueryRecord
+from app.db.storage_selector import get_storage
+from app.services.llm_base import LLMBase
+
+
+def brand_prompt(brand_name: str) -> str:
+    return f"Provide a brief, general overview of the brand: {brand_name}."
+
+
+def initial_status() -> str:
+    """Status of a newly stored record: analysed in this process, or waiting for an analysis worker."""
+    return "Processing" if settings.ANALYSIS_MODE == AnalysisMode.INLINE else "Queued"
+
+
+async def submit_brand_query(
+    brand_name: str,
+    user_id: str | None,
+    llm_service: LLMBase,
+    tracking_id: str | None = None,
+) -> QueryResponse:
+    """
+    Asks the LLM about the brand, stores the answer as a QueryRecord and starts its analysis
+    (in this process, or by the analysis workers in WORKER mode).
+    Raises ConnectionError when no LLM provider or the record store is available.
+    """
+    query_prompt = brand_prompt(brand_name)
+
+    # 1. Hit GenAI (LLM) API (Feature 1)
+    raw_llm_response = await llm_service.generate_response(query_prompt)
+
+    response = QueryResponse(
+        brand_name=brand_name,
+        raw_llm_response=raw_llm_response,
+        status=initial_status(), # Processing here, or Queued for the analysis workers
+        response_id=None # Will be set after the insert
+    )
+
+    # 2. Store the query details together with the LLM response
+    record = QueryRecord(
+        user_query=query_prompt, # Store the full prompt used
+        response_data=response,
+        timestamp=datetime.datetime.now(datetime.timezone.utc),
+        user_id=user_id,
+        tracking_id=tracking_id,
+    )
+    response.response_id = await get_storage().insert_query_record(record.model_dump(by_alias=True))
+
+    # 3. Trigger ES Indexing/Analysis (Feature 2 & 3 pipeline starts) without blocking the caller.
+    # In WORKER mode the queued record is picked up by `python -m app.worker` instead.
+    if settings.ANALYSIS_MODE == AnalysisMode.INLINE:
+        asyncio.create_task(
+            start_analysis_pipeline(response.response_id, brand_name, raw_llm_response, record.timestamp)
+        )
+    return response
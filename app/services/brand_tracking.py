@@ -0,0 +1,149 @@
+"""
+Scheduled brand tracking: runs the registered brands' queries on their cadence.
+
+Every tracked brand gets a random but fixed offset within its interval when it is
+registered, so a thousand daily brands are spread over the whole day instead of firing
+at midnight; a little extra jitter per run keeps runs from re-aligning. Due brands are
+leased atomically through the storage backend, so any number of API processes can run
+a scheduler without running a brand twice; a lease left by a crashed process expires
+and the run is carried over. Runs missed while no scheduler was up are made once
+(not once per missed slot), then the brand returns to its regular slot.
+"""
+import asyncio
+import datetime
+import math
+import os
+import random
+import socket
+import uuid
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.models import TrackingCadence
+from app.db.storage_selector import get_storage
+from app.services.brand_query import submit_brand_query
+from app.services.llm_selector import get_llm_service
+
+CADENCE_SECONDS = {
+    TrackingCadence.HOURLY: 3600,
+    TrackingCadence.DAILY: 86400,
+}
+
+
+def random_offset(cadence: TrackingCadence) -> float:
+    """Position of a new tracked brand's runs within its interval (uniform, so the load is flat)."""
+    return random.uniform(0, CADENCE_SECONDS[cadence])
+
+
+def next_run_after(moment: datetime.datetime, cadence: TrackingCadence, offset_seconds: float, jitter_seconds: float = 0.0) -> datetime.datetime:
+    """
+    First slot strictly after `moment`: slots are `offset_seconds` into each UTC-aligned
+    interval (past the hour, or past midnight), plus up to `jitter_seconds` of random delay.
+    """
+    period = CADENCE_SECONDS[cadence]
+    epoch = moment.timestamp()
+    slot = (math.floor((epoch - offset_seconds) / period) + 1) * period + offset_seconds
+    jitter = random.uniform(0, min(jitter_seconds, period / 10)) if jitter_seconds > 0 else 0.0
+    return datetime.datetime.fromtimestamp(slot + jitter, tz=datetime.timezone.utc)
+
+
+def new_tracked_brand(user_id: str, brand_name: str, cadence: TrackingCadence) -> Dict[str, Any]:
+    """Document of a newly registered tracked brand; its first run is its first slot."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    offset_seconds = random_offset(cadence)
+    return {
+        "user_id": user_id,
+        "brand_name": brand_name,
+        "cadence": cadence.value,
+        "offset_seconds": offset_seconds,
+        "created_at": now,
+        "next_run_at": next_run_after(now, cadence, offset_seconds),
+    }
+
+
+class TrackingScheduler:
+    """Claim due tracked brands → query them (bounded concurrency) → schedule the next run."""
+
+    def __init__(self, owner: str, poll_seconds: float, max_concurrency: int, lease_seconds: float, jitter_seconds: float, retry_seconds: float):
+        self.owner = owner
+        self.poll_seconds = poll_seconds
+        self.max_concurrency = max_concurrency
+        self.lease_seconds = lease_seconds
+        self.jitter_seconds = jitter_seconds
+        self.retry_seconds = retry_seconds
+        self.runs = 0
+        self.failures = 0
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_one(self, tracked: Dict[str, Any]) -> None:
+        cadence = TrackingCadence(tracked["cadence"])
+        try:
+            # Goes through the same LLM front as the API, so its per-provider limits
+            # (breakers, Ollama slots) apply to scheduled queries too
+            response = await submit_brand_query(tracked["brand_name"], tracked["user_id"], get_llm_service(), tracking_id=tracked["tracking_id"])
+        except Exception as e:
+            self.failures += 1
+            # Try again soon rather than skipping a whole interval, but don't hammer a failing LLM
+            retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.retry_seconds)
+            print(f"Tracked brand '{tracked['brand_name']}' ({tracked['tracking_id']}) failed, retrying at {retry_at:%H:%M:%S}: {e}")
+            await get_storage().finish_tracked_run(tracked["tracking_id"], self.owner, retry_at, None)
+            return
+
+        self.runs += 1
+        next_run_at = next_run_after(datetime.datetime.now(datetime.timezone.utc), cadence, tracked["offset_seconds"], self.jitter_seconds)
+        await get_storage().finish_tracked_run(tracked["tracking_id"], self.owner, next_run_at, response.response_id)
+
+    async def run_due(self) -> int:
+        """Claims at most max_concurrency due brands and runs them; returns how many were claimed."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        claimed = await get_storage().claim_due_tracked_brands(self.owner, now, self.max_concurrency, self.lease_seconds)
+        if claimed:
+            await asyncio.gather(*(self._run_one(tracked) for tracked in claimed))
+        return len(claimed)
+
+    async def run(self) -> None:
+        print(f"Brand tracking scheduler {self.owner} started (concurrency {self.max_concurrency}).")
+        while not self._stopping.is_set():
+            try:
+                # Keep going while brands are due (catch-up after downtime), at max_concurrency at a time
+                if await self.run_due():
+                    continue
+            except Exception as e:
+                print(f"Brand tracking scheduler {self.owner}: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+        print(f"Brand tracking scheduler {self.owner} stopped after {self.runs} runs.")
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "running": self._task is not None, "runs": self.runs, "failures": self.failures}
+
+
+# One scheduler per API process, started by the FastAPI lifespan when TRACKING_SCHEDULER_ENABLED
+tracking_scheduler: Optional[TrackingScheduler] = None
+
+
+def get_tracking_scheduler() -> TrackingScheduler:
+    global tracking_scheduler
+    if tracking_scheduler is None:
+        tracking_scheduler = TrackingScheduler(
+            owner=f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}",
+            poll_seconds=settings.TRACKING_POLL_SECONDS,
+            max_concurrency=settings.TRACKING_MAX_CONCURRENCY,
+            lease_seconds=settings.TRACKING_LEASE_SECONDS,
+            jitter_seconds=settings.TRACKING_JITTER_SECONDS,
+            retry_seconds=settings.TRACKING_RETRY_SECONDS,
+        )
+    return tracking_scheduler
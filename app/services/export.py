@@ -0,0 +1,128 @@
+"""
+Streaming encoders for history exports (GET /api/v1/export and python -m app.cli.export).
+
+Rows arrive from the storage backend in cursor batches and leave as encoded chunks, so
+memory depends on the batch size (or the Parquet row group size), never on the export size.
+"""
+import csv
+import datetime
+import io
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import orjson
+
+from app.core.models import ExportDataset, ExportFormat
+from app.db.export_rows import PERFORMANCE_COLUMNS, RECORD_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for Parquet exports
+    pa = None
+    pq = None
+
+COLUMNS = {
+    ExportDataset.RECORDS: RECORD_COLUMNS,
+    ExportDataset.PERFORMANCE: PERFORMANCE_COLUMNS,
+}
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def parquet_supported() -> bool:
+    return pa is not None
+
+
+def export_filename(dataset: ExportDataset, export_format: ExportFormat) -> str:
+    return f"{dataset.value}-{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%SZ}.{export_format.value}"
+
+
+def _iso(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+async def _ndjson(batches: AsyncIterator[List[Dict[str, Any]]], columns: List[Tuple[str, str]]) -> AsyncIterator[bytes]:
+    names = [name for name, _ in columns]
+    async for batch in batches:
+        yield b"".join(orjson.dumps({name: row.get(name) for name in names}, option=orjson.OPT_NAIVE_UTC) + b"\n" for row in batch)
+
+
+async def _csv(batches: AsyncIterator[List[Dict[str, Any]]], columns: List[Tuple[str, str]]) -> AsyncIterator[bytes]:
+    names = [name for name, _ in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    async for batch in batches:
+        writer.writerows([_iso(row.get(name)) for name in names] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object for ParquetWriter that hands the written bytes back in chunks."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema(columns: List[Tuple[str, str]]):
+    types = {"string": pa.string(), "float": pa.float64(), "datetime": pa.timestamp("us", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+async def _parquet(batches: AsyncIterator[List[Dict[str, Any]]], columns: List[Tuple[str, str]], row_group_rows: int) -> AsyncIterator[bytes]:
+    if pa is None:
+        raise RuntimeError("The 'pyarrow' package is required for Parquet exports.")
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    pending: List[Dict[str, Any]] = []
+
+    def flush() -> bytes:
+        # One row group per flush; only `pending` and the encoded group are in memory
+        writer.write_table(pa.Table.from_pylist(pending, schema=schema), row_group_size=len(pending))
+        pending.clear()
+        return sink.drain()
+
+    async for batch in batches:
+        pending.extend(batch)
+        if len(pending) >= row_group_rows:
+            yield flush()
+    if pending:
+        yield flush()
+    writer.close()
+    yield sink.drain()
+
+
+def encode_export(
+    batches: AsyncIterator[List[Dict[str, Any]]],
+    dataset: ExportDataset,
+    export_format: ExportFormat,
+    row_group_rows: int = 10000,
+) -> AsyncIterator[bytes]:
+    """Encodes row batches of `dataset` as a stream of NDJSON, CSV or Parquet chunks."""
+    columns = COLUMNS[dataset]
+    if export_format == ExportFormat.NDJSON:
+        return _ndjson(batches, columns)
+    if export_format == ExportFormat.CSV:
+        return _csv(batches, columns)
+    return _parquet(batches, columns, row_group_rows)
@@ -0,0 +1,138 @@
+"""
+Idempotency keys for POST /query-brand.
+
+A client that times out and retries with the same Idempotency-Key gets the original 202
+response back instead of a second LLM call, record and analysis run. Keys are scoped to
+the user and stored through the storage backend (a TTL collection in MongoDB), so they hold
+across API processes. A duplicate that arrives while the first request is still running
+waits for it: directly when both are in this process, by polling the store otherwise.
+"""
+import asyncio
+import datetime
+import hashlib
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from app.core.config import settings
+from app.db.storage_selector import get_storage
+
+
+class IdempotencyKeyMismatch(Exception):
+    """The key was already used for a different request."""
+
+
+class IdempotencyInProgress(Exception):
+    """The first request with the key is still running after IDEMPOTENCY_WAIT_SECONDS."""
+
+
+# key_id -> result of the request running in this process, for in-process duplicates
+_in_flight: Dict[str, asyncio.Future] = {}
+
+
+def request_hash(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+async def _release(key_id: str, owner: str) -> None:
+    try:
+        await get_storage().release_idempotency_key(key_id, owner)
+    except Exception as e:
+        # The claim expires after IDEMPOTENCY_LOCK_SECONDS; a retry can take it over then
+        print(f"Could not release idempotency key {key_id}: {e}")
+
+
+async def _renew_until_done(key_id: str, owner: str) -> None:
+    """Keeps the claim locked while the request runs, so a retry cannot take it over and run it twice."""
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_LOCK_SECONDS / 3)
+        try:
+            renewed = await get_storage().renew_idempotency_key(
+                key_id, owner, datetime.datetime.now(datetime.timezone.utc), settings.IDEMPOTENCY_LOCK_SECONDS
+            )
+            if not renewed:
+                print(f"Idempotency key {key_id} was lost (expired and taken over).")
+                return
+        except Exception as e:
+            print(f"Could not renew idempotency key {key_id}: {e}")
+
+
+async def _run_as_owner(key_id: str, owner: str, operation: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key_id] = future
+    renewer = asyncio.create_task(_renew_until_done(key_id, owner))
+    try:
+        try:
+            response = await operation()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()  # the client went away: a waiting duplicate runs the request itself
+            else:
+                future.set_exception(e)
+                future.exception()  # waiters re-raise it; don't log it as unretrieved when there are none
+            # Failed requests leave no trace, so the client's next retry runs again
+            await _release(key_id, owner)
+            raise
+
+        # Waiters get the response even if storing it fails
+        future.set_result(response)
+        try:
+            await get_storage().complete_idempotency_key(key_id, owner, response)
+        except Exception as e:
+            # The request did run: answer it, and free the key rather than leave it locked
+            print(f"Could not store the response of idempotency key {key_id}: {e}")
+            await _release(key_id, owner)
+        return response
+    finally:
+        renewer.cancel()
+        if not future.done():
+            future.cancel()
+        _in_flight.pop(key_id, None)
+
+
+async def run_once(
+    user_id: str,
+    key: str,
+    fingerprint: str,
+    operation: Callable[[], Awaitable[Dict[str, Any]]],
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Runs `operation` once per (user, key) and returns (response, replayed). Retries get the
+    stored response; concurrent duplicates wait for the first request's.
+    Raises IdempotencyKeyMismatch when the key was used for a different `fingerprint`, and
+    IdempotencyInProgress when the first request does not finish within IDEMPOTENCY_WAIT_SECONDS.
+    """
+    key_id = f"{user_id}:{key}"
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    owner = uuid.uuid4().hex
+    while True:
+        running_here = _in_flight.get(key_id)
+        if running_here is not None:
+            try:
+                response = await asyncio.wait_for(asyncio.shield(running_here), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise IdempotencyInProgress(key)
+            except asyncio.CancelledError:
+                if not running_here.cancelled():
+                    raise
+                continue
+            return response, True
+
+        existing = await get_storage().claim_idempotency_key(
+            key_id,
+            owner,
+            fingerprint,
+            datetime.datetime.now(datetime.timezone.utc),
+            settings.IDEMPOTENCY_LOCK_SECONDS,
+            settings.IDEMPOTENCY_TTL_SECONDS,
+        )
+        if existing is None:
+            return await _run_as_owner(key_id, owner, operation), False
+        if existing["request_hash"] != fingerprint:
+            raise IdempotencyKeyMismatch(key)
+        if existing["response"] is not None:
+            return existing["response"], True
+        # Running in another process
+        if time.monotonic() >= deadline:
+            raise IdempotencyInProgress(key)
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
@@ -1,9 +1,22 @@
 import os
 import asyncio
+import contextlib
 from abc import ABC, abstractmethod
+from typing import Any, AsyncContextManager
 from google import genai
 from google.genai.errors import APIError
 from ollama import AsyncClient
+from app.core.config import settings
+from app.core.metrics import track_llm, OLLAMA_SERVER_SECONDS
+from .ollama_scheduler import ollama_scheduler
+
+class LLMError(Exception):
+    """A provider failed to produce a response (API error, rate limit, timeout)."""
+
+
+class LLMUnavailableError(LLMError, ConnectionError):
+    """No provider could answer; surfaced by the API as 503."""
+
 
 # --- Abstract Base Class (LLMBase) ---
 
@@ -20,6 +33,14 @@ class LLMBase(ABC):
         """Generates a text response for the given prompt."""
         pass
 
+    def admission(self) -> AsyncContextManager[Any]:
+        """Waits for capacity to send a request (e.g. a free server slot); nothing to wait for by default."""
+        return contextlib.nullcontext()
+
+    async def generate_admitted(self, prompt: str) -> str:
+        """generate_response for a caller already inside admission(), so its queue wait can be kept out of timeouts."""
+        return await self.generate_response(prompt)
+
 
 class OllamaLLM(LLMBase):
     """LLM client for locally running models via Ollama."""
@@ -27,15 +48,45 @@ class OllamaLLM(LLMBase):
     def __init__(self, model_name: str = "gemma:2b"):
         super().__init__(model_name=model_name, api_key=None)
         self.client = AsyncClient()
+        # Same options on every call: a changed num_ctx makes Ollama reload the model
+        self.options = {"num_ctx": settings.OLLAMA_NUM_CTX, "num_predict": settings.OLLAMA_NUM_PREDICT}
 
     async def generate_response(self, prompt: str) -> str:
-        print("OLLAMA gemma:2B generating response...")
+        # Wait for a free server slot here, so queue wait and generation time are measured apart
+        async with self.admission():
+            return await self._chat(prompt)
+
+    def admission(self) -> AsyncContextManager[Any]:
+        return ollama_scheduler.slot()
+
+    async def generate_admitted(self, prompt: str) -> str:
+        return await self._chat(prompt)
+
+    @track_llm
+    async def _chat(self, prompt: str) -> str:
+        print(f"OLLAMA {self.model_name} generating response...")
         response = await self.client.chat(
             model=self.model_name,
-            messages=[{"role": "user", "content": prompt}],
+            # The fixed system message is an identical prefix across requests (prompt cache hit)
+            messages=[
+                {"role": "system", "content": settings.OLLAMA_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            options=self.options,
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
         )
+        for phase in ("load", "prompt_eval", "eval"):
+            # Ollama reports durations in nanoseconds; a non-trivial load means the model was evicted
+            duration = response.get(f"{phase}_duration")
+            if duration:
+                OLLAMA_SERVER_SECONDS.labels(self.model_name, phase).observe(duration / 1e9)
         return response["message"]["content"]
 
+    async def warm_up(self):
+        """Loads the model with the configured options and pins it for OLLAMA_KEEP_ALIVE."""
+        await self.client.generate(model=self.model_name, options=self.options, keep_alive=settings.OLLAMA_KEEP_ALIVE)
+        print(f"[Ollama] Model '{self.model_name}' loaded (keep_alive={settings.OLLAMA_KEEP_ALIVE}).")
+
     async def ensure_model_downloaded(self):
         models = await self.client.list()
 
@@ -54,8 +105,17 @@ class OllamaLLM(LLMBase):
 # For testing purpose locally
 class MockHuggingFaceModel(LLMBase):
     """Mock implementation for local testing (simulates a HuggingFace model)."""
+
+    def __init__(self, model_name: str, latency_seconds: float = 0.0):
+        super().__init__(model_name=model_name, api_key=None)
+        # Simulated generation time, e.g. for load tests
+        self.latency_seconds = latency_seconds
+
+    @track_llm
     async def generate_response(self, prompt: str) -> str:
         print(f"--- MOCK LLM CALL: {self.model_name} ---")
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
         # Simple rule-based mock response
         if "Daraz" in prompt:
             return "Daraz is a leading e-commerce platform in South Asia, popular for its wide range of products and delivery network. It's often mentioned in terms of online shopping deals."
@@ -92,6 +152,7 @@ class GeminiClient(LLMBase):
         print(f"GeminiClient initialized with model: {self.model_name}")
 
 
+    @track_llm
     async def generate_response(self, prompt: str) -> str:
         """
         Generates a text response for the given prompt using the Gemini API.
@@ -111,11 +172,10 @@ class GeminiClient(LLMBase):
             return response.text.strip()
             
         except APIError as e:
+            # Raised rather than returned as text, so the error is not analysed as an answer
+            # and counts against the provider's circuit breaker
             print(f"!!! Gemini API Error: {e} !!!")
-            return f"Error: Could not generate response from Gemini API. Details: {e}"
-        except Exception as e:
-            print(f"!!! Unexpected Error: {e} !!!")
-            return f"Error: An unexpected error occurred. Details: {e}"
+            raise LLMError(f"Could not generate response from Gemini API. Details: {e}") from e
 
 async def main():
     try:
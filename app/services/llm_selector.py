@@ -1,21 +1,93 @@
+from typing import Dict
 from .llm_base import LLMBase, MockHuggingFaceModel, GeminiClient, OllamaLLM
+from .resilient_llm import ResilientLLM
 from app.core.config import settings, LLMProvider
 
+# Shared front (and the clients behind it), so breaker state and latency history outlive a request
+llm_front: ResilientLLM | None = None
+# One guarded client per "PROVIDER:model" entry of COMPARE_MODELS
+comparison_services: Dict[str, LLMBase] | None = None
 
-def get_llm_service() -> LLMBase:
-    """Dynamically selects and returns the correct LLM implementation based on environment settings."""
-    
-    if settings.LLM_PROVIDER == LLMProvider.HUGGINGFACE:
-        return MockHuggingFaceModel(settings.HUGGINGFACE_MODEL)
-    
-    elif settings.LLM_PROVIDER == LLMProvider.OLLAMA:
-        return OllamaLLM(settings.OLLAMA_MODEL)
-    
-    elif settings.LLM_PROVIDER == LLMProvider.GEMINI:
+
+def create_llm_client(provider: LLMProvider, model_name: str | None = None) -> LLMBase:
+    """Builds the plain client for one provider (with its configured model unless model_name is given)."""
+
+    if provider == LLMProvider.HUGGINGFACE:
+        return MockHuggingFaceModel(model_name or settings.HUGGINGFACE_MODEL, latency_seconds=settings.MOCK_LLM_LATENCY_SECONDS)
+
+    elif provider == LLMProvider.OLLAMA:
+        return OllamaLLM(model_name or settings.OLLAMA_MODEL)
+
+    elif provider == LLMProvider.GEMINI:
         if not settings.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY is not set for CLOUD environment.")
+        if model_name:
+            return GeminiClient(model_name=model_name, api_key=settings.GEMINI_API_KEY)
         return GeminiClient(api_key=settings.GEMINI_API_KEY)
     else:
         # Fallback to the mock model for safety in case of misconfiguration
         print("Warning: LLM_PROVIDER not recognized, falling back to MOCK model.")
         return MockHuggingFaceModel(settings.HUGGINGFACE_MODEL)
+
+
+def _provider_timeout(provider: LLMProvider) -> float:
+    return settings.LLM_PROVIDER_TIMEOUTS.get(provider.value, settings.LLM_TIMEOUT_SECONDS)
+
+
+def get_llm_service() -> LLMBase:
+    """
+    Returns the resilient front over LLM_PROVIDER (primary) and LLM_SECONDARY_PROVIDER,
+    built once per process from the environment settings.
+    """
+    global llm_front
+    if llm_front is None:
+        providers = [settings.LLM_PROVIDER]
+        if settings.LLM_SECONDARY_PROVIDER and settings.LLM_SECONDARY_PROVIDER != settings.LLM_PROVIDER:
+            providers.append(settings.LLM_SECONDARY_PROVIDER)
+        llm_front = ResilientLLM(
+            [
+                (provider.value, create_llm_client(provider), _provider_timeout(provider))
+                for provider in providers
+            ],
+            failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+            hedging=settings.LLM_HEDGING_ENABLED,
+            hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+            latency_window=settings.LLM_LATENCY_WINDOW,
+            max_queue_seconds=settings.LLM_MAX_QUEUE_SECONDS,
+        )
+    return llm_front
+
+
+def get_comparison_services() -> Dict[str, LLMBase]:
+    """
+    Returns the clients used by multi-model comparisons, keyed by their "PROVIDER:model" entry.
+    Each has its provider's timeout and its own circuit breaker, but no failover: a comparison
+    must not silently answer with a different model.
+    """
+    global comparison_services
+    if comparison_services is None:
+        entries = list(settings.COMPARE_MODELS)
+        if not entries:
+            entries = [settings.LLM_PROVIDER.value]
+            if settings.LLM_SECONDARY_PROVIDER and settings.LLM_SECONDARY_PROVIDER != settings.LLM_PROVIDER:
+                entries.append(settings.LLM_SECONDARY_PROVIDER.value)
+
+        services: Dict[str, LLMBase] = {}
+        for entry in entries:
+            provider_name, _, model_name = entry.partition(":")
+            try:
+                provider = LLMProvider(provider_name.upper())
+            except ValueError:
+                raise ValueError(f"Unknown provider in COMPARE_MODELS entry '{entry}'.")
+            client = create_llm_client(provider, model_name or None)
+            name = f"{provider.value}:{client.model_name}"
+            services[name] = ResilientLLM(
+                [(name, client, _provider_timeout(provider))],
+                failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+                reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+                latency_window=settings.LLM_LATENCY_WINDOW,
+                max_queue_seconds=settings.LLM_MAX_QUEUE_SECONDS,
+            )
+        comparison_services = services
+    return comparison_services
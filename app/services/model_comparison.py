@@ -0,0 +1,29 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from .llm_base import LLMBase
+
+
+async def query_models(prompt: str, services: Dict[str, LLMBase], max_concurrency: int) -> List[Dict[str, Any]]:
+    """
+    Sends the prompt to every model concurrently, at most max_concurrency at a time, so the
+    total latency is that of the slowest model rather than the sum. A failing model does not
+    fail the others.
+
+    Returns one {'model', 'response', 'error', 'latency_ms'} dict per model, in input order.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def ask(name: str, service: LLMBase) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response, error = await service.generate_response(prompt), None
+            except Exception as e:
+                print(f"!!! Comparison model {name} failed: {e} !!!")
+                response, error = None, str(e)
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        return {"model": name, "response": response, "error": error, "latency_ms": latency_ms}
+
+    return await asyncio.gather(*(ask(name, service) for name, service in services.items()))
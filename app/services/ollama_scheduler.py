@@ -0,0 +1,70 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from app.core.config import settings
+from app.core.metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS
+
+
+class OllamaScheduler:
+    """
+    Client-side admission control for the local Ollama server.
+
+    At most `parallel` chat requests are sent at once (matching the server's
+    OLLAMA_NUM_PARALLEL); the rest wait here, where the wait is measured, instead of
+    queueing invisibly inside Ollama or forcing it to reload the model.
+    """
+
+    def __init__(self, parallel: int):
+        self.parallel = max(1, parallel)
+        self._semaphore: asyncio.Semaphore | None = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+
+    def resize(self, parallel: int) -> None:
+        """Sets the number of slots; call before the first request (e.g. right after a worker fork)."""
+        if self._semaphore is not None and self.running:
+            raise RuntimeError("Cannot resize the Ollama scheduler while requests are running.")
+        self.parallel = max(1, parallel)
+        self._semaphore = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """Waits for a free server slot; yields the time spent waiting (seconds)."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.parallel)
+        self.waiting += 1
+        LLM_QUEUE_DEPTH.labels("ollama").inc()
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            LLM_QUEUE_DEPTH.labels("ollama").dec()
+        wait = time.perf_counter() - start
+        LLM_QUEUE_WAIT_SECONDS.labels("ollama").observe(wait)
+        self.total_wait_seconds += wait
+        self.running += 1
+        try:
+            yield wait
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "parallel": self.parallel,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "avg_queue_wait_seconds": round(self.total_wait_seconds / self.completed, 4) if self.completed else None,
+        }
+
+
+# One scheduler per process, shared by every OllamaLLM instance (they all talk to the same server);
+# gunicorn workers each get their share of OLLAMA_NUM_PARALLEL (see app.core.workers)
+ollama_scheduler = OllamaScheduler(settings.OLLAMA_NUM_PARALLEL)
@@ -0,0 +1,223 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.metrics import LLM_CIRCUIT_STATE, LLM_HEDGED_REQUESTS, LLM_TIMEOUTS
+from .llm_base import LLMBase, LLMError, LLMUnavailableError
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker. After `failure_threshold` failures in a row the provider is
+    skipped for `reset_seconds`; then one probe call is let through (half-open) and its
+    outcome closes or re-opens the breaker.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def available(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            return not self._probe_in_flight
+        return self.state == self.CLOSED
+
+    def on_call(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = True
+
+    def on_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def on_failure(self) -> None:
+        self._probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def on_cancel(self) -> None:
+        # A hedged call that lost the race says nothing about the provider's health
+        self._probe_in_flight = False
+
+
+class ProviderHealth:
+    """One provider behind the front: its client, timeout, breaker and recent latencies."""
+
+    STATE_CODES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+    def __init__(self, name: str, client: LLMBase, timeout_seconds: float, breaker: CircuitBreaker, window: int):
+        self.name = name
+        self.client = client
+        self.timeout_seconds = timeout_seconds
+        self.breaker = breaker
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.queue_timeouts = 0
+
+    def percentile(self, q: float) -> float | None:
+        return float(np.percentile(self.latencies, q)) if self.latencies else None
+
+    def publish_state(self) -> None:
+        LLM_CIRCUIT_STATE.labels(self.name).set(self.STATE_CODES[self.breaker.state])
+
+    def stats(self) -> Dict[str, Any]:
+        self.breaker.available()  # let an expired open breaker report half-open
+        return {
+            "provider": self.name,
+            "model": self.client.model_name,
+            "timeout_seconds": self.timeout_seconds,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "queue_timeouts": self.queue_timeouts,
+            "latency_samples": len(self.latencies),
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "p99_seconds": self.percentile(99),
+        }
+
+
+class ResilientLLM(LLMBase):
+    """
+    LLM front over an ordered list of providers (primary first).
+
+    Every call has the provider's timeout and goes through its circuit breaker; a failed or
+    skipped provider falls over to the next one. A call that waits longer than max_queue_seconds
+    for a client-side slot fails the same way. With hedging on, if the primary has not
+    answered by its own p95 latency a backup request goes to the next available provider
+    and the first successful answer wins (the other call is cancelled).
+    """
+
+    def __init__(
+        self,
+        providers: List[Tuple[str, LLMBase, float]],
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        hedging: bool = False,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+        max_queue_seconds: float = 0.0,
+    ):
+        if not providers:
+            raise ValueError("ResilientLLM needs at least one provider.")
+        super().__init__(model_name=providers[0][1].model_name)
+        self.providers = [
+            ProviderHealth(name, client, timeout, CircuitBreaker(failure_threshold, reset_seconds), latency_window)
+            for name, client, timeout in providers
+        ]
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.max_queue_seconds = max_queue_seconds
+        for provider in self.providers:
+            provider.publish_state()
+
+    async def _call(self, provider: ProviderHealth, prompt: str) -> str:
+        # A wait for a client-side slot (Ollama scheduler) is not the provider being slow: it is
+        # outside the timeout and the latencies the hedge delay is computed from, but bounded on its own
+        async with contextlib.AsyncExitStack() as admitted:
+            try:
+                async with asyncio.timeout(self.max_queue_seconds or None):
+                    await admitted.enter_async_context(provider.client.admission())
+            except TimeoutError as e:
+                # A saturated provider counts as failing, so a backlog sheds to the next provider
+                provider.queue_timeouts += 1
+                provider.breaker.on_failure()
+                provider.publish_state()
+                raise LLMError(f"{provider.name} had no free slot after {self.max_queue_seconds}s") from e
+
+            provider.breaker.on_call()
+            provider.calls += 1
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(provider.client.generate_admitted(prompt), timeout=provider.timeout_seconds)
+            except asyncio.CancelledError:
+                provider.breaker.on_cancel()
+                raise
+            except Exception as e:
+                provider.failures += 1
+                provider.breaker.on_failure()
+                provider.publish_state()
+                if isinstance(e, asyncio.TimeoutError):
+                    provider.timeouts += 1
+                    LLM_TIMEOUTS.labels(provider.name).inc()
+                    raise LLMError(f"{provider.name} timed out after {provider.timeout_seconds}s") from e
+                raise LLMError(f"{provider.name} failed: {e}") from e
+
+            provider.latencies.append(time.perf_counter() - start)
+            provider.breaker.on_success()
+            provider.publish_state()
+            return response
+
+    async def _hedged(self, primary: ProviderHealth, backup: ProviderHealth, delay: float, prompt: str) -> str:
+        primary_task = asyncio.create_task(self._call(primary, prompt))
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if primary_task in done:
+            try:
+                return primary_task.result()
+            except LLMError as e:
+                print(f"Primary LLM failed before the hedge delay ({e}); using {backup.name}.")
+                try:
+                    return await self._call(backup, prompt)
+                except LLMError as backup_error:
+                    raise LLMUnavailableError(f"All LLM providers failed: {e}; {backup_error}") from backup_error
+
+        # The primary is slower than its usual p95: race a backup request against it
+        backup_task = asyncio.create_task(self._call(backup, prompt))
+        tasks = {primary_task: primary.name, backup_task: backup.name}
+        pending = set(tasks)
+        errors: List[str] = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGED_REQUESTS.labels(primary.name, tasks[task]).inc()
+                        return task.result()
+                    errors.append(str(task.exception()))
+        finally:
+            for task in pending:
+                task.cancel()
+        LLM_HEDGED_REQUESTS.labels(primary.name, "none").inc()
+        raise LLMUnavailableError(f"All hedged LLM requests failed: {'; '.join(errors)}")
+
+    async def generate_response(self, prompt: str) -> str:
+        available = [provider for provider in self.providers if provider.breaker.available()]
+        if not available:
+            raise LLMUnavailableError("All LLM providers are unavailable (circuit open).")
+
+        if self.hedging and len(available) > 1 and len(available[0].latencies) >= self.hedge_min_samples:
+            return await self._hedged(available[0], available[1], available[0].percentile(95), prompt)
+
+        errors: List[str] = []
+        for provider in available:
+            try:
+                return await self._call(provider, prompt)
+            except LLMError as e:
+                print(f"!!! {e} !!!")
+                errors.append(str(e))
+        raise LLMUnavailableError(f"All LLM providers failed: {'; '.join(errors)}")
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "hedging": self.hedging,
+            "hedge_min_samples": self.hedge_min_samples,
+            "providers": [provider.stats() for provider in self.providers],
+        }
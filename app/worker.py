@@ -0,0 +1,157 @@
+"""
+Standalone analysis worker for ANALYSIS_MODE=WORKER.
+
+API nodes only store QueryRecords (status Queued). Each worker leases a batch of queued
+records from the storage backend, analyses them in one batched pipeline pass, and
+releases the leases. Leases are renewed while the batch runs; a crashed worker's records
+return to the queue when their lease expires, so any number of worker processes or
+nodes can share the queue.
+
+Usage:
+    python -m app.worker
+    python -m app.worker --batch-size 32 --lease-seconds 300
+    python -m app.worker --once     # drain the queue and exit
+    python -m app.worker --profile-seconds 120    # profile the batches of the first two minutes
+    kill -USR1 <pid>                # start (or end early) a profiling session on a running worker
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import List
+
+from app.analysis.nlp_pipeline import initialize_nlp_models, start_batch_analysis_pipeline
+from app.core.config import settings
+from app.core.profiling import pipeline_profiler
+from app.db.storage_selector import get_storage
+
+
+class AnalysisWorker:
+    """Claim → analyse → release loop over the storage backend's analysis queue."""
+
+    def __init__(self, worker_id: str, batch_size: int, lease_seconds: float, poll_interval: float, max_attempts: int):
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.stopping = asyncio.Event()
+        self.processed = 0
+
+    async def _renew_until_done(self, response_ids: List[str]) -> None:
+        storage = get_storage()
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await storage.renew_leases(self.worker_id, response_ids, self.lease_seconds)
+                if renewed < len(response_ids):
+                    print(f"Worker {self.worker_id}: {len(response_ids) - renewed} leases were lost (expired and re-claimed).")
+            except Exception as e:
+                print(f"Worker {self.worker_id}: lease renewal failed: {e}")
+
+    async def run_batch(self) -> int:
+        """Claims and analyses one batch; returns the number of records claimed."""
+        storage = get_storage()
+        records = await storage.claim_queued_records(self.worker_id, self.batch_size, self.lease_seconds, self.max_attempts)
+        if not records:
+            return 0
+
+        response_ids = [str(record["_id"]) for record in records]
+        renewer = asyncio.create_task(self._renew_until_done(response_ids))
+        try:
+            await start_batch_analysis_pipeline([
+                (
+                    str(record["_id"]),
+                    record["response_data"]["brand_name"],
+                    record["response_data"]["raw_llm_response"],
+                    record["timestamp"],
+                )
+                for record in records
+            ])
+            self.processed += len(records)
+        except Exception as e:
+            print(f"Worker {self.worker_id}: batch of {len(records)} failed, returning it to the queue: {e}")
+        finally:
+            renewer.cancel()
+            # Completed records just drop the lease; failed ones become Queued again
+            await storage.release_leases(self.worker_id, response_ids)
+        return len(records)
+
+    async def run(self, once: bool = False) -> None:
+        print(f"Analysis worker {self.worker_id} started (batch size {self.batch_size}, lease {self.lease_seconds}s).")
+        while not self.stopping.is_set():
+            try:
+                claimed = await self.run_batch()
+            except ConnectionError as e:
+                print(f"Worker {self.worker_id}: storage unavailable: {e}")
+                claimed = 0
+            if claimed:
+                print(f"Worker {self.worker_id}: {self.processed} records analysed.")
+                continue
+            if once:
+                break
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        print(f"Analysis worker {self.worker_id} stopped after {self.processed} records.")
+
+
+async def main(args: argparse.Namespace) -> None:
+    worker = AnalysisWorker(
+        worker_id=args.worker_id,
+        batch_size=args.batch_size,
+        lease_seconds=args.lease_seconds,
+        poll_interval=args.poll_interval,
+        max_attempts=args.max_attempts,
+    )
+    # Sessions are bounded by the flags; SIGUSR1 without them profiles for a minute
+    profile_bounds = {"duration_seconds": args.profile_seconds, "max_runs": args.profile_runs}
+    if not args.profile_seconds and not args.profile_runs:
+        profile_bounds["duration_seconds"] = 60
+
+    def toggle_profiling() -> None:
+        if pipeline_profiler.active:
+            pipeline_profiler.stop()
+        else:
+            pipeline_profiler.start(**profile_bounds)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # Finish (or hand back) the current batch, then exit
+        loop.add_signal_handler(sig, worker.stopping.set)
+    loop.add_signal_handler(signal.SIGUSR1, toggle_profiling)
+
+    storage = get_storage()
+    await storage.connect()
+    await initialize_nlp_models()
+    if args.profile_seconds or args.profile_runs:
+        pipeline_profiler.start(**profile_bounds)
+    try:
+        await worker.run(once=args.once)
+    finally:
+        # Write out a session cut short by the exit
+        pipeline_profiler.stop()
+        await storage.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Analyse queued QueryRecords (ANALYSIS_MODE=WORKER).")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}",
+                        help="Lease owner name (unique per process).")
+    parser.add_argument("--batch-size", type=int, default=settings.WORKER_BATCH_SIZE, help="Records claimed and analysed per batch.")
+    parser.add_argument("--lease-seconds", type=float, default=settings.WORKER_LEASE_SECONDS, help="Lease duration; renewed every third of it.")
+    parser.add_argument("--poll-interval", type=float, default=settings.WORKER_POLL_INTERVAL_SECONDS, help="Sleep when the queue is empty.")
+    parser.add_argument("--max-attempts", type=int, default=settings.WORKER_MAX_ATTEMPTS, help="Claims before a record is marked Failed.")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+    parser.add_argument("--profile-seconds", type=float, default=None,
+                        help="Profile the analysis batches from startup for this long (also the SIGUSR1 session length).")
+    parser.add_argument("--profile-runs", type=int, default=None,
+                        help="Profile this many batches from startup (also bounds SIGUSR1 sessions).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,63 @@
+"""
+Deterministic corpus of LLM-like brand answers for the benchmarks.
+
+The same seed always yields the same texts, so runs on different commits are comparable.
+"""
+import random
+from typing import List, Tuple
+
+BRANDS = ["Pathao", "Foodpanda", "Uber", "bKash", "Daraz", "Chaldal", "Shohoz", "Nagad"]
+
+OPENINGS = [
+    "{brand} is one of the most widely used platforms in Bangladesh.",
+    "When people ask about {brand}, the answer usually depends on what they need.",
+    "Here is an overview of {brand} and how it compares with its competitors.",
+    "{brand} has grown quickly over the last few years.",
+]
+
+SENTENCES = [
+    "Customers often praise {brand} for its fast delivery and reliable service.",
+    "Some users report delays during peak hours, especially in Dhaka.",
+    "Compared with {competitor}, {brand} offers a broader range of options.",
+    "The app is easy to use, although the interface could be more consistent.",
+    "Pricing is competitive, and frequent discounts make it attractive for students.",
+    "Support response times vary, and a few reviews mention unresolved refunds.",
+    "{competitor} remains a strong alternative in several cities.",
+    "Security and payment integration have improved significantly since launch.",
+    "Many small businesses rely on {brand} to reach new customers.",
+    "Overall sentiment online is positive, but expectations keep rising.",
+    "In terms of market share, {brand} and {competitor} lead the category.",
+    "Drivers and couriers have raised concerns about commissions and incentives.",
+]
+
+CLOSINGS = [
+    "In summary, {brand} is a solid choice for most users.",
+    "Whether {brand} is right for you depends on your location and budget.",
+    "It is worth comparing {brand} with {competitor} before deciding.",
+]
+
+# Target word counts: short chat answers up to long-form explanations
+LENGTHS = {"short": 40, "medium": 160, "long": 600}
+
+
+def _response(rng: random.Random, brand: str, target_words: int) -> str:
+    competitor = rng.choice([b for b in BRANDS if b != brand])
+    parts = [rng.choice(OPENINGS)]
+    words = len(parts[0].split())
+    while words < target_words:
+        sentence = rng.choice(SENTENCES)
+        parts.append(sentence)
+        words += len(sentence.split())
+    parts.append(rng.choice(CLOSINGS))
+    return " ".join(parts).format(brand=brand, competitor=competitor)
+
+
+def build_corpus(size: int = 256, seed: int = 42) -> List[Tuple[str, str]]:
+    """Returns `size` (brand, response) pairs cycling through short, medium and long answers."""
+    rng = random.Random(seed)
+    lengths = list(LENGTHS.values())
+    corpus = []
+    for i in range(size):
+        brand = BRANDS[i % len(BRANDS)]
+        corpus.append((brand, _response(rng, brand, lengths[i % len(lengths)])))
+    return corpus
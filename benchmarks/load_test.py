@@ -0,0 +1,202 @@
+"""
+End-to-end load test of POST /api/v1/query-brand without external services.
+
+The FastAPI app is driven in-process through httpx's ASGI transport. Storage calls go to
+benchmarks.stand_ins.InMemoryBackend, the LLM is MockHuggingFaceModel with a configurable
+latency, and authentication is bypassed. The real NLP models and analysis pipeline run,
+so the numbers reflect this process's CPU cost.
+
+Requests are replayed open-loop: request i is sent at start + i / rate whether or not the
+earlier ones have finished, so a saturated server shows up as growing latency, not a
+lower send rate. Each line of the request file is a JSON object; the brand is read from
+`brand_name`, `brand` or `title` (in that order), so the repo's requests.jsonl works as is.
+
+Usage:
+    python -m benchmarks.load_test --file requests.jsonl --rate 20 --requests 500
+    python -m benchmarks.load_test --file brands.jsonl --rate 50 --llm-latency 0.8 --store-latency 0.005 --output load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+
+from app.analysis import nlp_pipeline
+from app.core.config import settings
+from app.middlewares.auth_middleware import get_current_user
+from app.services.llm_base import MockHuggingFaceModel
+from app.services.llm_selector import get_llm_service
+from benchmarks.stand_ins import InMemoryBackend, installed
+from main import app
+
+BRAND_FIELDS = ("brand_name", "brand", "title")
+
+
+def load_brands(path: str) -> List[str]:
+    brands = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            brand = next((entry[field] for field in BRAND_FIELDS if isinstance(entry.get(field), str)), None)
+            if brand:
+                brands.append(brand)
+    if not brands:
+        raise ValueError(f"No brand found in {path}; each line needs one of {BRAND_FIELDS}.")
+    return brands
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2), "max": round(max(values) * 1000, 2)}
+
+
+async def _monitor_loop_lag(interval: float, lags: List[float], stop: asyncio.Event) -> None:
+    """Records how late a timer fires: any time the loop spends blocked (e.g. in encode) shows up here."""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    brands = load_brands(args.file)
+    total = args.requests or len(brands)
+
+    sent_at: Dict[str, float] = {}
+    completed_at: Dict[str, float] = {}
+
+    def on_complete(response_id: str) -> None:
+        completed_at[response_id] = time.perf_counter()
+
+    backend = InMemoryBackend(latency_seconds=args.store_latency, on_complete=on_complete)
+    llm = MockHuggingFaceModel(settings.HUGGINGFACE_MODEL, latency_seconds=args.llm_latency)
+    app.dependency_overrides[get_current_user] = lambda: "loadtest@example.com"
+    app.dependency_overrides[get_llm_service] = lambda: llm
+    # Every request comes from one user, so the per-user limits would cap the offered load
+    rate_limit_enabled, settings.RATE_LIMIT_ENABLED = settings.RATE_LIMIT_ENABLED, args.rate_limit
+
+    request_latencies: List[float] = []
+    status_counts: Dict[int, int] = {}
+    errors = 0
+
+    async def send(client: httpx.AsyncClient, brand: str) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/v1/query-brand", json={"brand_name": brand})
+        except Exception as e:
+            errors += 1
+            print(f"Request failed: {e}")
+            return
+        request_latencies.append(time.perf_counter() - start)
+        status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+        if response.status_code == 202:
+            sent_at[response.json()["response_id"]] = start
+
+    lags: List[float] = []
+    stop_monitor = asyncio.Event()
+    try:
+        with installed(backend):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+                monitor = asyncio.create_task(_monitor_loop_lag(args.lag_interval, lags, stop_monitor))
+                started = time.perf_counter()
+                tasks = []
+                for i, brand in enumerate(itertools.islice(itertools.cycle(brands), total)):
+                    delay = started + i / args.rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    tasks.append(asyncio.create_task(send(client, brand)))
+                await asyncio.gather(*tasks)
+                send_duration = time.perf_counter() - started
+
+                # Wait for the background analyses of the accepted requests
+                accepted = len(sent_at)
+                drain_deadline = time.perf_counter() + args.drain_timeout
+                while len(completed_at) < accepted and time.perf_counter() < drain_deadline:
+                    await asyncio.sleep(0.05)
+                if len(completed_at) < accepted:
+                    print(f"Timed out waiting for analysis: {len(completed_at)}/{accepted} complete.")
+                elapsed = time.perf_counter() - started
+                stop_monitor.set()
+                await monitor
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        app.dependency_overrides.pop(get_llm_service, None)
+        settings.RATE_LIMIT_ENABLED = rate_limit_enabled
+
+    completion_times = [completed_at[rid] - sent_at[rid] for rid in sent_at if rid in completed_at]
+    return {
+        "config": {
+            "file": args.file,
+            "target_rate": args.rate,
+            "requests": total,
+            "llm_latency_seconds": args.llm_latency,
+            "store_latency_seconds": args.store_latency,
+            "dedup_enabled": settings.DEDUP_ENABLED,
+            "vector_store_enabled": settings.VECTOR_STORE_ENABLED,
+            "rate_limit_enabled": args.rate_limit,
+        },
+        "status_counts": {str(code): count for code, count in sorted(status_counts.items())},
+        "errors": errors,
+        "achieved_send_rate": round(total / send_duration, 2) if send_duration else 0.0,
+        "throughput_completed_per_sec": round(len(completion_times) / elapsed, 2) if elapsed else 0.0,
+        "request_latency_ms": _percentiles(request_latencies),
+        "time_to_complete_ms": _percentiles(completion_times),
+        "completed": len(completion_times),
+        "incomplete": len(sent_at) - len(completion_times),
+        "event_loop_lag_ms": _percentiles(lags),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    config = report["config"]
+    print(f"\nTarget {config['target_rate']} req/s, {config['requests']} requests "
+          f"(LLM latency {config['llm_latency_seconds']}s, store latency {config['store_latency_seconds']}s)")
+    print(f"Status codes: {report['status_counts']}  transport errors: {report['errors']}")
+    print(f"Send rate achieved: {report['achieved_send_rate']} req/s; "
+          f"analysis throughput: {report['throughput_completed_per_sec']} completed/s "
+          f"({report['completed']} complete, {report['incomplete']} incomplete)")
+    for label, key in (("POST /query-brand", "request_latency_ms"), ("Time to Complete", "time_to_complete_ms"), ("Event-loop lag", "event_loop_lag_ms")):
+        p = report[key]
+        print(f"{label:<20} p50 {p['p50']:>9.2f} ms  p95 {p['p95']:>9.2f} ms  p99 {p['p99']:>9.2f} ms  max {p['max']:>9.2f} ms")
+
+
+async def main(args: argparse.Namespace) -> int:
+    nlp_pipeline.load_nlp_models()
+    report = await run_load(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0 if report["errors"] == 0 and report["incomplete"] == 0 else 1
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay brand queries against the app with in-memory storage.")
+    parser.add_argument("--file", default="requests.jsonl", help="JSON-lines request file.")
+    parser.add_argument("--rate", type=float, default=10.0, help="Target requests per second (open loop).")
+    parser.add_argument("--requests", type=int, default=0, help="Number of requests; the file is cycled (0 = once through).")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated LLM generation time in seconds.")
+    parser.add_argument("--store-latency", type=float, default=0.0, help="Simulated latency per storage call in seconds.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request HTTP timeout in seconds.")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="How long to wait for outstanding analyses.")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="Event-loop lag probe interval in seconds.")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep the per-user rate limits on (off by default).")
+    parser.add_argument("--output", help="Write the report as JSON.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,211 @@
+"""
+Micro-benchmarks for the NLP scoring functions of app/analysis/nlp_pipeline.py.
+
+Each function, and the whole scoring path (extract_features_batch + calculate_visibility_score),
+is run over batches of the fixed corpus at several batch sizes. The report gives items/sec,
+batch latency percentiles and the peak Python heap (tracemalloc, measured in a separate pass
+so tracing does not skew the timings; native tensor buffers are not included).
+
+Usage:
+    python -m benchmarks.nlp_scoring                                  # print the table, write benchmark-results.json
+    python -m benchmarks.nlp_scoring --output baseline.json           # record a baseline
+    python -m benchmarks.nlp_scoring --baseline baseline.json         # compare, exit 1 on regressions
+    python -m benchmarks.nlp_scoring --only keywords sentiment --batch-sizes 1 32
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from app.analysis import nlp_pipeline
+from app.core.config import settings
+from benchmarks.corpus import build_corpus
+
+Batch = List[Tuple[str, str]]
+
+
+def _scoring_path(batch: Batch) -> None:
+    brands = [brand for brand, _ in batch]
+    texts = [text for _, text in batch]
+    for features in nlp_pipeline.extract_features_batch(texts, brands):
+        nlp_pipeline.calculate_visibility_score(
+            sentiment_score=features["sentiment_score"],
+            semantic_similarity=features["semantic_similarity"],
+            keyword_match=features["keyword_match"],
+            brand_freq=features["brand_freq"],
+            correctness=features["correctness"],
+            consistency=0.5,
+        )
+
+
+def _visibility_score(batch: Batch) -> None:
+    for i in range(len(batch)):
+        # Inputs vary per item so the call cannot be hoisted or cached
+        x = (i % 10) / 10
+        nlp_pipeline.calculate_visibility_score(x, 1 - x, x / 2, 0.5, x, 0.5)
+
+
+# name -> callable over one batch; single-item functions are called once per item
+BENCHMARKS: Dict[str, Callable[[Batch], None]] = {
+    "extract_keywords": lambda batch: [nlp_pipeline.extract_keywords(text) for _, text in batch],
+    "get_sentiment_score": lambda batch: [nlp_pipeline.get_sentiment_score(text) for _, text in batch],
+    "get_sentiment_scores": lambda batch: nlp_pipeline.get_sentiment_scores([text for _, text in batch]),
+    "get_sentence_sentiments": lambda batch: nlp_pipeline.get_sentence_sentiments([text for _, text in batch]),
+    "generate_embedding": lambda batch: [nlp_pipeline.generate_embedding(text) for _, text in batch],
+    "calculate_semantic_similarity": lambda batch: [
+        nlp_pipeline.calculate_semantic_similarity(text, brand) for brand, text in batch
+    ],
+    "calculate_visibility_score": _visibility_score,
+    "scoring_path": _scoring_path,
+}
+
+
+def _batches(corpus: Batch, batch_size: int, count: int) -> List[Batch]:
+    """`count` consecutive batches, wrapping around the corpus."""
+    batches = []
+    offset = 0
+    for _ in range(count):
+        batches.append([corpus[(offset + j) % len(corpus)] for j in range(batch_size)])
+        offset += batch_size
+    return batches
+
+
+def run_benchmark(func: Callable[[Batch], None], corpus: Batch, batch_size: int, iterations: int, warmup: int) -> Dict[str, Any]:
+    batches = _batches(corpus, batch_size, warmup + iterations)
+    for batch in batches[:warmup]:
+        func(batch)
+
+    latencies = np.empty(iterations)
+    for i, batch in enumerate(batches[warmup:]):
+        start = time.perf_counter()
+        func(batch)
+        latencies[i] = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(batches[-1])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = float(latencies.sum())
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "batch_size": batch_size,
+        "iterations": iterations,
+        "items_per_sec": round(batch_size * iterations / total, 2) if total else 0.0,
+        "batches_per_sec": round(iterations / total, 2) if total else 0.0,
+        "latency_ms": {"p50": round(p50, 4), "p95": round(p95, 4), "p99": round(p99, 4)},
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Returns one line per benchmark/batch whose throughput dropped or p95 grew by more than `threshold`."""
+    regressions = []
+    for name, runs in results["benchmarks"].items():
+        base_runs = {run["batch_size"]: run for run in baseline.get("benchmarks", {}).get(name, [])}
+        for run in runs:
+            base = base_runs.get(run["batch_size"])
+            if not base:
+                continue
+            throughput = run["items_per_sec"] / base["items_per_sec"] - 1 if base["items_per_sec"] else 0.0
+            p95 = run["latency_ms"]["p95"] / base["latency_ms"]["p95"] - 1 if base["latency_ms"]["p95"] else 0.0
+            run["vs_baseline"] = {"items_per_sec": round(throughput, 4), "p95": round(p95, 4)}
+            if throughput < -threshold or p95 > threshold:
+                regressions.append(
+                    f"{name} @ batch {run['batch_size']}: items/sec {throughput:+.1%}, p95 {p95:+.1%}"
+                )
+    return regressions
+
+
+def print_table(results: Dict[str, Any]) -> None:
+    print(f"{'benchmark':<32}{'batch':>6}{'items/s':>12}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'peak KiB':>11}{'vs base':>9}")
+    for name, runs in results["benchmarks"].items():
+        for run in runs:
+            latency = run["latency_ms"]
+            delta = run.get("vs_baseline", {}).get("items_per_sec")
+            delta_str = f"{delta:+.1%}" if delta is not None else ""
+            print(
+                f"{name:<32}{run['batch_size']:>6}{run['items_per_sec']:>12.1f}{latency['p50']:>11.3f}"
+                f"{latency['p95']:>11.3f}{latency['p99']:>11.3f}{run['peak_memory_kib']:>11.1f}{delta_str:>9}"
+            )
+
+
+def main(args: argparse.Namespace) -> int:
+    names = args.only or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        print(f"Unknown benchmarks: {sorted(unknown)}. Available: {list(BENCHMARKS)}")
+        return 2
+
+    nlp_pipeline.load_nlp_models()
+    corpus = build_corpus(size=args.corpus_size, seed=args.seed)
+
+    results: Dict[str, Any] = {
+        "metadata": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "embedding_model": settings.EMBEDDING_MODEL_NAME,
+            "corpus_size": args.corpus_size,
+            "seed": args.seed,
+        },
+        "benchmarks": {},
+    }
+    for name in names:
+        results["benchmarks"][name] = []
+        for batch_size in args.batch_sizes:
+            run = run_benchmark(BENCHMARKS[name], corpus, batch_size, args.iterations, args.warmup)
+            results["benchmarks"][name].append(run)
+            print(f"{name} @ batch {batch_size}: {run['items_per_sec']:.1f} items/s")
+
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print_table(results)
+    print(f"Results written to {args.output}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%} of the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the NLP scoring functions.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--iterations", type=int, default=20, help="Measured batches per benchmark and batch size.")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured batches run first.")
+    parser.add_argument("--only", nargs="+", help=f"Subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--corpus-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as a regression.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,364 @@
+"""
+In-memory stand-in for the storage backend used by the query and analysis paths.
+
+InMemoryBackend implements StorageBackend with plain dicts, so the FastAPI app can be
+driven without MongoDB, Elasticsearch, PostgreSQL, BigQuery or a SQLite file. An optional
+per-call latency simulates database round trips.
+"""
+import asyncio
+import datetime
+import tempfile
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from app.analysis import nlp_pipeline
+from app.analysis.vector_store import LocalVectorStore
+from app.auth.core.utils import hash_password
+from app.auth.models.auth_models import UserInDB
+from app.core.config import settings
+from app.db.export_rows import query_record_row
+from app.db.storage_base import StorageBackend
+from app.db.storage_selector import get_storage, set_storage
+
+
+class InMemoryBackend(StorageBackend):
+    """Keeps query records, tracked brands, idempotency keys, users, analysis documents and score rows in process memory."""
+
+    def __init__(self, latency_seconds: float = 0.0, on_complete: Callable[[str], None] | None = None):
+        self.latency_seconds = latency_seconds
+        self.on_complete = on_complete
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.users: Dict[str, UserInDB] = {}
+        self.analysis_documents: Dict[str, Dict[str, Any]] = {}
+        self.performance: Dict[str, float] = {}
+        # response_id -> (owner, expiry on the monotonic clock, attempts)
+        self.leases: Dict[str, Tuple[str | None, float, int]] = {}
+        self.tracked_brands: Dict[str, Dict[str, Any]] = {}
+        # tracking_id -> (scheduler owning the run, lease expiry)
+        self.tracking_leases: Dict[str, Tuple[str, datetime.datetime]] = {}
+        self.idempotency_keys: Dict[str, Dict[str, Any]] = {}
+        # Last visibility scores per brand, mirroring the lookup used for score-based consistency
+        self._scores: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=1000))
+
+    async def _round_trip(self) -> None:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    # --- Query records ---
+    async def insert_query_record(self, document: Dict[str, Any]) -> str:
+        await self._round_trip()
+        response_id = str(ObjectId())
+        self.records[response_id] = document
+        return response_id
+
+    async def get_query_details_by_id(self, response_id: str) -> Dict[str, Any] | None:
+        await self._round_trip()
+        document = self.records.get(response_id)
+        if document is None:
+            return None
+        return {**document["response_data"], "response_id": response_id}
+
+    async def get_query_details_by_comparison(self, comparison_id: str) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [
+            {**document["response_data"], "response_id": response_id}
+            for response_id, document in sorted(self.records.items())
+            if document.get("comparison_id") == comparison_id
+        ]
+
+    async def update_query_status_and_score(self, response_id: str, visibility_score: float) -> None:
+        if await self.bulk_update_query_scores({response_id: visibility_score}) == 0:
+            print(f"Warning: in-memory record with ID {response_id} not found for update.")
+
+    async def bulk_update_query_scores(self, scores: Dict[str, float]) -> int:
+        await self._round_trip()
+        processed_at = datetime.datetime.now(datetime.timezone.utc)
+        matched = 0
+        for response_id, visibility_score in scores.items():
+            document = self.records.get(response_id)
+            if document is None:
+                continue
+            document["response_data"].update({
+                "status": "Complete",
+                "visibility_score": visibility_score,
+                "processed_at": processed_at,
+            })
+            matched += 1
+            if self.on_complete:
+                self.on_complete(response_id)
+        return matched
+
+    async def iter_query_records(self, batch_size: int, after_id: str | None = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        ids = sorted(rid for rid in self.records if after_id is None or rid > after_id)
+        for i in range(0, len(ids), batch_size):
+            yield [{"_id": rid, **self.records[rid]} for rid in ids[i:i + batch_size]]
+
+    async def get_query_records_before(self, brand_name: str, before_id: str, limit: int) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        ids = [
+            rid for rid in sorted(self.records)
+            if rid < before_id and self.records[rid]["response_data"]["brand_name"] == brand_name
+        ]
+        return [{"_id": rid, **self.records[rid]} for rid in ids[-limit:]] if limit > 0 else []
+
+    # --- Analysis queue ---
+    async def claim_queued_records(self, worker_id: str, limit: int, lease_seconds: float, max_attempts: int) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        now = time.monotonic()
+        claimed = []
+        for response_id in sorted(self.records):
+            document = self.records[response_id]
+            status, lease = document["response_data"]["status"], self.leases.get(response_id)
+            expired = status == "Processing" and lease is not None and lease[1] < now
+            if (status == "Queued" or expired) and lease is not None and lease[2] >= max_attempts:
+                document["response_data"]["status"] = "Failed"
+                del self.leases[response_id]
+            elif (status == "Queued" or expired) and len(claimed) < limit:
+                attempts = lease[2] if lease else 0
+                self.leases[response_id] = (worker_id, now + lease_seconds, attempts + 1)
+                document["response_data"]["status"] = "Processing"
+                claimed.append({"_id": response_id, **document})
+        return claimed
+
+    async def renew_leases(self, worker_id: str, response_ids: List[str], lease_seconds: float) -> int:
+        await self._round_trip()
+        renewed = 0
+        for response_id in response_ids:
+            lease = self.leases.get(response_id)
+            if lease and lease[0] == worker_id:
+                self.leases[response_id] = (worker_id, time.monotonic() + lease_seconds, lease[2])
+                renewed += 1
+        return renewed
+
+    async def release_leases(self, worker_id: str, response_ids: List[str]) -> None:
+        await self._round_trip()
+        for response_id in response_ids:
+            lease = self.leases.get(response_id)
+            if lease and lease[0] == worker_id:
+                # Keep the attempt count, drop the owner and expiry
+                self.leases[response_id] = (None, float("inf"), lease[2])
+                response_data = self.records[response_id]["response_data"]
+                if response_data["status"] == "Processing":
+                    response_data["status"] = "Queued"
+
+    # --- Export ---
+    def _matching_records(self, brand_name=None, user_id=None, start=None, end=None) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (response_id, document) for response_id, document in sorted(self.records.items())
+            if (not brand_name or document["response_data"]["brand_name"].lower() == brand_name.lower())
+            and (not user_id or document.get("user_id") == user_id)
+            and (not start or document["timestamp"] >= start)
+            and (not end or document["timestamp"] <= end)
+        ]
+
+    async def iter_export_records(self, batch_size, brand_name=None, user_id=None, start=None, end=None) -> AsyncIterator[List[Dict[str, Any]]]:
+        matching = self._matching_records(brand_name, user_id, start, end)
+        for i in range(0, len(matching), batch_size):
+            await self._round_trip()
+            yield [query_record_row(response_id, document) for response_id, document in matching[i:i + batch_size]]
+
+    async def iter_performance_rows(self, batch_size, brand_name=None, start=None, end=None) -> AsyncIterator[List[Dict[str, Any]]]:
+        # Score rows have no brand or time of their own here: take them from the record
+        matching = [(rid, doc) for rid, doc in self._matching_records(brand_name, None, start, end) if rid in self.performance]
+        for i in range(0, len(matching), batch_size):
+            await self._round_trip()
+            yield [
+                {
+                    "response_id": response_id,
+                    "brand_name": document["response_data"]["brand_name"],
+                    "visibility_score": self.performance[response_id],
+                    "sentiment_score": None,
+                    "query_timestamp": document["timestamp"],
+                }
+                for response_id, document in matching[i:i + batch_size]
+            ]
+
+    # --- Tracked brands ---
+    async def insert_tracked_brand(self, document: Dict[str, Any]) -> str:
+        await self._round_trip()
+        tracking_id = str(ObjectId())
+        self.tracked_brands[tracking_id] = {**document, "tracking_id": tracking_id, "last_run_at": None, "last_response_id": None}
+        return tracking_id
+
+    async def list_tracked_brands(self, user_id: str) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [dict(tracked) for _, tracked in sorted(self.tracked_brands.items()) if tracked["user_id"] == user_id]
+
+    async def count_tracked_brands(self, user_id: str) -> int:
+        return len(await self.list_tracked_brands(user_id))
+
+    async def delete_tracked_brand(self, tracking_id: str, user_id: str) -> bool:
+        await self._round_trip()
+        tracked = self.tracked_brands.get(tracking_id)
+        if tracked is None or tracked["user_id"] != user_id:
+            return False
+        del self.tracked_brands[tracking_id]
+        self.tracking_leases.pop(tracking_id, None)
+        return True
+
+    async def claim_due_tracked_brands(self, owner: str, now: datetime.datetime, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        due = sorted(
+            (tracked for tracking_id, tracked in self.tracked_brands.items()
+             if tracked["next_run_at"] <= now
+             and (tracking_id not in self.tracking_leases or self.tracking_leases[tracking_id][1] < now)),
+            key=lambda tracked: tracked["next_run_at"],
+        )[:limit]
+        for tracked in due:
+            self.tracking_leases[tracked["tracking_id"]] = (owner, now + datetime.timedelta(seconds=lease_seconds))
+        return [dict(tracked) for tracked in due]
+
+    async def finish_tracked_run(self, tracking_id: str, owner: str, next_run_at: datetime.datetime, response_id: str | None) -> None:
+        await self._round_trip()
+        lease = self.tracking_leases.get(tracking_id)
+        if lease is None or lease[0] != owner or tracking_id not in self.tracked_brands:
+            return
+        del self.tracking_leases[tracking_id]
+        tracked = self.tracked_brands[tracking_id]
+        tracked["next_run_at"] = next_run_at
+        if response_id is not None:
+            tracked.update(last_run_at=datetime.datetime.now(datetime.timezone.utc), last_response_id=response_id)
+
+    # --- Idempotency keys ---
+    async def claim_idempotency_key(self, key_id, owner, request_hash, now, lock_seconds, ttl_seconds) -> Optional[Dict[str, Any]]:
+        await self._round_trip()
+        entry = self.idempotency_keys.get(key_id)
+        abandoned = entry is not None and entry["response"] is None and entry["locked_until"] <= now and entry["request_hash"] == request_hash
+        if entry is None or entry["expires_at"] <= now or abandoned:
+            self.idempotency_keys[key_id] = {
+                "request_hash": request_hash,
+                "owner": owner,
+                "response": None,
+                "locked_until": now + datetime.timedelta(seconds=lock_seconds),
+                "expires_at": now + datetime.timedelta(seconds=ttl_seconds),
+            }
+            return None
+        return dict(entry)
+
+    async def renew_idempotency_key(self, key_id: str, owner: str, now: datetime.datetime, lock_seconds: float) -> bool:
+        await self._round_trip()
+        entry = self.idempotency_keys.get(key_id)
+        if entry is None or entry["owner"] != owner or entry["response"] is not None:
+            return False
+        entry["locked_until"] = now + datetime.timedelta(seconds=lock_seconds)
+        return True
+
+    async def complete_idempotency_key(self, key_id: str, owner: str, response: Dict[str, Any]) -> None:
+        await self._round_trip()
+        entry = self.idempotency_keys.get(key_id)
+        if entry is not None and entry["owner"] == owner:
+            entry["response"] = response
+
+    async def release_idempotency_key(self, key_id: str, owner: str) -> None:
+        await self._round_trip()
+        entry = self.idempotency_keys.get(key_id)
+        if entry is not None and entry["owner"] == owner and entry["response"] is None:
+            del self.idempotency_keys[key_id]
+
+    # --- Users ---
+    async def get_user_by_email(self, email: str) -> Optional[UserInDB]:
+        await self._round_trip()
+        return self.users.get(email)
+
+    async def create_user(self, email: str, password: str) -> Optional[UserInDB]:
+        await self._round_trip()
+        if email in self.users:
+            return None
+        self.users[email] = UserInDB(email=email, hashed_password=hash_password(password))
+        return self.users[email]
+
+    # --- Analysis documents ---
+    async def index_analysis_document(self, document: Dict[str, Any]) -> None:
+        await self.bulk_index_analysis_documents([document])
+
+    async def bulk_index_analysis_documents(self, documents: List[Dict[str, Any]]) -> int:
+        await self._round_trip()
+        for document in documents:
+            self.analysis_documents[document["response_id"]] = document
+            self._scores[document["brand_keyword"]].append(document["visibility_score"])
+        return len(documents)
+
+    async def get_visibility_scores(self, brand_name: str) -> List[float]:
+        await self._round_trip()
+        return list(self._scores[brand_name])
+
+    async def get_analysis_embedding(self, response_id: str) -> Optional[List[float]]:
+        await self._round_trip()
+        document = self.analysis_documents.get(response_id)
+        if document is None or document.get("embedding_vector") is None:
+            return None
+        return np.asarray(document["embedding_vector"], dtype=np.float32).tolist()
+
+    async def search_similar_responses(self, query_vector, k, num_candidates, brand_name=None, start=None, end=None, exclude_id=None):
+        return await self.search_similar_responses_exact(query_vector, k, brand_name, start, end, exclude_id)
+
+    async def search_similar_responses_exact(self, query_vector, k, brand_name=None, start=None, end=None, exclude_id=None):
+        await self._round_trip()
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scored = []
+        for response_id, document in self.analysis_documents.items():
+            if response_id == exclude_id or (brand_name and document["brand_keyword"] != brand_name):
+                continue
+            if (start and document["timestamp"] < start) or (end and document["timestamp"] > end):
+                continue
+            vector = np.asarray(document["embedding_vector"], dtype=np.float32)
+            cosine = float(vector @ query) / max(float(np.linalg.norm(vector)), 1e-12)
+            scored.append({
+                "response_id": response_id,
+                "brand_name": document["brand_keyword"],
+                "score": round((cosine + 1) / 2, 4),
+                "visibility_score": document["visibility_score"],
+                "timestamp": document["timestamp"],
+            })
+        scored.sort(key=lambda hit: hit["score"], reverse=True)
+        return {"took_ms": 0, "hits": scored[:k]}
+
+    # --- Brand performance ---
+    async def record_performance(self, analysis_document: Dict[str, Any], raw_llm_response: str) -> None:
+        await self.update_performance_scores([analysis_document])
+
+    async def update_performance_scores(self, documents: List[Dict[str, Any]]) -> None:
+        await self._round_trip()
+        for document in documents:
+            self.performance[document["response_id"]] = document["visibility_score"]
+
+    async def get_brand_metrics(self, brand_name: str) -> Dict[str, Any]:
+        await self._round_trip()
+        scores = [
+            self.performance[rid] for rid, document in self.analysis_documents.items()
+            if document["brand_keyword"].lower() == brand_name.lower() and rid in self.performance
+        ]
+        return {
+            "brand_name": brand_name,
+            "total_queries": len(scores),
+            "average_visibility_score": round(sum(scores) / len(scores), 2) if scores else 0.0,
+        }
+
+
+@contextmanager
+def installed(backend: StorageBackend) -> Iterator[None]:
+    """Makes `backend` (and a throwaway consistency vector store) the process-wide storage until exit."""
+    previous_backend = get_storage()
+    previous_vector_store = nlp_pipeline.vector_store
+    with tempfile.TemporaryDirectory(prefix="gsvt-load-vectors-") as vector_dir:
+        set_storage(backend)
+        nlp_pipeline.vector_store = LocalVectorStore(
+            vector_dir, dtype=settings.VECTOR_STORE_DTYPE, max_rows=settings.VECTOR_STORE_MAX_ROWS
+        )
+        try:
+            yield
+        finally:
+            set_storage(previous_backend)
+            nlp_pipeline.vector_store = previous_vector_store
@@ -0,0 +1,41 @@
+"""
+Multi-worker deployment: gunicorn -c gunicorn.conf.py main:app
+
+The master imports the app and loads the NLP models once (preload_app), then forks
+WEB_CONCURRENCY uvicorn workers that share the model weights copy-on-write. Each worker
+opens its own database connections in the FastAPI lifespan.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+
+# Must be set before prometheus_client is imported (i.e. before the app is preloaded):
+# every worker writes its metrics to files here and /metrics merges them
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/gsvt-prometheus")
+shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+# Tokenizers must not start their thread pool in the master, or it deadlocks after fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def on_starting(server):
+    from app.core.workers import preload_before_fork
+    preload_before_fork()
+
+
+def post_fork(server, worker):
+    from app.core.workers import reinitialize_after_fork
+    reinitialize_after_fork(server.cfg.workers)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,11 +1,16 @@
-from fastapi import FastAPI
+import os
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
 from dotenv import load_dotenv
 from app.api.v1.router import router as api_router
+from app.api.v1.admin_router import router as admin_router
 from app.auth.routers.auth_router import router as auth_router
 from app.core.config import settings
 from app.db.utils import connect_to_dbs, close_dbs
+from app.services.brand_tracking import get_tracking_scheduler
 from contextlib import asynccontextmanager
 from starlette.middleware.cors import CORSMiddleware
+from app.middlewares.metrics_middleware import PrometheusMiddleware
 
 
 # load .env 
@@ -16,8 +21,12 @@ async def lifespan(app: FastAPI):
     # startup logic here
     await connect_to_dbs()
     # e.g. connect to DB, load resources, initialize things
+    if settings.TRACKING_SCHEDULER_ENABLED:
+        get_tracking_scheduler().start()
     yield
     # shutdown logic here
+    if settings.TRACKING_SCHEDULER_ENABLED:
+        await get_tracking_scheduler().stop()
     await close_dbs()
     # e.g. close DB, clean up resources
 
@@ -50,10 +59,24 @@ app.add_middleware(
     allow_headers=["*"], 
 )
 
+# Latency histograms for every HTTP route (scraped from /metrics)
+app.add_middleware(PrometheusMiddleware)
+
 # Include the API router with a prefix 
 app.include_router(auth_router, prefix="/auth", tags=["authentication endpoints"])
 app.include_router(api_router, prefix="/api/v1", tags=["Visibility Query"])
+app.include_router(admin_router, prefix="/api/v1/admin", tags=["Admin"])
 
 @app.get("/")
 async def root():
-    return {"message": f"Welcome to the Visibility API. Current Environment: {settings.ENVIRONMENT}"}
\ No newline at end of file
+    return {"message": f"Welcome to the Visibility API. Current Environment: {settings.ENVIRONMENT}"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: LLM, pipeline-stage, HTTP and database latency histograms plus counters."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Multi-worker mode: merge the metric files written by every worker
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)